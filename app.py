@@ -1,47 +1,21 @@
-import os
 import json
-import time
-import psycopg2
-from selenium import webdriver
-from selenium.webdriver.chrome.service import Service as ChromeService
-from selenium.webdriver.chrome.options import Options
-from webdriver_manager.chrome import ChromeDriverManager
-from bs4 import BeautifulSoup
+from equity_fetcher import API_BASE_URL, fetch_symbols as fetch_all_symbols, fetch_equity_details
+from db import connection, close_pools, register_statement, execute_prepared
 
 # Constants
-SYMBOLS_URL = "http://localhost:5000/symbols"
-EQUITY_DETAILS_URL = "http://localhost:5000/equity-details"
+SYMBOLS_URL = f"{API_BASE_URL}/symbols"
+EQUITY_DETAILS_URL = f"{API_BASE_URL}/equity-details"
+FETCH_CONCURRENCY = 16  # Symbols fetched in parallel
 
-# Database connection settings (modify with your credentials)
-DB_HOST = "localhost"
+# Database holding the raw equity documents (host and credentials come from db.py)
 DB_NAME = "equity_data"
-DB_USER = "root"
-DB_PASSWORD = "arka1256"
 
-# Function to create Selenium WebDriver instance
-def create_webdriver():
-    chrome_options = Options()
-    chrome_options.add_argument("--headless")  # Run in headless mode
-    chrome_options.add_argument("--disable-gpu")
-    chrome_options.add_argument("--no-sandbox")
-    driver = webdriver.Chrome(service=ChromeService(ChromeDriverManager().install()), options=chrome_options)
-    print("WebDriver initialized.")
-    return driver
-
-# Function to connect to the PostgreSQL database
-def connect_db():
-    try:
-        conn = psycopg2.connect(
-            host=DB_HOST,
-            dbname=DB_NAME,
-            user=DB_USER,
-            password=DB_PASSWORD
-        )
-        print("Connected to the database.")
-        return conn
-    except Exception as e:
-        print(f"Error connecting to the database: {e}")
-        return None
+# Per-symbol upsert run from every fetch thread; prepared once per pooled connection
+register_statement("upsert_equity_data", """
+    INSERT INTO equity_data (symbol, data)
+    VALUES ($1, $2)
+    ON CONFLICT (symbol) DO UPDATE SET data = EXCLUDED.data
+""")
 
 # Function to create table for storing equity data if it doesn't exist
 def create_table(conn):
@@ -56,79 +30,56 @@ def create_table(conn):
         print("Table created or already exists.")
 
 # Function to fetch symbols
-def fetch_symbols(driver):
-    print(f"Accessing symbols URL: {SYMBOLS_URL}")
-    driver.get(SYMBOLS_URL)
-    time.sleep(2)  # Wait for the page to load
-
-    soup = BeautifulSoup(driver.page_source, 'html.parser')
-    pre = soup.find('pre')
-
-    if pre:
-        symbols_data = json.loads(pre.text)
-        symbols = symbols_data.get("symbols", [])
-        print(f"Fetched {len(symbols)} symbols.")
-        return symbols
-    else:
-        print("No symbols found.")
-        return []
-
-# Function to fetch and insert equity details into the database for each symbol
-def fetch_and_store_equity_details(symbol, driver, conn):
+def fetch_symbols():
     try:
-        equity_details_url = f"{EQUITY_DETAILS_URL}?symbol={symbol}"
-        print(f"Fetching equity details for {symbol} from {equity_details_url}")
-        driver.get(equity_details_url)
-        time.sleep(1)  # Wait for the page to load
-
-        soup = BeautifulSoup(driver.page_source, 'html.parser')
-        pre = soup.find('pre')
+        return fetch_all_symbols(API_BASE_URL)
+    except Exception as e:
+        print(f"Error fetching symbols: {e}")
+        return []
 
-        if pre:
-            equity_details = json.loads(pre.text)
+# Function to insert one symbol's equity details into the database
+def store_equity_details(symbol, equity_details):
+    # Each fetch thread borrows its own pooled connection, so stores run in parallel
+    with connection(DB_NAME) as conn, conn.cursor() as cur:
+        execute_prepared(cur, "upsert_equity_data", (symbol, json.dumps(equity_details)))
+        conn.commit()
 
-            # Insert data into PostgreSQL database
-            with conn.cursor() as cur:
-                cur.execute("""
-                    INSERT INTO equity_data (symbol, data)
-                    VALUES (%s, %s)
-                    ON CONFLICT (symbol) DO UPDATE SET data = EXCLUDED.data
-                """, (symbol, json.dumps(equity_details)))
-                conn.commit()
+    print(f"Data for {symbol} inserted into the database.")
 
-            print(f"Data for {symbol} inserted into the database.")
-        else:
-            print(f"No data found for symbol: {symbol}.")
-    except Exception as e:
-        print(f"Error fetching equity details for {symbol}: {e}")
+# Function to fetch and insert equity details into the database for each symbol
+def fetch_and_store_equity_details(symbols, concurrency=FETCH_CONCURRENCY):
+    print(f"Fetching equity details from {EQUITY_DETAILS_URL} with concurrency {concurrency}")
+    dead_letter = fetch_equity_details(symbols, store_equity_details, API_BASE_URL, concurrency)
+    if dead_letter:
+        print(f"{len(dead_letter)} symbols could not be fetched:")
+        for symbol, error in dead_letter:
+            print(f"  {symbol}: {error}")
+    return dead_letter
 
 # Main function to fetch symbols and their equity details
 def main():
-    driver = create_webdriver()
-    conn = connect_db()
-    
-    if conn is None:
+    try:
+        # Create table if it doesn't exist
+        with connection(DB_NAME) as conn:
+            create_table(conn)
+    except Exception as e:
+        print(f"Error connecting to the database: {e}")
         print("Database connection failed. Exiting...")
         return
 
     try:
-        # Create table if it doesn't exist
-        create_table(conn)
-
         # Fetch all symbols
-        symbols = fetch_symbols(driver)
+        symbols = fetch_symbols()
 
         # Fetch and store equity details for each symbol
         if symbols:
             print("Starting to fetch equity details for each symbol...")
-            for symbol in symbols:
-                fetch_and_store_equity_details(symbol, driver, conn)
+            fetch_and_store_equity_details(symbols)
         else:
             print("No symbols to process.")
     finally:
-        driver.quit()
-        conn.close()
-        print("WebDriver closed. Database connection closed.")
+        close_pools()
+        print("Database connections closed.")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,182 @@
+import os
+import time
+import asyncio
+import argparse
+from datetime import timedelta
+from db import connection, close_pools
+from equity_fetcher import create_session, get_json
+from fetch_scheduler import FetchScheduler
+from llm_backends import get_backend, metrics_summary
+from research_payload import build_prompt
+from research_store import (
+    create_research_table, insert_research_report, create_report_cache_table, report_input_hash,
+    get_cached_report, store_cached_report, reports_generated_within
+)
+
+# Constants
+API_BASE_URL = os.getenv("RESEARCH_API_BASE_URL", "https://mgo2gncdj3.execute-api.ap-south-1.amazonaws.com")
+MODEL_BACKEND = os.getenv("RESEARCH_BACKEND", "gemini:gemini-2.0-flash")  # See llm_backends.get_backend()
+DEFAULT_WORKERS = 8  # Symbols researched concurrently
+FETCH_RATE_LIMIT = 10.0  # equity-details requests per second
+MODEL_RATE_LIMIT = float(os.getenv("MODEL_RATE_LIMIT", 0.25))  # Model calls per second (15 per minute)
+REFRESH_AGE = timedelta(hours=20)  # Reports newer than this count as done, so a rerun resumes where it stopped
+PROGRESS_INTERVAL = 30  # Seconds between throughput reports
+
+
+def load_symbols():
+    """All symbols in equity_info."""
+    with connection() as conn, conn.cursor() as cur:
+        cur.execute("SELECT symbol FROM equity_info ORDER BY symbol")
+        return [row[0] for row in cur.fetchall()]
+
+
+def pending_symbols(symbols, refresh_age=REFRESH_AGE):
+    """Drop symbols whose report was written within refresh_age, i.e. by an earlier (interrupted) run."""
+    with connection() as conn, conn.cursor() as cur:
+        create_research_table(cur)
+        create_report_cache_table(cur)
+        done = reports_generated_within(cur, refresh_age) if refresh_age else set()
+        conn.commit()
+    return [symbol for symbol in symbols if symbol not in done]
+
+
+def lookup_cached(symbol, input_hash):
+    with connection() as conn, conn.cursor() as cur:
+        report = get_cached_report(cur, symbol, input_hash)
+        conn.commit()
+    return report
+
+
+def save_report(symbol, input_hash, report, cached):
+    """Write the report to investment_research (the checkpoint) and, if it is new, to the cache."""
+    with connection() as conn, conn.cursor() as cur:
+        insert_research_report(cur, symbol, report)
+        if not cached:
+            store_cached_report(cur, symbol, input_hash, report)
+        conn.commit()
+
+
+async def generate(backend, prompt):
+    text = await backend.acomplete(prompt)
+    if not text:
+        raise ValueError("No research report generated.")
+    return text
+
+
+def progress(stats, started, total):
+    elapsed = time.monotonic() - started
+    finished = stats["generated"] + stats["cached"]
+    per_minute = finished / elapsed * 60 if elapsed else 0.0
+    remaining = total - finished - stats["failed"]
+    eta = f"{remaining / per_minute:.1f} min" if per_minute else "unknown"
+    return (f"{finished}/{total} reports ({stats['generated']} generated, {stats['cached']} cached), "
+            f"{stats['failed']} failed, {per_minute:.1f} reports/min, elapsed {elapsed:.0f}s, ETA {eta}")
+
+
+async def run_batch(symbols, backend, workers=DEFAULT_WORKERS, fetch_rate=FETCH_RATE_LIMIT,
+                    model_rate=MODEL_RATE_LIMIT, base_url=API_BASE_URL):
+    """Fetch data and write a report for every symbol with `workers` concurrent workers.
+
+    Fetches and model calls go through separate FetchSchedulers, so each is
+    held to its own rate limit and retried with backoff when throttled. Every
+    finished report is committed straight away. Returns (stats, failures).
+    """
+    queue = asyncio.Queue(maxsize=workers * 2)
+    fetcher = FetchScheduler(rate=fetch_rate, concurrency=workers)
+    generator = FetchScheduler(rate=model_rate, concurrency=workers)
+    stats = {"generated": 0, "cached": 0, "failed": 0}
+    failures = []
+    started = time.monotonic()
+
+    async def research(session, symbol):
+        equity_json = await fetcher.call(
+            symbol, lambda: get_json(session, f"{base_url}/equity-details", params={"symbol": symbol})
+        )
+        if not equity_json:
+            raise ValueError("No data found")
+        input_hash = report_input_hash(equity_json)
+        report = await asyncio.to_thread(lookup_cached, symbol, input_hash)
+        cached = report is not None
+        if not cached:
+            report = await generator.call(symbol, lambda: generate(backend, build_prompt(symbol, equity_json)))
+        await asyncio.to_thread(save_report, symbol, input_hash, report, cached)
+        return cached
+
+    async def worker(session):
+        while True:
+            symbol = await queue.get()
+            try:
+                if symbol is None:
+                    return
+                cached = await research(session, symbol)
+                stats["cached" if cached else "generated"] += 1
+            except Exception as e:
+                stats["failed"] += 1
+                failures.append((symbol, str(e) or type(e).__name__))
+                print(f"Error researching {symbol}: {e}")
+            finally:
+                queue.task_done()
+
+    async def reporter():
+        while True:
+            await asyncio.sleep(PROGRESS_INTERVAL)
+            print(progress(stats, started, len(symbols)))
+
+    async with create_session(workers) as session:
+        tasks = [asyncio.create_task(worker(session)) for _ in range(workers)]
+        reporting = asyncio.create_task(reporter())
+        for symbol in symbols:
+            await queue.put(symbol)
+        for _ in tasks:
+            await queue.put(None)
+        await asyncio.gather(*tasks)
+        reporting.cancel()
+
+    print(progress(stats, started, len(symbols)))
+    print(f"Fetch scheduler: {fetcher.summary()}")
+    print(f"Model scheduler: {generator.summary()}")
+    for name, metrics in metrics_summary().items():
+        print(f"Backend {name}: {metrics}")
+    return stats, failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate investment research reports for many symbols.")
+    parser.add_argument("symbols", nargs="*", help="symbols to research (default: every symbol in equity_info)")
+    parser.add_argument("--symbols-file", help="file with one symbol per line")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="symbols researched concurrently")
+    parser.add_argument("--model-rate", type=float, default=MODEL_RATE_LIMIT, help="model calls per second")
+    parser.add_argument("--fetch-rate", type=float, default=FETCH_RATE_LIMIT, help="data requests per second")
+    parser.add_argument("--refresh-hours", type=float, default=REFRESH_AGE.total_seconds() / 3600,
+                        help="skip symbols whose report is newer than this (resumes an interrupted run)")
+    parser.add_argument("--force", action="store_true", help="regenerate every report regardless of age")
+    parser.add_argument("--backend", default=MODEL_BACKEND,
+                        help='model backend, e.g. "gemini", "ollama:gemma3:12b" or "gemini,ollama" to route between them')
+    args = parser.parse_args()
+
+    symbols = [symbol.strip().upper() for symbol in args.symbols]
+    if args.symbols_file:
+        with open(args.symbols_file) as f:
+            symbols += [line.strip().upper() for line in f if line.strip()]
+
+    try:
+        symbols = list(dict.fromkeys(symbols or load_symbols()))
+        refresh_age = None if args.force else timedelta(hours=args.refresh_hours)
+        pending = pending_symbols(symbols, refresh_age)
+        print(f"{len(symbols)} symbols, {len(symbols) - len(pending)} already up to date, {len(pending)} to research.")
+        if not pending:
+            return
+
+        stats, failures = asyncio.run(run_batch(
+            pending, get_backend(args.backend), args.workers, args.fetch_rate, args.model_rate
+        ))
+        if failures:
+            print(f"{len(failures)} symbols failed and will be retried on the next run:")
+            for symbol, error in failures:
+                print(f"  {symbol}: {error}")
+    finally:
+        close_pools()
+
+
+if __name__ == "__main__":
+    main()
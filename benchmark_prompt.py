@@ -0,0 +1,93 @@
+import os
+import json
+import time
+import argparse
+import statistics
+from stock_insert import folder_path, list_json_files
+from research_payload import build_prompt
+from llm_backends import CHARS_PER_TOKEN, get_backend
+
+
+def load_documents(folder, limit):
+    documents = []
+    for file_path in sorted(list_json_files(folder))[:limit]:
+        with open(file_path, 'rb') as f:
+            documents.append((os.path.basename(file_path)[:-5], json.loads(f.read())))
+    return documents
+
+
+def measure_prompts(documents, compact):
+    """Build every prompt one way; returns per-document sizes (tokens estimated) and the build time."""
+    sizes = []
+    start = time.perf_counter()
+    prompts = [(symbol, build_prompt(symbol, document, compact)) for symbol, document in documents]
+    build_seconds = time.perf_counter() - start
+    for symbol, prompt in prompts:
+        tokens = len(prompt) // CHARS_PER_TOKEN
+        sizes.append({"symbol": symbol, "chars": len(prompt), "bytes": len(prompt.encode()), "tokens": tokens})
+    return prompts, sizes, build_seconds
+
+
+def measure_generation(prompts, backend):
+    """Seconds per complete() call, one call per prompt."""
+    timings = []
+    for symbol, prompt in prompts:
+        start = time.perf_counter()
+        backend.complete(prompt)
+        timings.append(time.perf_counter() - start)
+        print(f"  {symbol}: {timings[-1]:.2f}s")
+    return timings
+
+
+def report(label, sizes, build_seconds, timings=None):
+    chars = [size["chars"] for size in sizes]
+    tokens = [size["tokens"] for size in sizes]
+    line = (f"{label:<8} prompts={len(sizes)} mean_chars={statistics.mean(chars):,.0f} "
+            f"max_chars={max(chars):,} mean_tokens={statistics.mean(tokens):,.0f} "
+            f"build={build_seconds * 1000 / len(sizes):.2f}ms/prompt")
+    if timings:
+        line += f" generate_mean={statistics.mean(timings):.2f}s generate_p50={statistics.median(timings):.2f}s"
+    print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compare research prompts built from the full document with the compact payload."
+    )
+    parser.add_argument("--folder", default=folder_path, help="folder of equity-details JSON snapshots")
+    parser.add_argument("--limit", type=int, default=20, help="number of snapshots to benchmark")
+    parser.add_argument("--generate", action="store_true",
+                        help="also call the model for every prompt and time generation")
+    parser.add_argument("--backend", default="gemini:gemini-2.0-flash",
+                        help="backend used with --generate, as in llm_backends.get_backend()")
+    args = parser.parse_args()
+
+    documents = load_documents(args.folder, args.limit)
+    if not documents:
+        raise FileNotFoundError(f"No JSON snapshots found in '{args.folder}'.")
+
+    backend = get_backend(args.backend) if args.generate else None
+
+    results = {}
+    for label, compact in (("full", False), ("compact", True)):
+        prompts, sizes, build_seconds = measure_prompts(documents, compact)
+        timings = None
+        if backend:
+            print(f"Generating {label} reports with {backend!r}...")
+            timings = measure_generation(prompts, backend)
+        results[label] = (sizes, build_seconds, timings)
+
+    print()
+    for label, (sizes, build_seconds, timings) in results.items():
+        report(label, sizes, build_seconds, timings)
+    full_chars = sum(size["chars"] for size in results["full"][0])
+    compact_chars = sum(size["chars"] for size in results["compact"][0])
+    print(f"Compact prompts are {compact_chars / full_chars:.1%} of the full size.")
+    if backend:
+        full_time = statistics.mean(results["full"][2])
+        compact_time = statistics.mean(results["compact"][2])
+        print(f"Mean generation time {full_time:.2f}s -> {compact_time:.2f}s.")
+
+
+if __name__ == "__main__":
+    main()
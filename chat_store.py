@@ -0,0 +1,151 @@
+import os
+from db import connection
+from llm_backends import estimate_tokens
+
+# --- Chat History Configuration ---
+CONTEXT_TOKENS = int(os.getenv("CHAT_CONTEXT_TOKENS", 3000))  # Prompt budget: summary, recent turns and question
+SUMMARY_TRIGGER_TOKENS = 1000  # Turns outside the window are folded into the summary once they add up to this
+SUMMARY_WORDS = 250  # Target length of the rolling summary
+MAX_STORED_MESSAGES = 500  # Per conversation; older ones are covered by the summary and deleted
+
+SUMMARY_PROMPT = (
+    "Update the running summary of a conversation between a user and an AI assistant. "
+    "Keep facts, names, numbers, decisions and open questions; drop small talk. "
+    "Answer with the new summary only, in at most {words} words.\n\n"
+    "Current summary:\n{summary}\n\nNew turns:\n{turns}"
+)
+
+
+# --- Database: Create Chat Tables if Not Exists ---
+def create_chat_tables(cur):
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS chat_messages (
+        id BIGSERIAL PRIMARY KEY,
+        conversation_id VARCHAR(100) NOT NULL,
+        role VARCHAR(20) NOT NULL,
+        content TEXT NOT NULL,
+        tokens INTEGER NOT NULL,
+        created_at TIMESTAMP NOT NULL DEFAULT now()
+    );
+    CREATE INDEX IF NOT EXISTS chat_messages_conversation_idx ON chat_messages (conversation_id, id);
+    CREATE TABLE IF NOT EXISTS chat_summaries (
+        conversation_id VARCHAR(100) PRIMARY KEY,
+        summary TEXT NOT NULL,
+        covered_until BIGINT NOT NULL,
+        updated_at TIMESTAMP NOT NULL DEFAULT now()
+    );
+    """)
+
+
+def ensure_chat_tables():
+    with connection() as conn, conn.cursor() as cur:
+        create_chat_tables(cur)
+        conn.commit()
+
+
+def save_exchange(cur, conversation_id, question, reply):
+    """Store a question and its answer together, so the history always alternates user/assistant."""
+    for role, content in (("user", question), ("assistant", reply)):
+        cur.execute(
+            "INSERT INTO chat_messages (conversation_id, role, content, tokens) VALUES (%s, %s, %s, %s)",
+            (conversation_id, role, content, estimate_tokens(content))
+        )
+
+
+def load_history(cur, conversation_id, limit, before_id=None):
+    """Up to `limit` messages older than before_id (default: the newest), oldest first, starting with a user turn."""
+    cur.execute("""
+    SELECT id, role, content FROM chat_messages
+    WHERE conversation_id = %s AND id < %s
+    ORDER BY id DESC LIMIT %s
+    """, (conversation_id, before_id or 2 ** 63 - 1, limit))
+    messages = [{"id": row[0], "role": row[1], "content": row[2]} for row in reversed(cur.fetchall())]
+    while messages and messages[0]["role"] != "user":
+        messages.pop(0)
+    return messages
+
+
+def get_summary(cur, conversation_id):
+    """Return (summary, id of the last message it covers); ("", 0) before the first summary."""
+    cur.execute("SELECT summary, covered_until FROM chat_summaries WHERE conversation_id = %s", (conversation_id,))
+    row = cur.fetchone()
+    return row if row else ("", 0)
+
+
+def unsummarized_messages(cur, conversation_id, covered_until):
+    cur.execute("""
+    SELECT id, role, content, tokens FROM chat_messages
+    WHERE conversation_id = %s AND id > %s ORDER BY id
+    """, (conversation_id, covered_until))
+    return [{"id": row[0], "role": row[1], "content": row[2], "tokens": row[3]} for row in cur.fetchall()]
+
+
+def split_window(messages, budget):
+    """Split chronological messages into (overflow, window): the newest whole exchanges that fit in budget tokens."""
+    used = 0
+    start = len(messages)
+    for i in range(len(messages) - 1, -1, -1):
+        used += messages[i]["tokens"]
+        if used > budget:
+            break
+        if messages[i]["role"] == "user":
+            start = i
+    return messages[:start], messages[start:]
+
+
+def window_budget(summary, question="", budget=CONTEXT_TOKENS):
+    return budget - estimate_tokens(summary) - estimate_tokens(question)
+
+
+def build_context(cur, conversation_id, question, budget=CONTEXT_TOKENS):
+    """Chat messages for the next model call: the rolling summary, as many recent turns as
+    fit in the token budget, and the new question."""
+    summary, covered_until = get_summary(cur, conversation_id)
+    pending = unsummarized_messages(cur, conversation_id, covered_until)
+    _, window = split_window(pending, window_budget(summary, question, budget))
+    messages = []
+    if summary:
+        messages.append({"role": "system", "content": f"Summary of the conversation so far:\n{summary}"})
+    messages += [{"role": m["role"], "content": m["content"]} for m in window]
+    messages.append({"role": "user", "content": question})
+    return messages
+
+
+def roll_summary(backend, conversation_id, budget=CONTEXT_TOKENS):
+    """Fold turns that no longer fit in the window into the rolling summary, once they add up to
+    SUMMARY_TRIGGER_TOKENS, then delete messages beyond MAX_STORED_MESSAGES. Returns True if the
+    summary was updated.
+
+    The model is called outside any transaction, so no pooled connection is held while it runs.
+    """
+    with connection() as conn, conn.cursor() as cur:
+        summary, covered_until = get_summary(cur, conversation_id)
+        pending = unsummarized_messages(cur, conversation_id, covered_until)
+        conn.commit()
+    overflow, _ = split_window(pending, window_budget(summary, budget=budget))
+    if sum(m["tokens"] for m in overflow) < SUMMARY_TRIGGER_TOKENS:
+        return False
+
+    turns = "\n".join(f"{m['role'].title()}: {m['content']}" for m in overflow)
+    updated = backend.complete(
+        SUMMARY_PROMPT.format(words=SUMMARY_WORDS, summary=summary or "(none yet)", turns=turns)
+    )
+    if not updated:
+        return False
+
+    with connection() as conn, conn.cursor() as cur:
+        cur.execute("""
+        INSERT INTO chat_summaries (conversation_id, summary, covered_until) VALUES (%s, %s, %s)
+        ON CONFLICT (conversation_id) DO UPDATE SET
+          summary = EXCLUDED.summary, covered_until = EXCLUDED.covered_until, updated_at = now()
+        WHERE chat_summaries.covered_until < EXCLUDED.covered_until
+        """, (conversation_id, updated, overflow[-1]["id"]))
+        cur.execute("""
+        DELETE FROM chat_messages WHERE conversation_id = %s AND id <= %s AND id < (
+            SELECT coalesce(min(id), 0) FROM (
+                SELECT id FROM chat_messages WHERE conversation_id = %s ORDER BY id DESC LIMIT %s
+            ) newest
+        )
+        """, (conversation_id, overflow[-1]["id"], conversation_id, MAX_STORED_MESSAGES))
+        conn.commit()
+    return True
@@ -0,0 +1,82 @@
+import uuid
+import streamlit as st
+from db import connection
+from chat_store import ensure_chat_tables, load_history
+
+HISTORY_PAGE = 40  # Messages (20 exchanges) loaded per "Load earlier messages" click
+
+# Only the chat form reruns on submit when fragments are available (Streamlit 1.37+)
+fragment = getattr(st, "fragment", None) or getattr(st, "experimental_fragment", lambda func: func)
+
+
+@st.cache_resource
+def init_chat_tables():
+    ensure_chat_tables()
+
+
+def render_pair(question, reply):
+    # User message box: light blue background
+    st.markdown(
+        f"""
+        <div style="background-color: #D0E6FF; padding: 10px; border-radius: 10px; margin-bottom: 5px;">
+            <strong>User:</strong> {question}
+        </div>
+        """, unsafe_allow_html=True
+    )
+    # AI message box: light green background
+    st.markdown(
+        f"""
+        <div style="background-color: #E0FFE0; padding: 10px; border-radius: 10px; margin-bottom: 15px;">
+            <strong>AI:</strong> {reply}
+        </div>
+        """, unsafe_allow_html=True
+    )
+
+
+def pairs(messages):
+    return [(user["content"], ai["content"]) for user, ai in zip(messages[::2], messages[1::2])]
+
+
+def load_page(conversation_id, before_id=None):
+    with connection() as conn, conn.cursor() as cur:
+        page = load_history(cur, conversation_id, HISTORY_PAGE, before_id)
+        conn.commit()
+    return page
+
+
+def start_conversation(prefix):
+    """Return this page's conversation id, loading its latest history page into session state.
+
+    The id lives in the URL, so reloading the page (or restarting the app) resumes it.
+    Session state keeps only what is on screen: the loaded pages of stored history and
+    this session's exchanges (new_pairs).
+    """
+    init_chat_tables()
+    if "conversation" not in st.query_params:
+        st.query_params["conversation"] = uuid.uuid4().hex
+    conversation_id = f"{prefix}:{st.query_params['conversation']}"
+    if st.session_state.get("conversation_id") != conversation_id:
+        st.session_state.conversation_id = conversation_id
+        st.session_state.messages = load_page(conversation_id)
+        st.session_state.more_history = len(st.session_state.messages) >= HISTORY_PAGE - 1
+        st.session_state.new_pairs = []
+    return conversation_id
+
+
+def render_new_pairs():
+    # This session's exchanges with the latest first; only these re-render when a question is sent
+    for question, reply in reversed(st.session_state.new_pairs):
+        render_pair(question, reply)
+
+
+def render_history(conversation_id):
+    # Stored history with the latest exchange first
+    for question, reply in reversed(pairs(st.session_state.messages)):
+        render_pair(question, reply)
+
+    if st.session_state.more_history and st.session_state.messages:
+        if st.button("Load earlier messages"):
+            earlier = load_page(conversation_id, before_id=st.session_state.messages[0]["id"])
+            st.session_state.more_history = len(earlier) >= HISTORY_PAGE - 1
+            st.session_state.messages = earlier + st.session_state.messages
+            st.rerun()
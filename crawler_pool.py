@@ -0,0 +1,138 @@
+import time
+import asyncio
+from contextlib import asynccontextmanager
+from crawl4ai import AsyncWebCrawler
+
+# Constants
+DEFAULT_POOL_SIZE = 4  # Warm browser instances, i.e. crawls in flight
+DEFAULT_MAX_USES = 50  # Crawls served before a crawler is closed and replaced, to bound browser memory
+DEFAULT_CRAWL_TIMEOUT = 45  # Seconds per crawl
+DEFAULT_CHECKOUT_TIMEOUT = 30  # Seconds a request waits for a free crawler before giving up
+
+
+class PoolTimeout(TimeoutError):
+    """Raised when no crawler frees up within the checkout timeout."""
+
+
+class PooledCrawler:
+    def __init__(self, crawler):
+        self.crawler = crawler
+        self.uses = 0
+
+
+class CrawlerPool:
+    """Fixed set of long-lived AsyncWebCrawler instances, checked out one request at a time.
+
+    The pool size caps concurrent crawls. A crawler is recycled (closed and a
+    fresh one started) after `max_uses` crawls, or straight away when a crawl
+    times out or fails, since its browser may be left in a bad state.
+    """
+
+    def __init__(self, size=DEFAULT_POOL_SIZE, max_uses=DEFAULT_MAX_USES, crawl_timeout=DEFAULT_CRAWL_TIMEOUT,
+                 checkout_timeout=DEFAULT_CHECKOUT_TIMEOUT, factory=None):
+        self.size = size
+        self.max_uses = max_uses
+        self.crawl_timeout = crawl_timeout
+        self.checkout_timeout = checkout_timeout
+        self.factory = factory or (lambda: AsyncWebCrawler(verbose=False))
+        self._idle = asyncio.Queue()
+        self.in_use = 0
+        self.waiting = 0
+        self.crawls = 0
+        self.failures = 0
+        self.timeouts = 0
+        self.recycled = 0
+        self.wait_time = 0.0
+        self.busy_time = 0.0
+        self.started = None
+
+    async def _open(self):
+        crawler = self.factory()
+        await crawler.__aenter__()  # Launches the browser; same as `async with AsyncWebCrawler()`
+        return PooledCrawler(crawler)
+
+    async def _close(self, pooled):
+        try:
+            await pooled.crawler.__aexit__(None, None, None)
+        except Exception as e:
+            print(f"Error closing crawler: {e}")
+
+    async def start(self):
+        """Launch every browser up front so the first requests don't pay startup."""
+        crawlers = await asyncio.gather(*(self._open() for _ in range(self.size)))
+        for pooled in crawlers:
+            self._idle.put_nowait(pooled)
+        self.started = time.monotonic()
+
+    async def close(self):
+        while not self._idle.empty():
+            await self._close(self._idle.get_nowait())
+
+    async def _recycle(self, pooled):
+        self.recycled += 1
+        await self._close(pooled)
+        try:
+            return await self._open()
+        except Exception as e:
+            print(f"Error starting crawler: {e}")
+            return None  # Started again on the next checkout
+
+    @asynccontextmanager
+    async def checkout(self):
+        queued = time.monotonic()
+        self.waiting += 1
+        try:
+            pooled = await asyncio.wait_for(self._idle.get(), self.checkout_timeout)
+        except asyncio.TimeoutError:
+            raise PoolTimeout(f"No crawler free after {self.checkout_timeout}s") from None
+        finally:
+            self.waiting -= 1
+        checked_out = time.monotonic()
+        self.wait_time += checked_out - queued
+        self.in_use += 1
+        healthy = True
+        try:
+            if pooled is None:
+                pooled = await self._open()
+            yield pooled.crawler
+        except BaseException:
+            healthy = False
+            raise
+        finally:
+            self.in_use -= 1
+            self.busy_time += time.monotonic() - checked_out
+            if pooled is not None:
+                pooled.uses += 1
+                if not healthy or pooled.uses >= self.max_uses:
+                    pooled = await self._recycle(pooled)
+            self._idle.put_nowait(pooled)
+
+    async def crawl(self, url, **options):
+        """Run one crawl on a pooled crawler, bounded by the crawl timeout."""
+        async with self.checkout() as crawler:
+            try:
+                result = await asyncio.wait_for(crawler.arun(url=url, **options), self.crawl_timeout)
+            except asyncio.TimeoutError:
+                self.timeouts += 1
+                raise
+            except Exception:
+                self.failures += 1
+                raise
+            self.crawls += 1
+            return result
+
+    def summary(self):
+        uptime = time.monotonic() - self.started if self.started else 0.0
+        checkouts = self.crawls + self.failures + self.timeouts
+        return {
+            "size": self.size,
+            "in_use": self.in_use,
+            "idle": self._idle.qsize(),
+            "waiting": self.waiting,
+            "utilisation": round(self.busy_time / (uptime * self.size), 3) if uptime else 0.0,
+            "crawls": self.crawls,
+            "failures": self.failures,
+            "timeouts": self.timeouts,
+            "recycled": self.recycled,
+            "avg_wait_ms": round(self.wait_time / checkouts * 1000, 1) if checkouts else 0.0,
+        }
@@ -1,13 +1,64 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, HTTPException
 from pydantic import BaseModel
-from crawl4ai import AsyncWebCrawler
 from bs4 import BeautifulSoup
 from fastapi.middleware.cors import CORSMiddleware
-from groq import Groq
+from llm_backends import get_backend, metrics_summary
+from memory_cache import LRUCache, SingleFlight
+from crawler_pool import CrawlerPool, PoolTimeout
+from summarizer import ChunkedSummarizer
 import os
+import asyncio
+import hashlib
+import aiohttp
+
+# --- Content Cache Configuration ---
+PAGE_TTL = int(os.environ.get("PAGE_CACHE_TTL", 900))  # Seconds a crawled page is served without revalidation
+PAGE_CACHE_SIZE = 64_000_000  # Characters of cleaned text kept in memory
+SUMMARY_TTL = 24 * 3600  # Summaries are keyed by content hash; the TTL only bounds how long a model's output is reused
+SUMMARY_CACHE_SIZE = 8_000_000  # Characters of summaries kept in memory
+REVALIDATE_TIMEOUT = 10  # Seconds for the conditional request that checks a stale page
+
+# --- Crawler Pool Configuration ---
+CRAWLER_POOL_SIZE = int(os.environ.get("CRAWLER_POOL_SIZE", 4))  # Warm browsers, i.e. concurrent crawls
+CRAWLER_MAX_USES = int(os.environ.get("CRAWLER_MAX_USES", 50))  # Crawls before a browser is replaced
+CRAWL_TIMEOUT = 45  # Seconds per crawl
+
+
+class Page:
+    """Cleaned text of a crawled URL plus the validators needed to revalidate it."""
+
+    def __init__(self, text, etag=None, last_modified=None):
+        self.text = text
+        self.etag = etag
+        self.last_modified = last_modified
+        self.digest = hashlib.sha1(text.encode()).hexdigest()
+
+    def __len__(self):
+        return len(self.text)
+
+
+pages = LRUCache(PAGE_CACHE_SIZE, ttl=PAGE_TTL)  # url -> Page
+summaries = LRUCache(SUMMARY_CACHE_SIZE, ttl=SUMMARY_TTL)  # (backend, content digest) -> summary
+page_flights = SingleFlight()
+summary_flights = SingleFlight()
+http_session = None  # aiohttp session for revalidation, opened at startup
+crawler_pool = CrawlerPool(CRAWLER_POOL_SIZE, max_uses=CRAWLER_MAX_USES, crawl_timeout=CRAWL_TIMEOUT)
+
+
+@asynccontextmanager
+async def lifespan(app):
+    global http_session
+    http_session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=REVALIDATE_TIMEOUT))
+    await crawler_pool.start()
+    try:
+        yield
+    finally:
+        await crawler_pool.close()
+        await http_session.close()
 
 # Initialize FastAPI app
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 # Enable CORS Middleware
 app.add_middleware(
@@ -18,45 +69,121 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Initialize Groq client
-client = Groq(api_key=os.environ.get("GROQ_API_KEY"))
+# Summarization backend: "name:model", or a comma-separated list to route to the fastest
+# available one with failover (e.g. "groq:llama3-8b-8192,ollama:llama3.2")
+SUMMARY_BACKEND = os.environ.get("SUMMARY_BACKEND", "groq:llama3-8b-8192")
+backend = get_backend(SUMMARY_BACKEND)
+# Long pages are summarized in chunks, SUMMARY_PARALLELISM model calls at a time
+SUMMARY_PARALLELISM = int(os.environ.get("SUMMARY_PARALLELISM", 4))
+summarizer = ChunkedSummarizer(backend, parallelism=SUMMARY_PARALLELISM)
 
 # Pydantic model for input
 class URLRequest(BaseModel):
     url: str
 
+def header(headers, name):
+    """Case-insensitive header lookup on the plain dict crawl4ai returns."""
+    for key, value in (headers or {}).items():
+        if key.lower() == name:
+            return value
+    return None
+
 # Function to fetch and clean content
-async def fetch_url_content(url: str) -> str:
+async def fetch_url_content(url: str) -> Page:
     try:
-        async with AsyncWebCrawler(verbose=True) as crawler:
-            result = await crawler.arun(url=url)
-            soup = BeautifulSoup(result.html, "html.parser")
-            cleaned_text = soup.get_text(separator="\n").strip()
-            return cleaned_text
+        result = await crawler_pool.crawl(url)
+    except PoolTimeout as e:
+        raise HTTPException(status_code=503, detail=f"Crawler pool busy: {e}")
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail=f"Crawl timed out after {crawler_pool.crawl_timeout}s")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error fetching content: {e}")
+    try:
+        soup = BeautifulSoup(result.html, "html.parser")
+        cleaned_text = soup.get_text(separator="\n").strip()
+        headers = getattr(result, "response_headers", None)
+        return Page(cleaned_text, header(headers, "etag"), header(headers, "last-modified"))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error fetching content: {e}")
+
+async def unchanged(url, page):
+    """Ask the origin whether a stale page changed, using its ETag/Last-Modified validators."""
+    conditions = {}
+    if page.etag:
+        conditions["If-None-Match"] = page.etag
+    if page.last_modified:
+        conditions["If-Modified-Since"] = page.last_modified
+    if not conditions or http_session is None:
+        return False
+    try:
+        async with http_session.get(url, headers=conditions) as response:
+            return response.status == 304
+    except (aiohttp.ClientError, TimeoutError):
+        return False
+
+async def get_page(url):
+    """Cached cleaned text for url: fresh entries as-is, stale ones revalidated, otherwise crawled.
+
+    Concurrent requests for the same URL share a single revalidation/crawl.
+    """
+    page, fresh = pages.lookup(url)
+    if fresh:
+        return page, True
+
+    async def load():
+        if page is not None and await unchanged(url, page):
+            pages.touch(url)
+            return page, True
+        crawled = await fetch_url_content(url)
+        pages.set(url, crawled)
+        return crawled, False
+
+    return await page_flights.run(url, load)
+
+async def get_summary(page):
+    """Summary of the page text, cached by content hash so an unchanged page is never re-summarized."""
+    key = (SUMMARY_BACKEND, page.digest)
+    summary = summaries.get(key)
+    if summary is not None:
+        return summary, True
+
+    async def load():
+        summary = await summarizer.summarize(page.text)
+        summaries.set(key, summary)
+        return summary, False
+
+    return await summary_flights.run(key, load)
 
 # Route to summarize URL content
 @app.post("/summarize")
 async def summarize_url(request: URLRequest):
     try:
         # Fetch cleaned content
-        content = await fetch_url_content(request.url)
-        
-        # Truncate content if too large
-        if len(content) > 10000:
-            content = content[:10000] + " [Content truncated...]"
-        
-        # Summarize content using Groq
-        chat_completion = client.chat.completions.create(
-            messages=[
-                {"role": "system", "content": "You are a summarizer."},
-                {"role": "user", "content": f"Summarize this content: {content}"},
-            ],
-            model="llama3-8b-8192",  # Replace with the desired model
-        )
-        
-        summary = chat_completion.choices[0].message.content
-        return {"summary": summary}
+        page, page_cached = await get_page(request.url)
+        summary, summary_cached = await get_summary(page)
+        return {"summary": summary, "cached": page_cached and summary_cached}
+    except HTTPException:
+        raise  # Keep the 503/504 from the crawler pool
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error summarizing content: {e}")
+
+# Route to report crawler pool utilisation
+@app.get("/crawler-metrics")
+async def crawler_metrics():
+    return crawler_pool.summary()
+
+# Route to inspect the page and summary caches
+@app.get("/cache-stats")
+async def cache_stats():
+    return {
+        "pages": pages.stats(),
+        "summaries": summaries.stats(),
+        "in_flight": len(page_flights) + len(summary_flights),
+        "coalesced": page_flights.coalesced + summary_flights.coalesced,
+        "chunks": summarizer.summary(),
+    }
+
+# Route to compare latency and token usage of the LLM backends
+@app.get("/llm-metrics")
+async def llm_metrics():
+    return metrics_summary()
@@ -0,0 +1,229 @@
+import os
+import time
+import asyncio
+import threading
+from contextlib import contextmanager, asynccontextmanager
+import psycopg2
+from psycopg2 import extensions
+from psycopg2.pool import ThreadedConnectionPool
+
+try:
+    import asyncpg  # Async driver for the web entry points
+except ImportError:
+    asyncpg = None
+
+# --- Database Configuration (PostgreSQL) ---
+DB_HOST = os.getenv("DB_HOST", "localhost")  # Replace with your DB host
+DB_NAME = os.getenv("DB_NAME", "stock_analytics")  # Replace with your DB name
+DB_USER = os.getenv("DB_USER", "root")  # Replace with your DB user
+DB_PASSWORD = os.getenv("DB_PASSWORD", "arka1256")  # Replace with your DB password
+
+POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 20))  # Connections per database; checkouts beyond this wait
+HEALTH_CHECK_INTERVAL = 30  # Seconds a connection may sit idle before a checkout pings it
+ASYNC_IDLE_LIFETIME = 300  # Seconds an idle async connection is kept before it is closed
+
+# Statements run through execute_prepared(), PREPAREd once per connection
+PREPARED_STATEMENTS = {}
+
+
+class PooledConnection(extensions.connection):
+    """psycopg2 connection that remembers which statements it has prepared and when it was last used."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.prepared = set()
+        self.last_used = time.monotonic()
+
+
+class BlockingPool(ThreadedConnectionPool):
+    """Thread-safe pool that opens connections on demand and waits, rather than
+    raising PoolError, when all `maxconn` of them are checked out."""
+
+    def __init__(self, maxconn, *args, **kwargs):
+        self._slots = threading.BoundedSemaphore(maxconn)
+        super().__init__(0, maxconn, *args, **kwargs)
+        self.minconn = maxconn  # Keep every returned connection open for reuse
+
+    def getconn(self, key=None):
+        self._slots.acquire()
+        try:
+            return super().getconn(key)
+        except Exception:
+            self._slots.release()
+            raise
+
+    def putconn(self, conn, key=None, close=False):
+        try:
+            super().putconn(conn, key, close)
+        finally:
+            self._slots.release()
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(dbname=None):
+    """Return the pool for dbname, creating it on first use. No connection is opened until one is needed."""
+    dbname = dbname or DB_NAME
+    with _pools_lock:
+        pool = _pools.get(dbname)
+        if pool is None:
+            pool = _pools[dbname] = BlockingPool(
+                POOL_SIZE, host=DB_HOST, dbname=dbname, user=DB_USER, password=DB_PASSWORD,
+                connection_factory=PooledConnection
+            )
+    return pool
+
+
+def is_healthy(conn):
+    """Ping conn with SELECT 1; a connection that fails is not handed out again."""
+    if conn.closed:
+        return False
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT 1")
+        conn.rollback()
+        return True
+    except psycopg2.Error:
+        return False
+
+
+def checkout(pool):
+    """Take a connection from pool, replacing any that were closed or fail a ping after sitting idle."""
+    while True:
+        conn = pool.getconn()
+        if not conn.closed and (time.monotonic() - conn.last_used < HEALTH_CHECK_INTERVAL or is_healthy(conn)):
+            return conn
+        pool.putconn(conn, close=True)
+
+
+@contextmanager
+def connection(dbname=None):
+    """Borrow a pooled connection for the duration of a with block.
+
+    Commit explicitly; anything left uncommitted (or an exception) is rolled
+    back before the connection goes back to the pool.
+    """
+    pool = get_pool(dbname)
+    conn = checkout(pool)
+    try:
+        yield conn
+    except Exception:
+        if not conn.closed:
+            try:
+                conn.rollback()
+            except psycopg2.Error:
+                pass
+        raise
+    finally:
+        conn.last_used = time.monotonic()
+        pool.putconn(conn, close=bool(conn.closed))
+
+
+def connect(dbname=None):
+    """Open a dedicated autocommit connection outside the pool, for sessions that must hold
+    their connection (e.g. LISTEN)."""
+    conn = psycopg2.connect(host=DB_HOST, dbname=dbname or DB_NAME, user=DB_USER, password=DB_PASSWORD)
+    conn.autocommit = True
+    return conn
+
+
+def close_pools():
+    with _pools_lock:
+        for pool in _pools.values():
+            pool.closeall()
+        _pools.clear()
+
+
+def register_statement(name, sql):
+    """Register a statement (with $1, $2... placeholders) for execute_prepared()."""
+    PREPARED_STATEMENTS[name] = sql
+
+
+def execute_prepared(cur, name, params=()):
+    """Execute a registered statement, preparing it first if this connection hasn't yet.
+
+    Prepared statements live for the whole session, so a pooled connection
+    parses and plans each hot statement once rather than on every call.
+    """
+    conn = cur.connection
+    if name not in conn.prepared:
+        cur.execute(f"PREPARE {name} AS {PREPARED_STATEMENTS[name]}")
+        conn.prepared.add(name)
+    if params:
+        cur.execute(f"EXECUTE {name} ({', '.join(['%s'] * len(params))})", params)
+    else:
+        cur.execute(f"EXECUTE {name}")
+
+
+def health_check(dbname=None):
+    """Round-trip SELECT 1 through the pool; returns a status dict suitable for a /health endpoint."""
+    start = time.perf_counter()
+    try:
+        with connection(dbname) as conn:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+        ok, error = True, None
+    except Exception as e:
+        ok, error = False, str(e)
+    pool = get_pool(dbname)
+    return {
+        "ok": ok,
+        "error": error,
+        "latency_ms": round((time.perf_counter() - start) * 1000, 2),
+        "in_use": len(pool._used),
+        "idle": len(pool._pool),
+    }
+
+
+# --- Async variant (asyncpg) ---
+_async_pools = {}
+
+
+async def get_async_pool(dbname=None):
+    """Return the asyncpg pool for dbname, creating it on first use within the running event loop.
+
+    asyncpg caches prepared statements per connection on its own, so queries
+    run through it are parsed once per connection as well.
+    """
+    if asyncpg is None:
+        raise RuntimeError("asyncpg is required for the async connection pool")
+    dbname = dbname or DB_NAME
+    pool = _async_pools.get(dbname)
+    if pool is None:
+        # Store the creation future so concurrent first callers share one pool
+        pool = _async_pools[dbname] = asyncio.ensure_future(asyncpg.create_pool(
+            host=DB_HOST, database=dbname, user=DB_USER, password=DB_PASSWORD,
+            min_size=0, max_size=POOL_SIZE, max_inactive_connection_lifetime=ASYNC_IDLE_LIFETIME
+        ))
+    try:
+        return await pool
+    except Exception:
+        _async_pools.pop(dbname, None)
+        raise
+
+
+@asynccontextmanager
+async def async_connection(dbname=None):
+    pool = await get_async_pool(dbname)
+    async with pool.acquire() as conn:
+        yield conn
+
+
+async def async_health_check(dbname=None):
+    start = time.perf_counter()
+    try:
+        async with async_connection(dbname) as conn:
+            await conn.fetchval("SELECT 1")
+        ok, error = True, None
+    except Exception as e:
+        ok, error = False, str(e)
+    return {"ok": ok, "error": error, "latency_ms": round((time.perf_counter() - start) * 1000, 2)}
+
+
+async def close_async_pools():
+    pools = list(_async_pools.values())
+    _async_pools.clear()
+    for pool in pools:
+        await (await pool).close()
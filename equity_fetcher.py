@@ -0,0 +1,160 @@
+import os
+import json
+import time
+import asyncio
+import aiohttp
+from selenium import webdriver
+from selenium.webdriver.chrome.service import Service as ChromeService
+from selenium.webdriver.chrome.options import Options
+from webdriver_manager.chrome import ChromeDriverManager
+from bs4 import BeautifulSoup
+from fetch_scheduler import DEFAULT_RATE, FetchScheduler
+
+# Constants
+API_BASE_URL = os.getenv("EQUITY_API_BASE_URL", "http://localhost:5000")  # Point at a stub server for testing
+DEFAULT_CONCURRENCY = 16  # Maximum requests in flight against the equity-details API
+RATE_LIMIT = float(os.getenv("EQUITY_API_RATE_LIMIT", DEFAULT_RATE))  # Requests per second
+REQUEST_TIMEOUT = 30  # Seconds per request
+KEEPALIVE_TIMEOUT = 30  # Seconds an idle pooled connection is kept open
+
+
+class BrowserRequired(Exception):
+    """Raised when an endpoint answers with something other than JSON (e.g. a JS challenge page)."""
+
+
+# Function to create Selenium WebDriver instance
+def create_webdriver():
+    chrome_options = Options()
+    chrome_options.add_argument("--headless")  # Run in headless mode
+    chrome_options.add_argument("--disable-gpu")
+    chrome_options.add_argument("--no-sandbox")
+    driver = webdriver.Chrome(
+        service=ChromeService(ChromeDriverManager().install()), options=chrome_options
+    )
+    print("WebDriver initialized.")
+    return driver
+
+
+# Function to load a JSON endpoint through the browser and parse the <pre> body
+def read_json_with_browser(driver, url):
+    driver.get(url)
+    time.sleep(1)  # Wait for the page to load
+
+    soup = BeautifulSoup(driver.page_source, "html.parser")
+    pre = soup.find("pre")
+    return json.loads(pre.text) if pre else None
+
+
+def create_session(concurrency=DEFAULT_CONCURRENCY):
+    """Return an aiohttp session whose keep-alive pool matches the concurrency limit."""
+    connector = aiohttp.TCPConnector(limit=concurrency, keepalive_timeout=KEEPALIVE_TIMEOUT)
+    return aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=REQUEST_TIMEOUT))
+
+
+async def get_json(session, url, params=None):
+    """GET url and decode the JSON body, raising BrowserRequired if it isn't JSON."""
+    async with session.get(url, params=params) as response:
+        response.raise_for_status()
+        body = await response.read()
+    try:
+        return json.loads(body)
+    except ValueError:
+        raise BrowserRequired(url)
+
+
+async def fetch_symbols_async(base_url=API_BASE_URL):
+    async with create_session(1) as session:
+        data = await get_json(session, f"{base_url}/symbols")
+    return data.get("symbols", [])
+
+
+async def fetch_equity_details_async(symbols, on_result, base_url=API_BASE_URL, concurrency=DEFAULT_CONCURRENCY,
+                                     rate=RATE_LIMIT):
+    """Fetch /equity-details for every symbol through a FetchScheduler.
+
+    Requests are rate limited, concurrency backs off when upstream throttles,
+    and throttled or dropped requests are retried with jittered backoff.
+    on_result(symbol, equity_details) is run in a worker thread so slow disk or
+    database writes don't hold up other requests. Returns the symbols whose
+    endpoint needed a browser and the scheduler's dead-letter list of
+    (symbol, error) pairs that could not be fetched.
+    """
+    scheduler = FetchScheduler(rate=rate, concurrency=concurrency, passthrough=(BrowserRequired,))
+    browser_symbols = []
+
+    async def fetch_one(session, symbol):
+        try:
+            equity_details = await scheduler.call(
+                symbol, lambda: get_json(session, f"{base_url}/equity-details", params={"symbol": symbol})
+            )
+        except BrowserRequired:
+            browser_symbols.append(symbol)
+            return
+        except Exception as e:
+            print(f"Error fetching equity details for {symbol}: {e}")
+            return
+
+        if not equity_details:
+            print(f"No data found for symbol: {symbol}.")
+            return
+        try:
+            await asyncio.to_thread(on_result, symbol, equity_details)
+        except Exception as e:
+            print(f"Error storing equity details for {symbol}: {e}")
+            scheduler.dead_letter.append((symbol, str(e)))
+
+    async with create_session(concurrency) as session:
+        await asyncio.gather(*(fetch_one(session, symbol) for symbol in symbols))
+    print(f"Scheduler: {scheduler.summary()}")
+    return browser_symbols, scheduler.dead_letter
+
+
+# Function to fetch all stock symbols, falling back to the browser if the API needs one
+def fetch_symbols(base_url=API_BASE_URL):
+    print(f"Fetching all stock symbols from {base_url}/symbols")
+    try:
+        symbols = asyncio.run(fetch_symbols_async(base_url))
+    except BrowserRequired:
+        driver = create_webdriver()
+        try:
+            data = read_json_with_browser(driver, f"{base_url}/symbols") or {}
+        finally:
+            driver.quit()
+        symbols = data.get("symbols", [])
+    print(f"Fetched {len(symbols)} symbols.")
+    return symbols
+
+
+# Function to fetch equity details for many symbols concurrently
+def fetch_equity_details(symbols, on_result, base_url=API_BASE_URL, concurrency=DEFAULT_CONCURRENCY,
+                         rate=RATE_LIMIT):
+    """Fetch equity details over pooled HTTP, then retry non-JSON endpoints in headless Chrome.
+
+    The WebDriver is only started when at least one symbol needs it. Returns
+    the dead-letter list of (symbol, error) pairs that could not be fetched.
+    """
+    start = time.perf_counter()
+    browser_symbols, dead_letter = asyncio.run(
+        fetch_equity_details_async(symbols, on_result, base_url, concurrency, rate)
+    )
+    print(f"HTTP pass over {len(symbols)} symbols finished in {time.perf_counter() - start:.1f}s.")
+
+    if not browser_symbols:
+        return dead_letter
+    print(f"Falling back to the browser for {len(browser_symbols)} symbols...")
+    driver = create_webdriver()
+    try:
+        for symbol in browser_symbols:
+            try:
+                equity_details = read_json_with_browser(driver, f"{base_url}/equity-details?symbol={symbol}")
+                if equity_details:
+                    on_result(symbol, equity_details)
+                else:
+                    print(f"No data found for symbol: {symbol}.")
+            except Exception as e:
+                print(f"Error fetching equity details for {symbol}: {e}")
+                dead_letter.append((symbol, str(e)))
+    finally:
+        driver.quit()
+        print("WebDriver closed.")
+    return dead_letter
@@ -0,0 +1,162 @@
+import io
+import os
+import json
+import shutil
+import argparse
+from datetime import date
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+import pyarrow.dataset as ds
+from db import connection
+from stock_insert import HISTORY_TABLES
+
+# Directory the Parquet datasets are written under, one sub-directory per table
+EXPORT_DIR = os.path.join(os.getcwd(), 'parquet')
+
+# Tables exported and the expression giving each row's partition date. Current-state
+# tables hold one snapshot, dated by the export run (equity_metadata.last_update_time is
+# insert-only, so it never advances); history rows are dated by their capture time.
+EXPORT_TABLES = {
+    table: "current_date"
+    for table in [
+        "equity_info", "equity_metadata", "equity_price_info", "equity_industry_info", "trade_info",
+        "security_wise_dp", "corporate_actions", "shareholdings_patterns", "financial_results", "board_meeting",
+    ]
+}
+HISTORY_EXPORT_TABLES = {table: "t.captured_at::date" for table in HISTORY_TABLES}
+
+PARTITIONING = ds.partitioning(pa.schema([("snapshot_date", pa.date32()), ("sector", pa.string())]), flavor="hive")
+
+
+def arrow_type(data_type, decimal=False):
+    """Map an information_schema data_type onto the Arrow type it is exported as."""
+    if data_type == 'numeric':
+        return pa.decimal128(38, 10) if decimal else pa.float64()
+    if data_type == 'bigint':
+        return pa.int64()
+    if data_type == 'integer':
+        return pa.int32()
+    if data_type == 'boolean':
+        return pa.bool_()
+    if data_type == 'date':
+        return pa.date32()
+    if data_type.startswith('timestamp'):
+        return pa.timestamp('us')
+    return pa.string()  # varchar, text, and arrays (decoded from JSON afterwards)
+
+
+def table_columns(cur, table):
+    """Return (column name, data_type) pairs for table in ordinal order."""
+    cur.execute(
+        "SELECT column_name, data_type FROM information_schema.columns WHERE table_name = %s "
+        "ORDER BY ordinal_position",
+        (table,)
+    )
+    return cur.fetchall()
+
+
+def read_table(conn, table, date_expression, decimal=False, since=None):
+    """Pull one table out of Postgres as an Arrow table with snapshot_date and sector columns.
+
+    The rows are streamed with COPY ... TO STDOUT (CSV) and parsed by Arrow's
+    multithreaded CSV reader straight into typed columns, so no per-row Python
+    objects are built.
+    """
+    with conn.cursor() as cur:
+        columns = table_columns(cur, table)
+        select = ", ".join(
+            f"array_to_json(t.{name})::text AS {name}" if data_type == 'ARRAY' else f"t.{name}"
+            for name, data_type in columns
+        )
+        if 'sector' not in dict(columns):
+            select += ", i.sector"  # equity_industry_info already carries its own sector
+        where = f"WHERE {date_expression} >= '{since}'" if since else ""
+        query = f"""
+            SELECT {select}, {date_expression} AS snapshot_date
+            FROM {table} t
+            LEFT JOIN equity_industry_info i ON i.symbol = t.symbol
+            {where}
+        """
+        buffer = io.BytesIO()
+        cur.execute("SET DateStyle TO ISO")
+        cur.copy_expert(f"COPY ({query}) TO STDOUT WITH (FORMAT csv, HEADER)", buffer)
+    buffer.seek(0)
+
+    column_types = {name: arrow_type(data_type, decimal) for name, data_type in columns}
+    column_types.update(snapshot_date=pa.date32(), sector=pa.string())
+    arrow_table = pa_csv.read_csv(buffer, convert_options=pa_csv.ConvertOptions(
+        column_types=column_types,
+        true_values=['t'],
+        false_values=['f'],
+        strings_can_be_null=True,  # COPY writes NULL as an unquoted empty field and '' as ""
+        quoted_strings_can_be_null=False,
+    ))
+
+    for name, data_type in columns:
+        index = arrow_table.schema.get_field_index(name)
+        if data_type == 'ARRAY':
+            values = [json.loads(value) if value is not None else None for value in arrow_table[name].to_pylist()]
+            arrow_table = arrow_table.set_column(index, name, pa.array(values, pa.list_(pa.string())))
+        elif name == 'symbol':
+            arrow_table = arrow_table.set_column(index, name, arrow_table[name].dictionary_encode())
+    return arrow_table
+
+
+def export_table(conn, table, date_expression, export_dir=EXPORT_DIR, decimal=False, since=None, replace=False):
+    """Write table as a Parquet dataset partitioned by snapshot_date and sector.
+
+    With replace, the whole dataset is swapped for the new export (current-state
+    tables, where an older snapshot_date would repeat every row). Otherwise only
+    the partitions being written replace what was there before, so reruns of a
+    history export don't duplicate rows.
+    """
+    arrow_table = read_table(conn, table, date_expression, decimal, since)
+    target = os.path.join(export_dir, table)
+    staging = f"{target}.tmp" if replace else target
+    if replace:
+        shutil.rmtree(staging, ignore_errors=True)  # Left over from an interrupted run
+    ds.write_dataset(
+        arrow_table,
+        staging,
+        format="parquet",
+        partitioning=PARTITIONING,
+        existing_data_behavior="delete_matching",
+    )
+    if replace:
+        retired = f"{target}.old"
+        shutil.rmtree(retired, ignore_errors=True)
+        if os.path.exists(target):
+            os.rename(target, retired)
+        os.rename(staging, target)
+        shutil.rmtree(retired, ignore_errors=True)
+    print(f"Exported {arrow_table.num_rows} rows from {table}.")
+    return arrow_table.num_rows
+
+
+def load_dataset(table, export_dir=EXPORT_DIR):
+    """Open an exported table for columnar scans, e.g. load_dataset('trade_info').to_table(columns=[...])."""
+    return ds.dataset(os.path.join(export_dir, table), format="parquet", partitioning=PARTITIONING)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export the normalized equity tables as partitioned Parquet.")
+    parser.add_argument("--out", default=EXPORT_DIR, help="directory to write the datasets under")
+    parser.add_argument("--tables", nargs="*", choices=list(EXPORT_TABLES),
+                        help="tables to export (default: all current-state tables)")
+    parser.add_argument("--decimal", action="store_true",
+                        help="export NUMERIC columns as decimal128 instead of float64")
+    parser.add_argument("--history-since", type=date.fromisoformat, metavar="YYYY-MM-DD",
+                        help="also export history-table rows captured on or after this date")
+    args = parser.parse_args()
+
+    tables = {table: EXPORT_TABLES[table] for table in args.tables} if args.tables else dict(EXPORT_TABLES)
+    with connection() as conn:
+        for table, date_expression in tables.items():
+            export_table(conn, table, date_expression, args.out, args.decimal, replace=True)
+        if args.history_since:
+            for table, date_expression in HISTORY_EXPORT_TABLES.items():
+                export_table(conn, table, date_expression, args.out, args.decimal, args.history_since)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+import time
+import random
+import asyncio
+import aiohttp
+
+# Constants
+DEFAULT_RATE = 20.0  # Requests per second admitted by the token bucket
+DEFAULT_MAX_RETRIES = 6  # Attempts after the first before a key is dead-lettered
+BASE_RETRY_DELAY = 0.5  # Seconds; doubled on every attempt
+MAX_RETRY_DELAY = 60.0  # Seconds; cap on a single backoff
+DECREASE_FACTOR = 0.5  # Multiplicative cut applied to the concurrency limit when throttled
+THROTTLE_STATUSES = {429, 502, 503, 504}
+
+
+class TokenBucket:
+    """Admit at most `rate` acquisitions per second, allowing bursts of up to `capacity`."""
+
+    def __init__(self, rate=DEFAULT_RATE, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or max(rate, 1.0)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self):
+        # Holding the lock while sleeping hands out tokens in arrival order
+        async with self._lock:
+            self._refill()
+            while self.tokens < 1:
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+                self._refill()
+            self.tokens -= 1
+
+
+class AdaptiveLimiter:
+    """Concurrency limit adjusted additive-increase / multiplicative-decrease.
+
+    Every success grows the limit by 1/limit (about +1 per window of requests);
+    a throttled response halves it, at most once per `cooldown` seconds so a
+    burst of 429s from the same window only counts once.
+    """
+
+    def __init__(self, initial, minimum=1, maximum=None, decrease_factor=DECREASE_FACTOR, cooldown=1.0):
+        self.minimum = minimum
+        self.maximum = maximum or initial
+        self.limit = float(min(max(initial, minimum), self.maximum))
+        self.decrease_factor = decrease_factor
+        self.cooldown = cooldown
+        self.in_flight = 0
+        self.last_decrease = 0.0
+        self._condition = asyncio.Condition()
+
+    async def __aenter__(self):
+        async with self._condition:
+            await self._condition.wait_for(lambda: self.in_flight < int(self.limit))
+            self.in_flight += 1
+
+    async def __aexit__(self, exc_type, exc, tb):
+        async with self._condition:
+            self.in_flight -= 1
+            self._condition.notify_all()
+
+    def on_success(self):
+        self.limit = min(self.maximum, self.limit + 1 / self.limit)
+
+    def on_throttle(self):
+        now = time.monotonic()
+        if now - self.last_decrease >= self.cooldown:
+            self.limit = max(self.minimum, self.limit * self.decrease_factor)
+            self.last_decrease = now
+
+
+def error_status(error):
+    """HTTP status carried by an error: aiohttp's .status, or .status_code / .code on model API
+    (groq, google.api_core) errors."""
+    if isinstance(error, aiohttp.ClientResponseError):
+        return error.status
+    for attribute in ("status_code", "code"):
+        code = getattr(error, attribute, None)
+        if isinstance(code, int) and 100 <= code < 600:
+            return code
+    return None
+
+
+def is_throttle(error):
+    """True if the error means upstream is overloaded and we should back off."""
+    status = error_status(error)
+    if status is not None:
+        return status in THROTTLE_STATUSES or status >= 500
+    return isinstance(error, asyncio.TimeoutError)
+
+
+def is_retryable(error):
+    return is_throttle(error) or isinstance(error, aiohttp.ClientConnectionError)
+
+
+def retry_after(error):
+    """Seconds requested by a Retry-After header, if the server sent one."""
+    headers = getattr(error, "headers", None) or {}
+    try:
+        return float(headers.get("Retry-After"))
+    except (TypeError, ValueError):
+        return None
+
+
+def backoff_delay(attempt, base=BASE_RETRY_DELAY, cap=MAX_RETRY_DELAY):
+    """Full-jitter exponential backoff: uniform in [0, min(cap, base * 2**attempt)]."""
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+class FetchScheduler:
+    """Run fetches under a token bucket and an AIMD concurrency limit, retrying throttled calls.
+
+    Keys whose retries are exhausted, or that fail with a non-retryable error,
+    are recorded in `dead_letter` as (key, error) before the error is re-raised.
+    Exceptions listed in `passthrough` are re-raised untouched so callers can
+    route them elsewhere (e.g. to the browser fallback).
+    """
+
+    def __init__(self, rate=DEFAULT_RATE, concurrency=16, min_concurrency=1, max_concurrency=None,
+                 max_retries=DEFAULT_MAX_RETRIES, passthrough=()):
+        self.bucket = TokenBucket(rate) if rate else None
+        self.limiter = AdaptiveLimiter(concurrency, min_concurrency, max_concurrency or concurrency)
+        self.max_retries = max_retries
+        self.passthrough = passthrough
+        self.dead_letter = []
+        self.retries = 0
+        self.throttled = 0
+
+    async def call(self, key, func):
+        attempt = 0
+        while True:
+            async with self.limiter:
+                if self.bucket:
+                    await self.bucket.acquire()
+                try:
+                    result = await func()
+                except self.passthrough:
+                    raise
+                except Exception as e:
+                    error = e
+                else:
+                    self.limiter.on_success()
+                    return result
+
+            if is_throttle(error):
+                self.throttled += 1
+                self.limiter.on_throttle()
+            if not is_retryable(error) or attempt >= self.max_retries:
+                self.dead_letter.append((key, str(error) or type(error).__name__))
+                raise error
+
+            delay = max(backoff_delay(attempt), retry_after(error) or 0)
+            attempt += 1
+            self.retries += 1
+            await asyncio.sleep(delay)
+
+    def summary(self):
+        return (f"retries={self.retries} throttled={self.throttled} "
+                f"concurrency={int(self.limiter.limit)} dead_letter={len(self.dead_letter)}")
@@ -1,63 +1,60 @@
-import os
 from dotenv import load_dotenv
 import streamlit as st
-from ollama import chat
+from db import connection
+from llm_backends import get_backend
+from chat_store import save_exchange, build_context, roll_summary
+from chat_ui import fragment, start_conversation, render_new_pairs, render_history
 
 # Load environment variables from the .env file
 load_dotenv()
 
-# Initialize session state for conversation history
-if "messages" not in st.session_state:
-    st.session_state.messages = []
+# Local gemma3 model served by Ollama
+backend = get_backend("ollama:gemma3:12b")
+
+conversation_id = start_conversation("gemma")
 
 st.title("AI Chatbot")
 
-# Create a form for user input with automatic clearing after submission
-with st.form("chat_form", clear_on_submit=True):
-    user_question = st.text_input("Enter your question:")
-    submitted = st.form_submit_button("Send")
-    if submitted and user_question:
-        # Append the user's message to session state
-        st.session_state.messages.append({"role": "User", "content": user_question})
-        
-        # Use Ollama to stream the AI answer
-        messages = [{'role': 'user', 'content': user_question}]
-        stream = chat(model='gemma3:12b', messages=messages, stream=True)
-        ai_reply = ""
-        
-        # Create a placeholder to display streaming response
-        placeholder = st.empty()
-        for chunk in stream:
-            ai_reply += chunk['message']['content']
-            placeholder.markdown(
-                f"""
-                <div style="background-color: #E0FFE0; padding: 10px; border-radius: 10px; margin-bottom: 15px;">
-                    <strong>AI:</strong> {ai_reply}
-                </div>
-                """, unsafe_allow_html=True
-            )
-        # Clear the streaming placeholder after completion
-        placeholder.empty()
-        # Append the final AI answer to the conversation history
-        st.session_state.messages.append({"role": "AI", "content": ai_reply})
-
-# Group messages into pairs (each user message followed by an AI answer)
-pairs = list(zip(st.session_state.messages[::2], st.session_state.messages[1::2]))
-
-# Display the conversation history with the latest exchange first
-for user_msg, ai_msg in reversed(pairs):
-    # User message box: light blue background
-    st.markdown(
-        f"""
-        <div style="background-color: #D0E6FF; padding: 10px; border-radius: 10px; margin-bottom: 5px;">
-            <strong>User:</strong> {user_msg['content']}
-        </div>
-        """, unsafe_allow_html=True
-    )
-    # AI message box: light green background (with proper closing </div>)
-    st.markdown(
-        f"""
-        <div style="background-color: #E0FFE0; padding: 10px; border-radius: 10px; margin-bottom: 15px;">
-            <strong>AI:</strong> {ai_msg['content']}
-        """, unsafe_allow_html=True
-    )
+
+@fragment
+def chat():
+    # Create a form for user input with automatic clearing after submission
+    with st.form("chat_form", clear_on_submit=True):
+        user_question = st.text_input("Enter your question:")
+        submitted = st.form_submit_button("Send")
+        if submitted and user_question:
+            # Recent turns that fit the token budget, plus a summary of older ones
+            with connection() as conn, conn.cursor() as cur:
+                messages = build_context(cur, conversation_id, user_question)
+                conn.commit()
+
+            # Use Ollama to stream the AI answer
+            stream = backend.stream(messages)
+            ai_reply = ""
+
+            # Create a placeholder to display streaming response
+            placeholder = st.empty()
+            for text in stream:
+                ai_reply += text
+                placeholder.markdown(
+                    f"""
+                    <div style="background-color: #E0FFE0; padding: 10px; border-radius: 10px; margin-bottom: 15px;">
+                        <strong>AI:</strong> {ai_reply}
+                    </div>
+                    """, unsafe_allow_html=True
+                )
+            # Clear the streaming placeholder after completion
+            placeholder.empty()
+
+            # Persist the exchange, then fold turns that left the window into the summary
+            with connection() as conn, conn.cursor() as cur:
+                save_exchange(cur, conversation_id, user_question, ai_reply)
+                conn.commit()
+            st.session_state.new_pairs.append((user_question, ai_reply))
+            roll_summary(backend, conversation_id)
+
+    render_new_pairs()
+
+
+chat()
+render_history(conversation_id)
@@ -0,0 +1,235 @@
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from db import connection
+
+# Default indicator parameters
+SMA_WINDOWS = (20, 50)
+EMA_PERIODS = (12, 26)
+RSI_PERIOD = 14
+MACD_PERIODS = (12, 26, 9)  # fast, slow, signal
+BOLLINGER_WINDOW = 20
+BOLLINGER_WIDTH = 2.0
+ATR_PERIOD = 14
+
+# One bar per symbol per day: the last snapshot captured that day
+DAILY_BARS_QUERY = """
+    SELECT DISTINCT ON (symbol, captured_at::date)
+        symbol, captured_at::date AS bar, open, max, min, last_price, vwap
+    FROM equity_price_history
+    WHERE captured_at >= %s
+    ORDER BY symbol, captured_at::date, captured_at DESC
+"""
+
+# One bar per captured snapshot
+SNAPSHOT_BARS_QUERY = """
+    SELECT symbol, captured_at AS bar, open, max, min, last_price, vwap
+    FROM equity_price_history
+    WHERE captured_at >= %s
+    ORDER BY symbol, captured_at
+"""
+
+
+class PricePanel:
+    """Price series for the whole universe as 2-D symbol x time float arrays.
+
+    Row i of every array belongs to symbols[i], column j to bars[j]. Bars a
+    symbol has no snapshot for are NaN.
+    """
+
+    def __init__(self, symbols, bars, open, high, low, close, vwap):
+        self.symbols = list(symbols)
+        self.bars = list(bars)
+        self.open = open
+        self.high = high
+        self.low = low
+        self.close = close
+        self.vwap = vwap
+
+    @classmethod
+    def from_rows(cls, rows):
+        """Build a panel from (symbol, bar, open, high, low, close, vwap) rows."""
+        symbols = sorted({row[0] for row in rows})
+        bars = sorted({row[1] for row in rows})
+        symbol_index = {symbol: i for i, symbol in enumerate(symbols)}
+        bar_index = {bar: j for j, bar in enumerate(bars)}
+
+        fields = np.full((5, len(symbols), len(bars)), np.nan)
+        if rows:
+            i = np.fromiter((symbol_index[row[0]] for row in rows), dtype=np.intp, count=len(rows))
+            j = np.fromiter((bar_index[row[1]] for row in rows), dtype=np.intp, count=len(rows))
+            values = np.array([row[2:7] for row in rows], dtype=float).T
+            fields[:, i, j] = values
+        return cls(symbols, bars, *fields)
+
+
+def load_price_panel(since, daily=True):
+    """Load equity_price_history captured on or after `since` into a PricePanel.
+
+    Daily bars use each day's last snapshot, whose intraday min/max are the
+    day's low/high; snapshot bars keep every capture (high/low are then the
+    running intraday extremes at capture time).
+    """
+    with connection() as conn, conn.cursor() as cur:
+        cur.execute(DAILY_BARS_QUERY if daily else SNAPSHOT_BARS_QUERY, (since,))
+        rows = cur.fetchall()
+    return PricePanel.from_rows(rows)
+
+
+# --- Batched indicators over 2-D arrays (axis 1 is time) ---
+def ffill(values):
+    """Carry each row's last valid value forward over gaps; leading NaNs stay NaN."""
+    index = np.where(np.isnan(values), 0, np.arange(values.shape[1]))
+    np.maximum.accumulate(index, axis=1, out=index)
+    return values[np.arange(values.shape[0])[:, None], index]
+
+
+def ewm(values, alpha):
+    """Exponentially weighted mean along time, seeded with each row's first valid value.
+
+    Matches pandas' ewm(alpha=alpha, adjust=False). The recursion steps over
+    time once, with every step vectorized across all symbols.
+    """
+    out = np.empty_like(values)
+    previous = np.full(values.shape[0], np.nan)
+    for t in range(values.shape[1]):
+        current = values[:, t]
+        updated = np.where(np.isnan(previous), current, previous + alpha * (current - previous))
+        previous = np.where(np.isnan(current), previous, updated)
+        out[:, t] = previous
+    return out
+
+
+def rolling(values, window):
+    """Windows of the last `window` bars at each bar; NaN-padded before the first full window."""
+    padded = np.concatenate([np.full((values.shape[0], window - 1), np.nan), values], axis=1)
+    return sliding_window_view(padded, window, axis=1)
+
+
+def sma(close, window):
+    return rolling(close, window).mean(axis=-1)
+
+
+def ema(close, period):
+    return ewm(close, 2 / (period + 1))
+
+
+def rsi(close, period=RSI_PERIOD):
+    """Relative strength index with Wilder smoothing (alpha = 1/period)."""
+    change = np.diff(close, axis=1, prepend=np.nan)
+    gain = ewm(np.where(change > 0, change, np.where(np.isnan(change), np.nan, 0.0)), 1 / period)
+    loss = ewm(np.where(change < 0, -change, np.where(np.isnan(change), np.nan, 0.0)), 1 / period)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(loss == 0, 100.0, 100 - 100 / (1 + gain / loss))
+
+
+def macd(close, fast=MACD_PERIODS[0], slow=MACD_PERIODS[1], signal=MACD_PERIODS[2]):
+    """Return (macd line, signal line, histogram)."""
+    line = ema(close, fast) - ema(close, slow)
+    signal_line = ewm(line, 2 / (signal + 1))
+    return line, signal_line, line - signal_line
+
+
+def bollinger(close, window=BOLLINGER_WINDOW, width=BOLLINGER_WIDTH):
+    """Return (middle, upper, lower) bands using the population standard deviation."""
+    windows = rolling(close, window)
+    middle = windows.mean(axis=-1)
+    spread = width * windows.std(axis=-1)
+    return middle, middle + spread, middle - spread
+
+
+def true_range(high, low, close):
+    previous_close = np.concatenate([np.full((close.shape[0], 1), np.nan), close[:, :-1]], axis=1)
+    ranges = np.fmax(high - low, np.fmax(np.abs(high - previous_close), np.abs(low - previous_close)))
+    return np.where(np.isnan(previous_close), high - low, ranges)
+
+
+def atr(high, low, close, period=ATR_PERIOD):
+    """Average true range with Wilder smoothing."""
+    return ewm(true_range(high, low, close), 1 / period)
+
+
+def compute_indicators(panel):
+    """Compute every indicator for the whole universe; returns name -> symbol x time array."""
+    close = ffill(panel.close)
+    high = np.where(np.isnan(panel.high), close, panel.high)
+    low = np.where(np.isnan(panel.low), close, panel.low)
+
+    results = {f"sma_{window}": sma(close, window) for window in SMA_WINDOWS}
+    results.update({f"ema_{period}": ema(close, period) for period in EMA_PERIODS})
+    results["rsi"] = rsi(close)
+    results["macd"], results["macd_signal"], results["macd_hist"] = macd(close)
+    results["bb_middle"], results["bb_upper"], results["bb_lower"] = bollinger(close)
+    results["atr"] = atr(high, low, close)
+    return results
+
+
+class IncrementalIndicators:
+    """Keep the running state of every indicator so a new bar costs O(symbols), not O(history).
+
+    Build it from history with from_panel(), then call update() with one value
+    per symbol (in self.symbols order) as each bar arrives.
+    """
+
+    def __init__(self, symbols):
+        self.symbols = list(symbols)
+        size = len(self.symbols)
+        self.window = max(SMA_WINDOWS + (BOLLINGER_WINDOW,))
+        self.closes = np.full((size, self.window), np.nan)  # Last `window` closes, oldest first
+        self.previous_close = np.full(size, np.nan)
+        self.ema = {period: np.full(size, np.nan) for period in set(EMA_PERIODS + MACD_PERIODS[:2])}
+        self.macd_signal = np.full(size, np.nan)
+        self.avg_gain = np.full(size, np.nan)
+        self.avg_loss = np.full(size, np.nan)
+        self.atr = np.full(size, np.nan)
+
+    @classmethod
+    def from_panel(cls, panel):
+        state = cls(panel.symbols)
+        for t in range(len(panel.bars)):
+            state.update(panel.close[:, t], panel.high[:, t], panel.low[:, t])
+        return state
+
+    @staticmethod
+    def _step(previous, current, alpha):
+        updated = np.where(np.isnan(previous), current, previous + alpha * (current - previous))
+        return np.where(np.isnan(current), previous, updated)
+
+    def update(self, close, high=None, low=None):
+        """Fold one bar into the state and return the latest value of every indicator."""
+        close = np.where(np.isnan(close), self.previous_close, close)
+        high = close if high is None else np.where(np.isnan(high), close, high)
+        low = close if low is None else np.where(np.isnan(low), close, low)
+
+        self.closes = np.concatenate([self.closes[:, 1:], close[:, None]], axis=1)
+        for period in self.ema:
+            self.ema[period] = self._step(self.ema[period], close, 2 / (period + 1))
+
+        fast, slow, signal = MACD_PERIODS
+        macd_line = self.ema[fast] - self.ema[slow]
+        self.macd_signal = self._step(self.macd_signal, macd_line, 2 / (signal + 1))
+
+        change = close - self.previous_close
+        gain = np.where(change > 0, change, np.where(np.isnan(change), np.nan, 0.0))
+        loss = np.where(change < 0, -change, np.where(np.isnan(change), np.nan, 0.0))
+        self.avg_gain = self._step(self.avg_gain, gain, 1 / RSI_PERIOD)
+        self.avg_loss = self._step(self.avg_loss, loss, 1 / RSI_PERIOD)
+
+        previous_close = self.previous_close
+        ranges = np.fmax(high - low, np.fmax(np.abs(high - previous_close), np.abs(low - previous_close)))
+        tr = np.where(np.isnan(previous_close), high - low, ranges)
+        self.atr = self._step(self.atr, tr, 1 / ATR_PERIOD)
+        self.previous_close = close
+
+        results = {f"sma_{window}": self.closes[:, -window:].mean(axis=1) for window in SMA_WINDOWS}
+        results.update({f"ema_{period}": self.ema[period] for period in EMA_PERIODS})
+        with np.errstate(divide="ignore", invalid="ignore"):
+            results["rsi"] = np.where(self.avg_loss == 0, 100.0, 100 - 100 / (1 + self.avg_gain / self.avg_loss))
+        results["macd"] = macd_line
+        results["macd_signal"] = self.macd_signal
+        results["macd_hist"] = macd_line - self.macd_signal
+        bands = self.closes[:, -BOLLINGER_WINDOW:]
+        middle = bands.mean(axis=1)
+        spread = BOLLINGER_WIDTH * bands.std(axis=1)
+        results["bb_middle"], results["bb_upper"], results["bb_lower"] = middle, middle + spread, middle - spread
+        results["atr"] = self.atr
+        return results
@@ -0,0 +1,278 @@
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Query, WebSocket, WebSocketDisconnect
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
+from equity_fetcher import API_BASE_URL, BrowserRequired, create_session, get_json
+from fetch_scheduler import FetchScheduler
+import os
+import json
+import time
+import asyncio
+
+# --- Feed Configuration ---
+FEED_INTERVAL = float(os.environ.get("FEED_INTERVAL", 15))  # Seconds between fetch cycles
+FEED_SYMBOLS = [s.strip().upper() for s in os.environ.get("FEED_SYMBOLS", "").split(",") if s.strip()]  # Always fetched
+FEED_CONCURRENCY = 16  # equity-details requests in flight per cycle
+FEED_RATE_LIMIT = float(os.environ.get("FEED_RATE_LIMIT", 20))  # Requests per second
+FEED_MAX_RETRIES = 2  # Keep retries short; the next cycle fetches the symbol again anyway
+SUBSCRIBER_QUEUE = 256  # Messages buffered per subscriber; the oldest are dropped for slow consumers
+KEEPALIVE_INTERVAL = 15  # Seconds between SSE comments that keep idle connections open
+
+# Fields pushed to subscribers, as paths into the equity-details document
+FEED_FIELDS = {
+    "lastPrice": ("equityDetails", "priceInfo", "lastPrice"),
+    "change": ("equityDetails", "priceInfo", "change"),
+    "pChange": ("equityDetails", "priceInfo", "pChange"),
+    "previousClose": ("equityDetails", "priceInfo", "previousClose"),
+    "open": ("equityDetails", "priceInfo", "open"),
+    "vwap": ("equityDetails", "priceInfo", "vwap"),
+    "intraDayLow": ("equityDetails", "priceInfo", "intraDayHighLow", "min"),
+    "intraDayHigh": ("equityDetails", "priceInfo", "intraDayHighLow", "max"),
+    "lowerCP": ("equityDetails", "priceInfo", "lowerCP"),
+    "upperCP": ("equityDetails", "priceInfo", "upperCP"),
+    "totalBuyQuantity": ("tradeInfo", "marketDeptOrderBook", "totalBuyQuantity"),
+    "totalSellQuantity": ("tradeInfo", "marketDeptOrderBook", "totalSellQuantity"),
+    "totalTradedVolume": ("tradeInfo", "marketDeptOrderBook", "tradeInfo", "totalTradedVolume"),
+    "totalTradedValue": ("tradeInfo", "marketDeptOrderBook", "tradeInfo", "totalTradedValue"),
+    "totalMarketCap": ("tradeInfo", "marketDeptOrderBook", "tradeInfo", "totalMarketCap"),
+    "deliveryToTradedQuantity": ("tradeInfo", "securityWiseDP", "deliveryToTradedQuantity"),
+    "lastUpdateTime": ("equityDetails", "metadata", "lastUpdateTime"),
+}
+
+
+def extract_fields(equity_details):
+    """The FEED_FIELDS values of an equity-details document; missing paths are left out."""
+    fields = {}
+    for name, path in FEED_FIELDS.items():
+        value = equity_details
+        for key in path:
+            value = value.get(key) if isinstance(value, dict) else None
+        if value is not None:
+            fields[name] = value
+    return fields
+
+
+def diff_fields(previous, current):
+    return {name: value for name, value in current.items() if previous.get(name) != value}
+
+
+class Subscriber:
+    """One websocket/SSE client: the symbols it follows and a bounded queue of messages for it."""
+
+    def __init__(self, symbols=()):
+        self.symbols = set(symbols)
+        self.queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE)
+        self.dropped = 0
+
+    def push(self, message):
+        if self.queue.full():
+            self.queue.get_nowait()  # A slow client loses the oldest update, not the newest
+            self.dropped += 1
+        self.queue.put_nowait(message)
+
+
+class Feed:
+    """Fetch the symbols someone follows every FEED_INTERVAL and fan changed fields out to subscribers.
+
+    One fetch per symbol per cycle serves every subscriber. The last snapshot of
+    each symbol is kept in memory; a new subscriber gets it straight away,
+    then only the fields that changed.
+    """
+
+    def __init__(self, base_url=API_BASE_URL, interval=FEED_INTERVAL, always=FEED_SYMBOLS):
+        self.base_url = base_url
+        self.interval = interval
+        self.always = set(always)
+        self.snapshots = {}  # symbol -> {"fields": {...}, "updated": epoch seconds}
+        self.subscribers = set()
+        self.wakeup = asyncio.Event()
+        self.scheduler = FetchScheduler(
+            rate=FEED_RATE_LIMIT, concurrency=FEED_CONCURRENCY, max_retries=FEED_MAX_RETRIES,
+            passthrough=(BrowserRequired,)
+        )
+        self.cycles = 0
+        self.last_cycle_seconds = None
+        self.updates = 0
+        self.errors = 0
+
+    def symbols(self):
+        followed = set(self.always)
+        for subscriber in self.subscribers:
+            followed |= subscriber.symbols
+        return followed
+
+    def subscribe(self, subscriber, symbols):
+        symbols = {symbol.strip().upper() for symbol in symbols if symbol.strip()}
+        new = symbols - self.symbols()
+        subscriber.symbols |= symbols
+        self.subscribers.add(subscriber)
+        for symbol in symbols:
+            snapshot = self.snapshots.get(symbol)
+            if snapshot:
+                subscriber.push({"type": "snapshot", "symbol": symbol, **snapshot})
+        if new:
+            self.wakeup.set()  # Fetch newly followed symbols now rather than at the next tick
+
+    def unsubscribe(self, subscriber, symbols=None):
+        if symbols is None:
+            self.subscribers.discard(subscriber)
+        else:
+            subscriber.symbols -= {symbol.strip().upper() for symbol in symbols}
+
+    def publish(self, symbol, equity_details):
+        current = extract_fields(equity_details)
+        previous = self.snapshots.get(symbol)
+        changes = diff_fields(previous["fields"], current) if previous else current
+        if not changes:
+            return
+        updated = time.time()
+        self.snapshots[symbol] = {"fields": current, "updated": updated}
+        message = {"type": "update" if previous else "snapshot", "symbol": symbol, "fields": changes,
+                   "updated": updated}
+        for subscriber in self.subscribers:
+            if symbol in subscriber.symbols:
+                subscriber.push(message)
+                self.updates += 1
+
+    async def fetch_one(self, session, symbol):
+        try:
+            equity_details = await self.scheduler.call(
+                symbol, lambda: get_json(session, f"{self.base_url}/equity-details", params={"symbol": symbol})
+            )
+        except Exception as e:
+            self.errors += 1
+            print(f"Error fetching equity details for {symbol}: {e}")
+            return
+        if equity_details:
+            self.publish(symbol, equity_details)
+
+    async def run(self):
+        async with create_session(FEED_CONCURRENCY) as session:
+            while True:
+                self.wakeup.clear()
+                symbols = self.symbols()
+                # Drop snapshots nobody follows any more so memory tracks the subscriptions
+                for symbol in set(self.snapshots) - symbols:
+                    del self.snapshots[symbol]
+                if symbols:
+                    started = time.monotonic()
+                    await asyncio.gather(*(self.fetch_one(session, symbol) for symbol in symbols))
+                    self.scheduler.dead_letter.clear()
+                    self.last_cycle_seconds = round(time.monotonic() - started, 3)
+                    self.cycles += 1
+                try:
+                    await asyncio.wait_for(self.wakeup.wait(), self.interval)
+                except asyncio.TimeoutError:
+                    pass
+
+    def summary(self):
+        return {
+            "subscribers": len(self.subscribers),
+            "symbols": len(self.symbols()),
+            "cycles": self.cycles,
+            "last_cycle_seconds": self.last_cycle_seconds,
+            "updates_pushed": self.updates,
+            "fetch_errors": self.errors,
+            "dropped": sum(subscriber.dropped for subscriber in self.subscribers),
+            "scheduler": self.scheduler.summary(),
+        }
+
+
+feed = None
+
+
+@asynccontextmanager
+async def lifespan(app):
+    global feed
+    feed = Feed()
+    fetch_loop = asyncio.create_task(feed.run())
+    try:
+        yield
+    finally:
+        fetch_loop.cancel()
+        try:
+            await fetch_loop
+        except asyncio.CancelledError:
+            pass
+
+# Initialize FastAPI app
+app = FastAPI(lifespan=lifespan)
+
+# Enable CORS Middleware
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=["*"],  # Replace "*" with the frontend URL in production
+    allow_credentials=True,
+    allow_methods=["*"],
+    allow_headers=["*"],
+)
+
+
+def parse_symbols(symbols):
+    return [symbol for symbol in (symbols or "").split(",") if symbol.strip()]
+
+
+# Websocket feed: ?symbols=A,B to start, then {"subscribe": [...]} / {"unsubscribe": [...]} messages
+@app.websocket("/ws")
+async def websocket_feed(websocket: WebSocket, symbols: str = ""):
+    await websocket.accept()
+    subscriber = Subscriber()
+    feed.subscribe(subscriber, parse_symbols(symbols))
+
+    async def receive():
+        while True:
+            request = await websocket.receive_json()
+            if request.get("subscribe"):
+                feed.subscribe(subscriber, request["subscribe"])
+            if request.get("unsubscribe"):
+                feed.unsubscribe(subscriber, request["unsubscribe"])
+
+    receiving = asyncio.create_task(receive())
+    try:
+        while True:
+            sending = asyncio.create_task(subscriber.queue.get())
+            done, _ = await asyncio.wait({sending, receiving}, return_when=asyncio.FIRST_COMPLETED)
+            if receiving in done:
+                sending.cancel()
+                receiving.result()  # Raises WebSocketDisconnect when the client goes away
+            await websocket.send_json(sending.result())
+    except (WebSocketDisconnect, RuntimeError):
+        pass
+    finally:
+        receiving.cancel()
+        feed.unsubscribe(subscriber)
+
+
+# Server-sent events feed for clients that only need to listen
+@app.get("/stream")
+async def sse_feed(symbols: str = Query(..., description="Comma-separated symbols")):
+    subscriber = Subscriber()
+    feed.subscribe(subscriber, parse_symbols(symbols))
+
+    async def events():
+        try:
+            while True:
+                try:
+                    message = await asyncio.wait_for(subscriber.queue.get(), KEEPALIVE_INTERVAL)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                yield f"event: {message['type']}\ndata: {json.dumps(message)}\n\n"
+        finally:
+            feed.unsubscribe(subscriber)
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+
+# Latest snapshot of one followed symbol
+@app.get("/snapshot/{symbol}")
+async def snapshot(symbol: str):
+    current = feed.snapshots.get(symbol.upper())
+    if current is None:
+        raise HTTPException(status_code=404, detail=f"No snapshot for {symbol}; subscribe to it first")
+    return {"symbol": symbol.upper(), **current}
+
+
+@app.get("/feed-metrics")
+async def feed_metrics():
+    return feed.summary()
@@ -0,0 +1,533 @@
+import os
+import math
+import time
+import base64
+import asyncio
+import hashlib
+import threading
+from collections import deque
+from dotenv import load_dotenv
+
+try:
+    import google.generativeai as genai
+except ImportError:
+    genai = None
+
+try:
+    import ollama  # Local models
+except ImportError:
+    ollama = None
+
+try:
+    from groq import Groq
+except ImportError:
+    Groq = None
+
+# Load environment variables from the .env file
+load_dotenv()
+
+# Constants
+DEFAULT_BACKEND = os.getenv("LLM_BACKEND", "gemini")  # Backend used when a caller doesn't pick one
+GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-2.0-flash")
+OLLAMA_MODEL = os.getenv("OLLAMA_MODEL", "gemma3:12b")
+GROQ_MODEL = os.getenv("GROQ_MODEL", "llama3-8b-8192")
+OLLAMA_HOST = os.getenv("OLLAMA_HOST")  # None means the client's default (http://localhost:11434)
+DEFAULT_TIMEOUT = 120.0  # Seconds a whole call (waiting for a slot included) may take
+METRICS_WINDOW = 200  # Recent calls kept per backend for latency percentiles
+LATENCY_SMOOTHING = 0.3  # Weight of the newest call in a backend's smoothed latency
+FAILURE_COOLDOWN = 30.0  # Seconds a router skips a backend after it fails
+CHARS_PER_TOKEN = 4  # Used to estimate token counts when a backend doesn't report them
+
+
+class LLMTimeout(TimeoutError):
+    """Raised when a call exceeds its timeout, including time spent waiting for a concurrency slot."""
+
+
+class CallMetrics:
+    """Timing and token counts of one call."""
+
+    def __init__(self, backend, model):
+        self.backend = backend
+        self.model = model
+        self.latency = None  # Seconds from the call to its last chunk
+        self.first_token = None  # Seconds from the call to its first chunk
+        self.prompt_tokens = None
+        self.completion_tokens = None
+        self.characters = 0
+        self.ok = False
+        self.error = None
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of sorted values (always one of the samples), or None if empty."""
+    if not values:
+        return None
+    return values[max(0, math.ceil(fraction * len(values)) - 1)]
+
+
+class BackendMetrics:
+    """Running totals and a window of recent calls for one backend."""
+
+    def __init__(self, window=METRICS_WINDOW):
+        self.calls = 0
+        self.errors = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.smoothed_latency = None
+        self.last_failure = None
+        self.recent = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, call):
+        with self._lock:
+            self.calls += 1
+            self.recent.append(call)
+            self.prompt_tokens += call.prompt_tokens or 0
+            self.completion_tokens += call.completion_tokens or 0
+            if call.error:
+                self.errors += 1
+                self.last_failure = time.monotonic()
+            elif call.ok:
+                self.smoothed_latency = call.latency if self.smoothed_latency is None else (
+                    LATENCY_SMOOTHING * call.latency + (1 - LATENCY_SMOOTHING) * self.smoothed_latency
+                )
+
+    def summary(self):
+        with self._lock:
+            finished = [call for call in self.recent if call.ok]
+        latencies = sorted(call.latency for call in finished)
+        first_tokens = sorted(call.first_token for call in finished if call.first_token is not None)
+        generating = sum(call.latency - (call.first_token or 0) for call in finished)
+        output_tokens = sum(call.completion_tokens or 0 for call in finished)
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "latency_p50": percentile(latencies, 0.50),
+            "latency_p95": percentile(latencies, 0.95),
+            "first_token_p50": percentile(first_tokens, 0.50),
+            "tokens_per_second": output_tokens / generating if generating else None,
+        }
+
+
+def to_messages(prompt, system=None, images=None):
+    """Normalize a prompt string or a list of {"role", "content"} messages into chat messages.
+
+    images (bytes or file paths) are attached to the last message.
+    """
+    messages = [{"role": "user", "content": prompt}] if isinstance(prompt, str) else [dict(m) for m in prompt]
+    if system:
+        messages.insert(0, {"role": "system", "content": system})
+    if images:
+        messages[-1]["images"] = list(images)
+    return messages
+
+
+def image_bytes(image):
+    if isinstance(image, (bytes, bytearray, memoryview)):
+        return bytes(image)
+    with open(image, "rb") as f:
+        return f.read()
+
+
+def image_mime(data):
+    if data.startswith(b"\x89PNG"):
+        return "image/png"
+    if data.startswith(b"GIF8"):
+        return "image/gif"
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "image/webp"
+    return "image/jpeg"
+
+
+def estimate_tokens(text):
+    return max(1, len(text) // CHARS_PER_TOKEN) if text else 0
+
+
+class Backend:
+    """Common interface: stream()/complete() and their async forms astream()/acomplete().
+
+    Subclasses implement _stream(messages, call, timeout), a generator of text
+    pieces that may fill in call.prompt_tokens / call.completion_tokens. The
+    wrappers here add the concurrency limit, the timeout and the metrics, so
+    every backend behaves the same way to callers.
+    """
+
+    name = None
+    default_model = None
+    default_concurrency = 4
+
+    def __init__(self, model=None, timeout=DEFAULT_TIMEOUT, concurrency=None):
+        self.model_name = model or self.default_model
+        self.timeout = timeout
+        self.concurrency = concurrency or self.default_concurrency
+        self.metrics = BackendMetrics()
+        self._slots = threading.BoundedSemaphore(self.concurrency)
+
+    def __repr__(self):
+        return f"{self.name}:{self.model_name}"
+
+    def available(self):
+        """True if the backend's SDK is installed and configured."""
+        return True
+
+    def _stream(self, messages, call, timeout):
+        raise NotImplementedError
+
+    def stream(self, prompt, system=None, images=None, timeout=None):
+        """Yield the response text piece by piece."""
+        timeout = timeout or self.timeout
+        messages = to_messages(prompt, system, images)
+        call = CallMetrics(self.name, self.model_name)
+        started = time.monotonic()
+        if not self._slots.acquire(timeout=timeout):
+            call.error = "timed out waiting for a concurrency slot"
+            self.metrics.record(call)
+            raise LLMTimeout(f"{self!r}: no free slot within {timeout}s")
+        try:
+            for text in self._stream(messages, call, timeout - (time.monotonic() - started)):
+                if not text:
+                    continue
+                if call.first_token is None:
+                    call.first_token = time.monotonic() - started
+                call.characters += len(text)
+                yield text
+                if time.monotonic() - started > timeout:
+                    raise LLMTimeout(f"{self!r}: no complete response within {timeout}s")
+            call.ok = True
+        except Exception as e:
+            call.error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            self._slots.release()
+            call.latency = time.monotonic() - started
+            if call.prompt_tokens is None:
+                call.prompt_tokens = sum(estimate_tokens(str(m.get("content", ""))) for m in messages)
+            if call.completion_tokens is None:
+                call.completion_tokens = call.characters // CHARS_PER_TOKEN
+            self.metrics.record(call)
+
+    def complete(self, prompt, system=None, images=None, timeout=None):
+        return "".join(self.stream(prompt, system, images, timeout)).strip()
+
+    async def astream(self, prompt, system=None, images=None, timeout=None):
+        """Async form of stream(); the SDK call runs in a worker thread and is abandoned on timeout."""
+        timeout = timeout or self.timeout
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue()
+        finished = object()
+        stop = threading.Event()
+
+        def produce():
+            try:
+                for text in self.stream(prompt, system, images, timeout):
+                    loop.call_soon_threadsafe(queue.put_nowait, text)
+                    if stop.is_set():
+                        break
+            except BaseException as e:
+                loop.call_soon_threadsafe(queue.put_nowait, e)
+            else:
+                loop.call_soon_threadsafe(queue.put_nowait, finished)
+
+        deadline = loop.time() + timeout
+        producer = loop.run_in_executor(None, produce)
+        try:
+            while True:
+                try:
+                    item = await asyncio.wait_for(queue.get(), max(0.0, deadline - loop.time()))
+                except asyncio.TimeoutError:
+                    raise LLMTimeout(f"{self!r}: no complete response within {timeout}s")
+                if item is finished:
+                    break
+                if isinstance(item, BaseException):
+                    raise item
+                yield item
+        finally:
+            stop.set()
+            if producer.done():
+                await producer
+
+    async def acomplete(self, prompt, system=None, images=None, timeout=None):
+        return "".join([text async for text in self.astream(prompt, system, images, timeout)]).strip()
+
+
+class GeminiBackend(Backend):
+    """Google Gemini; the SDK is configured on first use rather than at import."""
+
+    name = "gemini"
+    default_model = GEMINI_MODEL
+    default_concurrency = 8
+
+    def __init__(self, model=None, timeout=DEFAULT_TIMEOUT, concurrency=None):
+        super().__init__(model, timeout, concurrency)
+        self._model = None
+
+    def available(self):
+        return genai is not None and bool(os.getenv("GEMINI_API_KEY"))
+
+    @property
+    def model(self):
+        if self._model is None:
+            if genai is None:
+                raise RuntimeError("google-generativeai is required for the gemini backend")
+            genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
+            self._model = genai.GenerativeModel(self.model_name)
+        return self._model
+
+    @staticmethod
+    def contents(messages):
+        """Gemini has user/model roles only; system text is folded into the following user turn."""
+        contents = []
+        system = []
+        for message in messages:
+            if message["role"] == "system":
+                system.append(message["content"])
+                continue
+            parts = ["\n\n".join(system + [message["content"]])] if system else [message["content"]]
+            system = []
+            for image in message.get("images", []):
+                data = image_bytes(image)
+                parts.append({"mime_type": image_mime(data), "data": data})
+            contents.append({"role": "user" if message["role"] == "user" else "model", "parts": parts})
+        return contents
+
+    def _stream(self, messages, call, timeout):
+        response = self.model.generate_content(
+            self.contents(messages), stream=True, request_options={"timeout": timeout}
+        )
+        for chunk in response:
+            usage = getattr(chunk, "usage_metadata", None)
+            if usage and usage.prompt_token_count:
+                call.prompt_tokens = usage.prompt_token_count
+                call.completion_tokens = usage.candidates_token_count
+            # Chunks without candidates (e.g. a trailing safety-rating update) have no text
+            if chunk.candidates and chunk.candidates[0].content.parts:
+                yield chunk.text
+
+
+class OllamaBackend(Backend):
+    """A local model served by Ollama, as used by gemma.py and vision.py."""
+
+    name = "ollama"
+    default_model = OLLAMA_MODEL
+    default_concurrency = 2  # A local GPU serves few requests at once
+
+    def __init__(self, model=None, timeout=DEFAULT_TIMEOUT, concurrency=None):
+        super().__init__(model, timeout, concurrency)
+        self._client = None
+
+    def available(self):
+        return ollama is not None
+
+    @property
+    def client(self):
+        if self._client is None:
+            if ollama is None:
+                raise RuntimeError("ollama is required for the ollama backend")
+            self._client = ollama.Client(host=OLLAMA_HOST, timeout=self.timeout)
+        return self._client
+
+    def _stream(self, messages, call, timeout):
+        for chunk in self.client.chat(model=self.model_name, messages=messages, stream=True):
+            if chunk.get("done"):
+                call.prompt_tokens = chunk.get("prompt_eval_count")
+                call.completion_tokens = chunk.get("eval_count")
+            yield chunk["message"]["content"]
+
+
+class GroqBackend(Backend):
+    """Groq-hosted models, as used by crawlurl.py."""
+
+    name = "groq"
+    default_model = GROQ_MODEL
+    default_concurrency = 8
+
+    def __init__(self, model=None, timeout=DEFAULT_TIMEOUT, concurrency=None):
+        super().__init__(model, timeout, concurrency)
+        self._client = None
+
+    def available(self):
+        return Groq is not None and bool(os.getenv("GROQ_API_KEY"))
+
+    @property
+    def client(self):
+        if self._client is None:
+            if Groq is None:
+                raise RuntimeError("groq is required for the groq backend")
+            self._client = Groq(api_key=os.environ.get("GROQ_API_KEY"), timeout=self.timeout)
+        return self._client
+
+    @staticmethod
+    def chat_messages(messages):
+        """Images become base64 data-URL parts, as Groq's vision models expect."""
+        converted = []
+        for message in messages:
+            if not message.get("images"):
+                converted.append({"role": message["role"], "content": message["content"]})
+                continue
+            parts = [{"type": "text", "text": message["content"]}]
+            for image in message["images"]:
+                data = image_bytes(image)
+                url = f"data:{image_mime(data)};base64,{base64.b64encode(data).decode()}"
+                parts.append({"type": "image_url", "image_url": {"url": url}})
+            converted.append({"role": message["role"], "content": parts})
+        return converted
+
+    def _stream(self, messages, call, timeout):
+        response = self.client.chat.completions.create(
+            messages=self.chat_messages(messages), model=self.model_name, stream=True, timeout=timeout
+        )
+        for chunk in response:
+            usage = getattr(getattr(chunk, "x_groq", None), "usage", None)
+            if usage:
+                call.prompt_tokens = usage.prompt_tokens
+                call.completion_tokens = usage.completion_tokens
+            if chunk.choices:
+                yield chunk.choices[0].delta.content or ""
+
+
+class FakeBackend(Backend):
+    """Deterministic stand-in for tests: the same prompt always gets the same reply.
+
+    responses maps a prompt (the last message's content) to its reply, or is a
+    function of it; otherwise the reply is built from the prompt's hash. Words
+    are streamed one at a time, `delay` seconds apart. If `error` is set it is
+    raised instead of answering.
+    """
+
+    name = "fake"
+    default_model = "fake"
+    default_concurrency = 64
+
+    def __init__(self, model=None, timeout=DEFAULT_TIMEOUT, concurrency=None, responses=None, delay=0.0,
+                 error=None):
+        super().__init__(model, timeout, concurrency)
+        self.responses = responses
+        self.delay = delay
+        self.error = error
+
+    def reply(self, prompt):
+        if callable(self.responses):
+            return self.responses(prompt)
+        if self.responses and prompt in self.responses:
+            return self.responses[prompt]
+        digest = hashlib.sha1(prompt.encode()).hexdigest()[:8]
+        return f"Fake reply {digest} to: {' '.join(prompt.split()[:12])}"
+
+    def _stream(self, messages, call, timeout):
+        if self.error:
+            raise self.error
+        words = self.reply(str(messages[-1]["content"])).split(" ")
+        call.completion_tokens = len(words)
+        for i, word in enumerate(words):
+            if self.delay:
+                time.sleep(self.delay)
+            yield word if i == 0 else " " + word
+
+
+class Router(Backend):
+    """Send each call to the fastest available backend, failing over to the next on error.
+
+    Backends are tried in order of smoothed latency; ones never used yet go
+    first so every backend gets measured. A backend that failed within
+    FAILURE_COOLDOWN seconds is tried last. A call only fails over if the
+    failing backend hadn't streamed any text yet.
+    """
+
+    name = "router"
+
+    def __init__(self, backends, cooldown=FAILURE_COOLDOWN):
+        self.backends = list(backends)
+        self.cooldown = cooldown
+        self.model_name = ",".join(repr(backend) for backend in self.backends)
+        self.timeout = max(backend.timeout for backend in self.backends)
+        self.metrics = BackendMetrics()
+
+    def available(self):
+        return any(backend.available() for backend in self.backends)
+
+    def candidates(self):
+        now = time.monotonic()
+
+        def rank(backend):
+            metrics = backend.metrics
+            cooling = metrics.last_failure is not None and now - metrics.last_failure < self.cooldown
+            return (cooling, metrics.smoothed_latency or 0.0)
+
+        return sorted((backend for backend in self.backends if backend.available()), key=rank)
+
+    def stream(self, prompt, system=None, images=None, timeout=None):
+        error = RuntimeError(f"No available backend among {self.model_name}")
+        for backend in self.candidates():
+            started = False
+            try:
+                for text in backend.stream(prompt, system, images, timeout):
+                    started = True
+                    yield text
+                return
+            except Exception as e:
+                if started:
+                    raise
+                error = e
+        raise error
+
+    async def astream(self, prompt, system=None, images=None, timeout=None):
+        error = RuntimeError(f"No available backend among {self.model_name}")
+        for backend in self.candidates():
+            started = False
+            try:
+                async for text in backend.astream(prompt, system, images, timeout):
+                    started = True
+                    yield text
+                return
+            except Exception as e:
+                if started:
+                    raise
+                error = e
+        raise error
+
+    def summary(self):
+        return {repr(backend): backend.metrics.summary() for backend in self.backends}
+
+
+BACKENDS = {backend.name: backend for backend in (GeminiBackend, OllamaBackend, GroqBackend, FakeBackend)}
+
+# Backends are shared per spec so their concurrency limits and metrics cover every caller
+_instances = {}
+_instances_lock = threading.RLock()
+
+
+def create_backend(spec, **options):
+    """Build one backend from "name" or "name:model" (e.g. "ollama:llama3.2-vision")."""
+    name, _, model = spec.strip().partition(":")
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown LLM backend '{name}'; choose from {', '.join(BACKENDS)}")
+    return BACKENDS[name](model=model or None, **options)
+
+
+def get_backend(spec=None, **options):
+    """Return the shared backend for spec (default: $LLM_BACKEND, else gemini).
+
+    A comma-separated spec such as "groq,ollama:llama3.2" returns a Router
+    over those backends.
+    """
+    spec = spec or DEFAULT_BACKEND
+    key = (spec, repr(sorted(options.items())))
+    with _instances_lock:
+        backend = _instances.get(key)
+        if backend is None:
+            parts = [part for part in spec.split(",") if part.strip()]
+            if len(parts) == 1:
+                backend = create_backend(parts[0], **options)
+            else:
+                backend = Router(get_backend(part, **options) for part in parts)
+            _instances[key] = backend
+    return backend
+
+
+def metrics_summary():
+    """Metrics of every backend created through get_backend(), keyed by its spec."""
+    with _instances_lock:
+        backends = [backend for backend in _instances.values() if not isinstance(backend, Router)]
+    return {repr(backend): backend.metrics.summary() for backend in backends}
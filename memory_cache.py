@@ -0,0 +1,134 @@
+import time
+import asyncio
+import threading
+from collections import OrderedDict
+
+
+class LRUCache:
+    """In-memory map bounded by the total size of its values, evicting least recently used first.
+
+    Entries older than `ttl` seconds are stale: get() no longer returns them,
+    but lookup() still does (flagged as stale) so callers can revalidate an
+    entry instead of rebuilding it. sizeof(value) gives each value's size
+    (default len); max_size bounds the sum.
+    """
+
+    def __init__(self, max_size, ttl=None, sizeof=len):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.sizeof = sizeof
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()  # key -> (value, size, stored_at)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def _fresh(self, stored_at):
+        return self.ttl is None or time.monotonic() - stored_at < self.ttl
+
+    def lookup(self, key):
+        """Return (value, fresh), or (None, False) if the key isn't cached."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None, False
+            self._entries.move_to_end(key)
+            fresh = self._fresh(entry[2])
+            if fresh:
+                self.hits += 1
+            else:
+                self.misses += 1
+            return entry[0], fresh
+
+    def get(self, key, default=None):
+        value, fresh = self.lookup(key)
+        return value if fresh else default
+
+    def set(self, key, value):
+        size = self.sizeof(value)
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.size -= previous[1]
+            if size > self.max_size:
+                return  # Would evict everything else and still not fit
+            self._entries[key] = (value, size, time.monotonic())
+            self.size += size
+            while self.size > self.max_size:
+                _, (_, evicted_size, _) = self._entries.popitem(last=False)
+                self.size -= evicted_size
+                self.evictions += 1
+
+    def touch(self, key):
+        """Mark an entry fresh again, e.g. after the origin confirmed it is unchanged."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries[key] = (entry[0], entry[1], time.monotonic())
+                self._entries.move_to_end(key)
+
+    def pop(self, key, default=None):
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is None:
+                return default
+            self.size -= entry[1]
+            return entry[0]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+    def stats(self):
+        return {
+            "entries": len(self._entries),
+            "size": self.size,
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+class SingleFlight:
+    """Coalesce concurrent calls for the same key into one in-flight task.
+
+    Callers share the result (or the exception). A caller being cancelled,
+    e.g. because its client disconnected, doesn't cancel the shared task.
+    """
+
+    def __init__(self):
+        self._inflight = {}
+        self.coalesced = 0
+
+    def __len__(self):
+        return len(self._inflight)
+
+    def __contains__(self, key):
+        """True while a call for key is in flight, i.e. run(key, ...) would join it."""
+        return key in self._inflight
+
+    async def run(self, key, func):
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(func())
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._finished(key, done))
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(task)
+
+    def _finished(self, key, task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled():
+            task.exception()  # Mark as retrieved even if every caller went away
@@ -0,0 +1,203 @@
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Query
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
+from starlette.concurrency import run_in_threadpool
+from db import (
+    connection, connect, close_pools, health_check, async_health_check, close_async_pools, asyncpg
+)
+from memory_cache import LRUCache
+from stock_insert import CHANGE_CHANNEL
+import os
+import select
+import threading
+import psycopg2
+
+# --- Read API Configuration ---
+CACHE_SYMBOLS = int(os.environ.get("READ_CACHE_SYMBOLS", 5000))  # Hot symbols kept in memory
+MAX_BULK_SYMBOLS = 500
+LISTEN_POLL_SECONDS = 5  # How often the listener thread checks for shutdown
+LISTEN_RETRY_SECONDS = 5  # Wait before reconnecting a dropped listener
+
+# Every per-symbol table, joined into one document per symbol; row_to_json keeps
+# the column names, and a table without a row for the symbol comes back as null
+SYMBOL_QUERY = """
+SELECT i.symbol,
+       row_to_json(i) AS info,
+       row_to_json(m) AS metadata,
+       row_to_json(p) AS price_info,
+       row_to_json(ind) AS industry_info,
+       row_to_json(t) AS trade_info,
+       row_to_json(d) AS security_wise_dp
+FROM equity_info i
+LEFT JOIN equity_metadata m ON m.symbol = i.symbol
+LEFT JOIN equity_price_info p ON p.symbol = i.symbol
+LEFT JOIN equity_industry_info ind ON ind.symbol = i.symbol
+LEFT JOIN trade_info t ON t.symbol = i.symbol
+LEFT JOIN security_wise_dp d ON d.symbol = i.symbol
+WHERE i.symbol = ANY(%s)
+"""
+SECTIONS = ["info", "metadata", "price_info", "industry_info", "trade_info", "security_wise_dp"]
+
+
+class SymbolCache:
+    """LRU cache of symbol documents, invalidated by stock_insert.py's NOTIFYs on CHANGE_CHANNEL.
+
+    A listener thread holds a dedicated connection LISTENing on the channel and
+    evicts the symbols each committed load touched. The cache is only used
+    while that listener is connected; it is cleared and bypassed while it
+    reconnects, since notifications sent in the meantime are lost. A
+    generation counter stops a read that raced an invalidation from caching
+    the pre-invalidation row.
+    """
+
+    def __init__(self, size=CACHE_SYMBOLS):
+        self.cache = LRUCache(size, sizeof=lambda document: 1)
+        self.generation = 0
+        self.listening = False
+        self.invalidations = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def get_many(self, symbols):
+        """Return {symbol: document} for the symbols that exist, from the cache where possible."""
+        found = {}
+        missing = []
+        for symbol in symbols:
+            document = self.cache.get(symbol) if self.listening else None
+            if document is None:
+                missing.append(symbol)
+            else:
+                found[symbol] = document
+        if missing:
+            generation = self.generation
+            loaded = load_documents(missing)
+            with self._lock:
+                if self.listening and generation == self.generation:
+                    for symbol, document in loaded.items():
+                        self.cache.set(symbol, document)
+            found.update(loaded)
+        return found
+
+    def invalidate(self, symbols=None):
+        with self._lock:
+            self.generation += 1
+            self.invalidations += 1
+            if symbols is None:
+                self.cache.clear()
+            else:
+                for symbol in symbols:
+                    self.cache.pop(symbol)
+
+    def listen(self):
+        while not self._stop.is_set():
+            conn = None
+            try:
+                conn = connect()
+                with conn.cursor() as cur:
+                    cur.execute(f"LISTEN {CHANGE_CHANNEL}")
+                self.invalidate()  # Anything cached before this connection may have missed a NOTIFY
+                self.listening = True
+                while not self._stop.is_set():
+                    if select.select([conn], [], [], LISTEN_POLL_SECONDS) == ([], [], []):
+                        continue
+                    conn.poll()
+                    symbols = set()
+                    while conn.notifies:
+                        symbols.update(conn.notifies.pop(0).payload.split(","))
+                    if symbols:
+                        self.invalidate(symbols)
+            except (psycopg2.Error, OSError) as e:
+                print(f"Cache listener lost its connection ({e}); retrying in {LISTEN_RETRY_SECONDS}s")
+                self._stop.wait(LISTEN_RETRY_SECONDS)
+            finally:
+                self.listening = False
+                self.invalidate()
+                if conn is not None:
+                    conn.close()
+
+    def start(self):
+        self._thread = threading.Thread(target=self.listen, name="read-api-listener", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(LISTEN_POLL_SECONDS + 1)
+
+    def stats(self):
+        return {**self.cache.stats(), "listening": self.listening, "invalidations": self.invalidations}
+
+
+def load_documents(symbols):
+    with connection() as conn, conn.cursor() as cur:
+        cur.execute(SYMBOL_QUERY, (list(symbols),))
+        rows = cur.fetchall()
+        conn.commit()
+    return {row[0]: dict(zip(SECTIONS, row[1:])) for row in rows}
+
+
+symbol_cache = SymbolCache()
+
+
+@asynccontextmanager
+async def lifespan(app):
+    symbol_cache.start()
+    try:
+        yield
+    finally:
+        symbol_cache.stop()
+        close_pools()
+        await close_async_pools()
+
+# Initialize FastAPI app
+app = FastAPI(lifespan=lifespan)
+
+# Enable CORS Middleware
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=["*"],  # Replace "*" with the frontend URL in production
+    allow_credentials=True,
+    allow_methods=["*"],
+    allow_headers=["*"],
+)
+
+# Everything about one symbol (plain def routes run in FastAPI's threadpool, so a cache miss
+# waits on the database in a worker thread rather than blocking the event loop)
+@app.get("/symbols/{symbol}")
+def get_symbol(symbol: str):
+    symbol = symbol.strip().upper()
+    document = symbol_cache.get_many([symbol]).get(symbol)
+    if document is None:
+        raise HTTPException(status_code=404, detail=f"Unknown symbol {symbol}")
+    return {"symbol": symbol, **document}
+
+
+# Several symbols in one call: ?symbols=A,B,C; unknown symbols are listed under "missing"
+@app.get("/symbols")
+def get_symbols(symbols: str = Query(..., description="Comma-separated symbols")):
+    requested = list(dict.fromkeys(s.strip().upper() for s in symbols.split(",") if s.strip()))
+    if len(requested) > MAX_BULK_SYMBOLS:
+        raise HTTPException(status_code=413, detail=f"At most {MAX_BULK_SYMBOLS} symbols per request")
+    documents = symbol_cache.get_many(requested)
+    return {
+        "symbols": {symbol: documents[symbol] for symbol in requested if symbol in documents},
+        "missing": [symbol for symbol in requested if symbol not in documents],
+    }
+
+
+@app.get("/cache-stats")
+def cache_stats():
+    return symbol_cache.stats()
+
+
+# Round trip through the threaded pool the routes use, and the async pool when asyncpg is installed
+@app.get("/health")
+async def health():
+    status = {"pool": await run_in_threadpool(health_check)}
+    if asyncpg is not None:
+        status["async_pool"] = await async_health_check()
+    status["cache_listening"] = symbol_cache.listening
+    ok = all(check["ok"] for check in status.values() if isinstance(check, dict))
+    return JSONResponse(content={"ok": ok, **status}, status_code=200 if ok else 503)
@@ -0,0 +1,105 @@
+import json
+from datetime import date, datetime
+from stock_insert import TABLE_COLUMNS, extract_rows
+
+# Version of the prompt below; part of the report cache key in stock_research.py
+PROMPT_VERSION = 2
+
+# Columns of the normalized rows (see stock_insert.extract_rows) that the report prompt
+# asks about. Everything else in the equity-details document is left out of the prompt.
+PROMPT_FIELDS = {
+    "equity_info": ["symbol", "company_name"],
+    "equity_industry_info": ["macro", "sector", "industry", "basic_industry"],
+    "equity_metadata": ["pd_sector_pe", "pd_symbol_pe", "last_update_time"],
+    "equity_price_info": [
+        "last_price", "change", "p_change", "previous_close", "vwap", "week_high_low_min", "week_high_low_max"
+    ],
+    "trade_info": [
+        "total_buy_quantity", "total_sell_quantity", "trade_info_total_market_cap", "ffmc",
+        "trade_info_total_traded_value"
+    ],
+    "security_wise_dp": [
+        "quantity_traded", "delivery_quantity", "delivery_to_traded_quantity", "sec_wise_del_pos_date"
+    ],
+    "financial_results": [
+        "from_date", "to_date", "income", "expenditure", "re_pro_loss_bef_tax", "pro_loss_aft_tax", "re_dil_eps",
+        "audited", "consolidated"
+    ],
+}
+RECENT_RESULTS = 4  # Most recent financial results included
+
+PROMPT_TEMPLATE = (
+    "You are the best investment research analyst. "
+    "Below are the key data points for the stock '{symbol}' as compact JSON: "
+    "market capitalization, last price, sector PE, symbol PE, recent financial results, "
+    "market department order book total buy quantity, total sell quantity, and security-wise delivery position (if available). "
+    "Based on these data points, write a short, concise investment research report that includes a company overview, "
+    "financial highlights, risk factors, and a recommendation summary.\n\n"
+    "{payload}"
+)
+
+# The original prompt, which embeds the whole document; kept for benchmark_prompt.py
+FULL_PROMPT_TEMPLATE = (
+    "You are the best investment research analyst. "
+    "Below is the JSON data for the stock '{symbol}'. "
+    "Extract the following key details: market capitalization, last price, sector PE, symbol PE, financial results, "
+    "market department order book total buy quantity, total sell quantity, and security-wise delivery position (if available). "
+    "Based on these data points, write a short, concise investment research report that includes a company overview, "
+    "financial highlights, risk factors, and a recommendation summary.\n\n"
+    "{payload}"
+)
+
+
+def result_date(value):
+    try:
+        return datetime.strptime(value, '%d-%b-%Y')
+    except (TypeError, ValueError):
+        return datetime.min
+
+
+def pick(table, row):
+    """Keep the PROMPT_FIELDS columns of a row, dropping empty values."""
+    values = dict(zip(TABLE_COLUMNS[table], row))
+    return {
+        column: values[column].isoformat() if isinstance(values[column], (date, datetime)) else values[column]
+        for column in PROMPT_FIELDS[table]
+        if values[column] not in (None, '', 'NA', '-')
+    }
+
+
+def compact_payload(equity_json, recent_results=RECENT_RESULTS):
+    """Reduce an equity-details document to the fields the report prompt uses.
+
+    Reuses stock_insert.extract_rows() for the field mapping, so the prompt
+    sees the same cleaned values that are loaded into Postgres.
+    """
+    rows = extract_rows(equity_json)
+    payload = {}
+    for table in PROMPT_FIELDS:
+        if table == "financial_results":
+            continue
+        if rows[table]:
+            payload.update(pick(table, rows[table][0]))
+
+    results = sorted(
+        rows["financial_results"], key=lambda row: (result_date(row[2]), result_date(row[1])), reverse=True
+    )
+    payload["financial_results"] = [pick("financial_results", row) for row in results[:recent_results]]
+    return payload
+
+
+def payload_text(equity_json):
+    """Deterministic compact JSON of the prompt inputs (same document, same text).
+
+    Falls back to the full document if it doesn't have the shape extract_rows() expects.
+    """
+    try:
+        return json.dumps(compact_payload(equity_json), separators=(',', ':'), default=str)
+    except (KeyError, TypeError, ValueError, AttributeError):
+        return json.dumps(equity_json, sort_keys=True, separators=(',', ':'), default=str)
+
+
+def build_prompt(symbol, equity_json, compact=True):
+    if compact:
+        return PROMPT_TEMPLATE.format(symbol=symbol, payload=payload_text(equity_json))
+    return FULL_PROMPT_TEMPLATE.format(symbol=symbol, payload=json.dumps(equity_json))
@@ -0,0 +1,95 @@
+import hashlib
+from datetime import timedelta
+from db import register_statement, execute_prepared
+from research_payload import PROMPT_VERSION, payload_text
+
+# --- Report Cache Configuration ---
+REPORT_CACHE_TTL = timedelta(hours=24)  # Cached reports older than this are regenerated
+REPORT_CACHE_MAX_ENTRIES = 10000  # Least recently used reports beyond this are evicted
+
+# Latest report per symbol; generated_at doubles as the batch run checkpoint
+register_statement("upsert_research_report", """
+    INSERT INTO investment_research (symbol, research_report, generated_at)
+    VALUES ($1, $2, now())
+    ON CONFLICT (symbol) DO UPDATE SET
+      research_report = EXCLUDED.research_report,
+      generated_at = EXCLUDED.generated_at
+""")
+
+
+# --- Database: Create Research Report Table if Not Exists ---
+def create_research_table(cur):
+    create_table_sql = """
+    CREATE TABLE IF NOT EXISTS investment_research (
+        symbol VARCHAR(20) PRIMARY KEY,
+        research_report TEXT,
+        generated_at TIMESTAMP
+    );
+    ALTER TABLE investment_research ADD COLUMN IF NOT EXISTS generated_at TIMESTAMP;
+    """
+    cur.execute(create_table_sql)
+
+
+# --- Insert Research Report into Database ---
+def insert_research_report(cur, symbol, report):
+    execute_prepared(cur, "upsert_research_report", (symbol, report))
+
+
+def reports_generated_within(cur, age):
+    """Symbols whose report in investment_research was written within `age` (a timedelta).
+
+    The cutoff is taken from the database clock, the same one that stamps generated_at.
+    """
+    cur.execute("SELECT symbol FROM investment_research WHERE generated_at >= now() - %s::interval", (age,))
+    return {row[0] for row in cur.fetchall()}
+
+
+# --- Report Cache ---
+def create_report_cache_table(cur):
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS research_report_cache (
+        symbol VARCHAR(20) NOT NULL,
+        input_hash CHAR(40) NOT NULL,
+        prompt_version INTEGER NOT NULL,
+        research_report TEXT NOT NULL,
+        created_at TIMESTAMP NOT NULL DEFAULT now(),
+        last_accessed TIMESTAMP NOT NULL DEFAULT now(),
+        PRIMARY KEY (symbol, input_hash, prompt_version)
+    );
+    CREATE INDEX IF NOT EXISTS research_report_cache_last_accessed_idx
+        ON research_report_cache (last_accessed);
+    """)
+
+
+def report_input_hash(equity_json):
+    """SHA-1 of the prompt payload, so only changes to the fields the report uses miss the cache."""
+    return hashlib.sha1(payload_text(equity_json).encode()).hexdigest()
+
+
+def get_cached_report(cur, symbol, input_hash, prompt_version=None, ttl=REPORT_CACHE_TTL):
+    """Return the cached report if one is fresh, marking it as recently used; otherwise None."""
+    cur.execute("""
+    UPDATE research_report_cache SET last_accessed = clock_timestamp()
+    WHERE symbol = %s AND input_hash = %s AND prompt_version = %s AND created_at > now() - %s
+    RETURNING research_report
+    """, (symbol, input_hash, prompt_version or PROMPT_VERSION, ttl))
+    row = cur.fetchone()
+    return row[0] if row else None
+
+
+def store_cached_report(cur, symbol, input_hash, report, prompt_version=None,
+                        ttl=REPORT_CACHE_TTL, max_entries=REPORT_CACHE_MAX_ENTRIES):
+    """Cache a report, then drop expired entries and the least recently used beyond max_entries."""
+    cur.execute("""
+    INSERT INTO research_report_cache (symbol, input_hash, prompt_version, research_report, last_accessed)
+    VALUES (%s, %s, %s, %s, clock_timestamp())
+    ON CONFLICT (symbol, input_hash, prompt_version) DO UPDATE SET
+      research_report = EXCLUDED.research_report, created_at = now(), last_accessed = EXCLUDED.last_accessed
+    """, (symbol, input_hash, prompt_version or PROMPT_VERSION, report))
+    cur.execute("DELETE FROM research_report_cache WHERE created_at <= now() - %s", (ttl,))
+    cur.execute("""
+    DELETE FROM research_report_cache WHERE (symbol, input_hash, prompt_version) IN (
+        SELECT symbol, input_hash, prompt_version FROM research_report_cache
+        ORDER BY last_accessed DESC OFFSET %s
+    )
+    """, (max_entries,))
@@ -0,0 +1,228 @@
+import time
+import threading
+import numpy as np
+import pandas as pd
+from db import connection
+from export_parquet import EXPORT_DIR, load_dataset
+
+# Seconds a loaded snapshot is reused before the next screen reloads it
+SNAPSHOT_MAX_AGE = 300
+
+# One row per symbol with every field the screens use
+SNAPSHOT_QUERY = """
+    SELECT
+        e.symbol, e.company_name, ind.macro, ind.sector, ind.industry, ind.basic_industry,
+        m.pd_sector_pe, m.pd_symbol_pe, m.last_update_time,
+        p.last_price, p.change, p.p_change, p.previous_close, p.open, p.vwap,
+        p.min AS intraday_low, p.max AS intraday_high,
+        p.week_high_low_min, p.week_high_low_max,
+        t.total_buy_quantity, t.total_sell_quantity, t.trade_info_total_traded_volume,
+        t.trade_info_total_traded_value, t.trade_info_total_market_cap, t.ffmc, t.impact_cost,
+        d.quantity_traded, d.delivery_quantity, d.delivery_to_traded_quantity
+    FROM equity_info e
+    LEFT JOIN equity_metadata m ON m.symbol = e.symbol
+    LEFT JOIN equity_industry_info ind ON ind.symbol = e.symbol
+    LEFT JOIN equity_price_info p ON p.symbol = e.symbol
+    LEFT JOIN trade_info t ON t.symbol = e.symbol
+    LEFT JOIN security_wise_dp d ON d.symbol = e.symbol
+"""
+
+# Text columns; everything else is loaded as float64 so NULL becomes NaN
+TEXT_COLUMNS = {"symbol", "company_name", "macro", "sector", "industry", "basic_industry", "last_update_time"}
+
+
+def load_from_postgres():
+    """Load the screening snapshot from the normalized tables."""
+    with connection() as conn, conn.cursor() as cur:
+        cur.execute(SNAPSHOT_QUERY)
+        columns = [description[0] for description in cur.description]
+        rows = cur.fetchall()
+
+    frame = pd.DataFrame.from_records(rows, columns=columns)
+    for column in columns:
+        if column not in TEXT_COLUMNS:
+            frame[column] = pd.to_numeric(frame[column], errors="coerce").astype("float64")
+    return frame.set_index("symbol", drop=False)
+
+
+def load_from_parquet(export_dir=EXPORT_DIR):
+    """Load the same snapshot from the Parquet export (see export_parquet.py) instead of Postgres."""
+    tables = {
+        "equity_info": ["symbol", "company_name"],
+        "equity_industry_info": ["symbol", "macro", "sector", "industry", "basic_industry"],
+        "equity_metadata": ["symbol", "pd_sector_pe", "pd_symbol_pe", "last_update_time"],
+        "equity_price_info": [
+            "symbol", "last_price", "change", "p_change", "previous_close", "open", "vwap", "min", "max",
+            "week_high_low_min", "week_high_low_max"
+        ],
+        "trade_info": [
+            "symbol", "total_buy_quantity", "total_sell_quantity", "trade_info_total_traded_volume",
+            "trade_info_total_traded_value", "trade_info_total_market_cap", "ffmc", "impact_cost"
+        ],
+        "security_wise_dp": ["symbol", "quantity_traded", "delivery_quantity", "delivery_to_traded_quantity"],
+    }
+    frame = None
+    for table, columns in tables.items():
+        part = load_dataset(table, export_dir).to_table(columns=columns).to_pandas()
+        part["symbol"] = part["symbol"].astype(str)
+        part = part.drop_duplicates("symbol", keep="last")
+        frame = part if frame is None else frame.merge(part, on="symbol", how="left")
+
+    frame = frame.rename(columns={"min": "intraday_low", "max": "intraday_high"})
+    for column in frame.columns:
+        if column not in TEXT_COLUMNS:
+            frame[column] = pd.to_numeric(frame[column], errors="coerce").astype("float64")
+    return frame.set_index("symbol", drop=False)
+
+
+class Expr:
+    """A column expression evaluated over the whole universe at once.
+
+    Expressions compose with the usual operators and evaluate to a NumPy array
+    with one entry per symbol, e.g.
+
+        (col("pd_symbol_pe") < col("pd_sector_pe")) & (col("delivery_to_traded_quantity") > 60)
+
+    Comparisons involving NaN are False, so symbols missing a field never pass
+    a filter on it.
+    """
+
+    def __init__(self, evaluate, label):
+        self.evaluate = evaluate
+        self.label = label
+
+    def __repr__(self):
+        return self.label
+
+    def _combine(self, other, op, symbol):
+        other = other if isinstance(other, Expr) else lit(other)
+        return Expr(lambda frame: op(self.evaluate(frame), other.evaluate(frame)), f"({self} {symbol} {other})")
+
+    def __lt__(self, other):
+        return self._combine(other, np.less, "<")
+
+    def __le__(self, other):
+        return self._combine(other, np.less_equal, "<=")
+
+    def __gt__(self, other):
+        return self._combine(other, np.greater, ">")
+
+    def __ge__(self, other):
+        return self._combine(other, np.greater_equal, ">=")
+
+    def __eq__(self, other):
+        return self._combine(other, np.equal, "==")
+
+    def __ne__(self, other):
+        return self._combine(other, np.not_equal, "!=")
+
+    def __add__(self, other):
+        return self._combine(other, np.add, "+")
+
+    def __sub__(self, other):
+        return self._combine(other, np.subtract, "-")
+
+    def __mul__(self, other):
+        return self._combine(other, np.multiply, "*")
+
+    def __truediv__(self, other):
+        return self._combine(other, np.true_divide, "/")
+
+    def __and__(self, other):
+        return self._combine(other, np.logical_and, "&")
+
+    def __or__(self, other):
+        return self._combine(other, np.logical_or, "|")
+
+    def __invert__(self):
+        return Expr(lambda frame: np.logical_not(self.evaluate(frame)), f"~{self}")
+
+    __hash__ = None
+
+    def isin(self, values):
+        values = list(values)
+        return Expr(lambda frame: np.isin(self.evaluate(frame), values), f"{self}.isin({values})")
+
+    def notnull(self):
+        return Expr(lambda frame: ~pd.isna(self.evaluate(frame)), f"{self}.notnull()")
+
+
+def col(name):
+    return Expr(lambda frame: frame[name].to_numpy(), name)
+
+
+def lit(value):
+    return Expr(lambda frame: value, repr(value))
+
+
+# --- Common screens ---
+def pe_below_sector():
+    return col("pd_symbol_pe") < col("pd_sector_pe")
+
+
+def delivery_above(percent):
+    return col("delivery_to_traded_quantity") > percent
+
+
+def near_52_week_high(percent):
+    """Last price within `percent`% of the 52-week high."""
+    return col("last_price") >= col("week_high_low_max") * (1 - percent / 100)
+
+
+def near_52_week_low(percent):
+    return col("last_price") <= col("week_high_low_min") * (1 + percent / 100)
+
+
+def in_sector(*sectors):
+    return col("sector").isin(sectors)
+
+
+def distance_from_52_week_high():
+    """Fraction below the 52-week high; 0 at the high. Useful as a rank key."""
+    return (col("week_high_low_max") - col("last_price")) / col("week_high_low_max")
+
+
+class Screener:
+    """Hold an in-memory snapshot of the universe and run vectorized screens over it.
+
+    The snapshot is loaded on first use and reloaded once it is older than
+    max_age seconds (or on refresh()), so repeated screens don't touch the
+    database.
+    """
+
+    def __init__(self, loader=load_from_postgres, max_age=SNAPSHOT_MAX_AGE):
+        self.loader = loader
+        self.max_age = max_age
+        self.loaded_at = None
+        self._frame = None
+        self._lock = threading.Lock()
+
+    def refresh(self):
+        frame = self.loader()
+        with self._lock:
+            self._frame = frame
+            self.loaded_at = time.monotonic()
+        return frame
+
+    @property
+    def frame(self):
+        if self._frame is None or time.monotonic() - self.loaded_at > self.max_age:
+            return self.refresh()
+        return self._frame
+
+    def screen(self, *filters, rank=None, ascending=False, limit=None, columns=None):
+        """Return the symbols passing every filter, optionally ordered by a rank expression.
+
+        filters and rank are Expr objects; rank is added to the result as a
+        "rank_value" column.
+        """
+        frame = self.frame
+        mask = np.ones(len(frame), dtype=bool)
+        for expression in filters:
+            mask &= np.asarray(expression.evaluate(frame), dtype=bool)
+
+        result = frame.loc[mask, columns] if columns else frame.loc[mask]
+        if rank is not None:
+            result = result.assign(rank_value=np.asarray(rank.evaluate(frame), dtype="float64")[mask])
+            result = result.sort_values("rank_value", ascending=ascending, na_position="last")
+        return result.head(limit) if limit else result
@@ -1,22 +1,67 @@
-import json
-import psycopg2
+import io
 import os
+import json
+import hashlib
+import argparse
+import multiprocessing
+from datetime import date, datetime, timedelta
+from psycopg2.extras import execute_values
+from db import connection
 
-# --- Database Configuration (PostgreSQL) ---
-DB_HOST = "localhost"  # Replace with your DB host
-DB_NAME = "stock_analytics"  # Replace with your DB name
-DB_USER = "root"  # Replace with your DB user
-DB_PASSWORD = "arka1256"  # Replace with your DB password
+try:
+    import ijson  # Event-based parser for large snapshots
+except ImportError:
+    ijson = None
 
-conn = psycopg2.connect(host=DB_HOST, database=DB_NAME, user=DB_USER, password=DB_PASSWORD)
-cur = conn.cursor()
+try:
+    import orjson  # Faster full parse for small snapshots
+except ImportError:
+    orjson = None
 
 # Define the correct folder path containing JSON files
 folder_path = os.path.join(os.getcwd(), 'selected_stocks')
 
-# Check if folder exists
-if not os.path.exists(folder_path):
-    raise FileNotFoundError(f"Folder '{folder_path}' does not exist.")
+# Records what was last loaded from each file so unchanged snapshots are skipped
+MANIFEST_PATH = os.path.join(folder_path, '.ingest_manifest')
+
+# Snapshots larger than this (bytes) are parsed as an event stream that keeps only
+# LOADER_PATHS. Streaming holds a fraction of the memory of a full parse but costs
+# more CPU than orjson, so it is reserved for the really large documents.
+STREAM_THRESHOLD = 4 * 1024 * 1024
+
+# Parts of an equity-details document that extract_rows() reads; everything
+# else (order book depth, announcements, attachments...) is skipped when streaming
+LOADER_PATHS = {
+    'equityDetails.info',
+    'equityDetails.metadata',
+    'equityDetails.priceInfo',
+    'equityDetails.industryInfo',
+    'tradeInfo.noBlockDeals',
+    'tradeInfo.bulkBlockDeals',
+    'tradeInfo.marketDeptOrderBook.totalBuyQuantity',
+    'tradeInfo.marketDeptOrderBook.totalSellQuantity',
+    'tradeInfo.marketDeptOrderBook.tradeInfo',
+    'tradeInfo.marketDeptOrderBook.valueAtRisk',
+    'tradeInfo.securityWiseDP',
+    'corporateInfo.corporate_actions.data',
+    'corporateInfo.shareholdings_patterns.data',
+    'corporateInfo.financial_results.data',
+    'corporateInfo.borad_meeting.data',
+}
+
+# Rows sent per INSERT statement in row mode
+ROWS_PER_STATEMENT = 1000
+
+# Number of JSON files merged per transaction in bulk mode
+BULK_BATCH_SIZE = 500
+
+# Parsed files allowed to wait for the writer before parse workers block
+PIPELINE_QUEUE_SIZE = 256
+
+# NOTIFY channel carrying the symbols each committed write touched (read_api.py listens
+# on it to invalidate its cache); payloads are kept under Postgres' 8000-byte limit
+CHANGE_CHANNEL = 'equity_changed'
+NOTIFY_PAYLOAD_BYTES = 7000
 
 # Define SQL table creation statements
 create_table_statements = [
@@ -123,9 +168,9 @@ create_table_statements = [
     """
     CREATE TABLE IF NOT EXISTS corporate_actions (
         symbol VARCHAR(10) REFERENCES equity_info(symbol),
-        exdate DATE,
-        purpose VARCHAR(255),
-        UNIQUE(symbol)  -- Adding UNIQUE constraint here
+        exdate DATE NOT NULL DEFAULT 'epoch',
+        purpose VARCHAR(255) NOT NULL DEFAULT '',
+        UNIQUE(symbol, exdate, purpose)
     );
     """,
     """
@@ -136,360 +181,995 @@ create_table_statements = [
         public NUMERIC,
         shares_held_by_employee_trusts NUMERIC,
         total NUMERIC,
-        UNIQUE(symbol)  -- Adding UNIQUE constraint here
+        UNIQUE(symbol, date)
     );
     """,
     """
     CREATE TABLE IF NOT EXISTS financial_results (
         symbol VARCHAR(10) REFERENCES equity_info(symbol),
-        from_date DATE,
-        to_date DATE,
+        from_date DATE NOT NULL DEFAULT 'epoch',
+        to_date DATE NOT NULL DEFAULT 'epoch',
         expenditure NUMERIC,
         income NUMERIC,
         audited VARCHAR(255),
         cumulative VARCHAR(255),
-        consolidated VARCHAR(255),
+        consolidated VARCHAR(255) NOT NULL DEFAULT '',
         re_dil_eps NUMERIC,
         re_pro_loss_bef_tax NUMERIC,
         pro_loss_aft_tax NUMERIC,
         re_broadcast_timestamp DATE,
         xbrl_attachment VARCHAR(255),
         na_attachment VARCHAR(255),
-        UNIQUE(symbol)  -- Adding UNIQUE constraint here
+        UNIQUE(symbol, from_date, to_date, consolidated)
     );
     """,
     """
     CREATE TABLE IF NOT EXISTS board_meeting (
         symbol VARCHAR(10) REFERENCES equity_info(symbol),
-        purpose TEXT,
-        meeting_date DATE,
-        UNIQUE(symbol)  -- Adding UNIQUE constraint here
+        purpose TEXT NOT NULL DEFAULT '',
+        meeting_date DATE NOT NULL DEFAULT 'epoch',
+        UNIQUE(symbol, meeting_date, purpose)
     );
     """
 ]
 
-# Create tables if they don't exist
-for statement in create_table_statements:
-    cur.execute(statement)
+# Child tables used to be UNIQUE(symbol), which kept only the first row per symbol.
+# Move databases created that way onto the composite keys above.
+migration_statements = [
+    "ALTER TABLE corporate_actions DROP CONSTRAINT IF EXISTS corporate_actions_symbol_key",
+    """
+    CREATE UNIQUE INDEX IF NOT EXISTS corporate_actions_symbol_exdate_purpose_key
+        ON corporate_actions (symbol, exdate, purpose)
+    """,
+    "ALTER TABLE shareholdings_patterns DROP CONSTRAINT IF EXISTS shareholdings_patterns_symbol_key",
+    """
+    CREATE UNIQUE INDEX IF NOT EXISTS shareholdings_patterns_symbol_date_key
+        ON shareholdings_patterns (symbol, date)
+    """,
+    "ALTER TABLE financial_results DROP CONSTRAINT IF EXISTS financial_results_symbol_key",
+    """
+    CREATE UNIQUE INDEX IF NOT EXISTS financial_results_symbol_from_date_to_date_consolidated_key
+        ON financial_results (symbol, from_date, to_date, consolidated)
+    """,
+    "ALTER TABLE board_meeting DROP CONSTRAINT IF EXISTS board_meeting_symbol_key",
+    """
+    CREATE UNIQUE INDEX IF NOT EXISTS board_meeting_symbol_meeting_date_purpose_key
+        ON board_meeting (symbol, meeting_date, purpose)
+    """
+]
+
+# History mode: every snapshot is appended as a timestamped row. The tables are
+# range partitioned by day on captured_at so retention is a partition drop, and
+# BRIN indexes keep time-range scans cheap on append-ordered data.
+history_table_statements = [
+    """
+    CREATE TABLE IF NOT EXISTS equity_price_history (
+        captured_at TIMESTAMP NOT NULL,
+        symbol VARCHAR(10) NOT NULL,
+        last_price NUMERIC,
+        change NUMERIC,
+        p_change NUMERIC,
+        previous_close NUMERIC,
+        open NUMERIC,
+        close NUMERIC,
+        vwap NUMERIC,
+        stock_ind_close_price NUMERIC,
+        lower_cp VARCHAR(255),
+        upper_cp VARCHAR(255),
+        p_price_band VARCHAR(255),
+        base_price NUMERIC,
+        min NUMERIC,
+        max NUMERIC,
+        intraday_high_low_value NUMERIC,
+        week_high_low_min NUMERIC,
+        week_high_low_min_date DATE,
+        week_high_low_max NUMERIC,
+        week_high_low_max_date DATE,
+        week_high_low_value NUMERIC,
+        i_nav_value NUMERIC,
+        check_i_nav BOOLEAN,
+        tick_size NUMERIC,
+        PRIMARY KEY (symbol, captured_at)
+    ) PARTITION BY RANGE (captured_at);
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS equity_price_history_captured_at_brin
+        ON equity_price_history USING BRIN (captured_at);
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS trade_info_history (
+        captured_at TIMESTAMP NOT NULL,
+        symbol VARCHAR(10) NOT NULL,
+        no_block_deals BOOLEAN,
+        bulk_block_deals_name VARCHAR(255) ARRAY,
+        total_buy_quantity BIGINT,
+        total_sell_quantity BIGINT,
+        trade_info_total_traded_volume NUMERIC,
+        trade_info_total_traded_value NUMERIC,
+        trade_info_total_market_cap NUMERIC,
+        ffmc NUMERIC,
+        impact_cost NUMERIC,
+        cm_daily_volatility VARCHAR(255),
+        cm_annual_volatility VARCHAR(255),
+        market_lot VARCHAR(255),
+        active_series VARCHAR(255),
+        security_var NUMERIC,
+        index_var NUMERIC,
+        var_margin NUMERIC,
+        extreme_loss_margin NUMERIC,
+        adhoc_margin NUMERIC,
+        applicable_margin NUMERIC,
+        PRIMARY KEY (symbol, captured_at)
+    ) PARTITION BY RANGE (captured_at);
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS trade_info_history_captured_at_brin
+        ON trade_info_history USING BRIN (captured_at);
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS history_retention (
+        table_name VARCHAR(63) PRIMARY KEY,
+        retained_from DATE NOT NULL
+    );
+    """
+]
+
+# Columns loaded into each table, in load order (equity_info first for the foreign keys)
+TABLE_COLUMNS = {
+    "equity_info": ["symbol", "company_name", "industry", "isin", "slb_isin"],
+    "equity_metadata": [
+        "series", "symbol", "isin", "status", "listing_date", "industry", "last_update_time", "pd_sector_pe",
+        "pd_symbol_pe", "pd_sector_ind"
+    ],
+    "equity_price_info": [
+        "symbol", "last_price", "change", "p_change", "previous_close", "open", "close", "vwap",
+        "stock_ind_close_price", "lower_cp", "upper_cp", "p_price_band", "base_price", "min", "max",
+        "intraday_high_low_value", "week_high_low_min", "week_high_low_min_date", "week_high_low_max",
+        "week_high_low_max_date", "week_high_low_value", "i_nav_value", "check_i_nav", "tick_size"
+    ],
+    "equity_industry_info": ["symbol", "macro", "sector", "industry", "basic_industry"],
+    "trade_info": [
+        "symbol", "no_block_deals", "bulk_block_deals_name", "total_buy_quantity", "total_sell_quantity",
+        "trade_info_total_traded_volume", "trade_info_total_traded_value", "trade_info_total_market_cap", "ffmc",
+        "impact_cost", "cm_daily_volatility", "cm_annual_volatility", "market_lot", "active_series", "security_var",
+        "index_var", "var_margin", "extreme_loss_margin", "adhoc_margin", "applicable_margin"
+    ],
+    "security_wise_dp": [
+        "symbol", "quantity_traded", "delivery_quantity", "delivery_to_traded_quantity", "series_remarks",
+        "sec_wise_del_pos_date"
+    ],
+    "corporate_actions": ["symbol", "exdate", "purpose"],
+    "shareholdings_patterns": [
+        "symbol", "date", "promoter_and_promoter_group", "public", "shares_held_by_employee_trusts", "total"
+    ],
+    "financial_results": [
+        "symbol", "from_date", "to_date", "expenditure", "income", "audited", "cumulative", "consolidated",
+        "re_dil_eps", "re_pro_loss_bef_tax", "pro_loss_aft_tax", "re_broadcast_timestamp", "xbrl_attachment",
+        "na_attachment"
+    ],
+    "board_meeting": ["symbol", "purpose", "meeting_date"],
+}
+
+# History tables and the current-state table each one snapshots
+HISTORY_TABLES = {
+    "equity_price_history": "equity_price_info",
+    "trade_info_history": "trade_info",
+}
+for history_table, source_table in HISTORY_TABLES.items():
+    TABLE_COLUMNS[history_table] = ["captured_at"] + TABLE_COLUMNS[source_table]
+
+# Conflict target of each table; tables not listed are keyed by symbol alone
+TABLE_KEYS = {
+    "corporate_actions": ["symbol", "exdate", "purpose"],
+    "shareholdings_patterns": ["symbol", "date"],
+    "financial_results": ["symbol", "from_date", "to_date", "consolidated"],
+    "board_meeting": ["symbol", "meeting_date", "purpose"],
+    "equity_price_history": ["symbol", "captured_at"],
+    "trade_info_history": ["symbol", "captured_at"],
+}
+
+# Stored in place of a missing composite-key value. Postgres never treats two NULLs as
+# equal in a unique index, so a NULL key column would never conflict and every reload
+# would insert the row again.
+KEY_DEFAULTS = {
+    "exdate": "epoch", "purpose": "", "from_date": "epoch", "to_date": "epoch", "consolidated": "",
+    "meeting_date": "epoch",
+}
+
+# Tables that keep the first row seen for a key (ON CONFLICT DO NOTHING);
+# every other table overwrites its row with the latest snapshot, so restated
+# financial results and revised shareholding patterns replace the old figures.
+INSERT_ONLY_TABLES = {
+    "equity_metadata", "security_wise_dp", "corporate_actions", "board_meeting", "equity_price_history",
+    "trade_info_history"
+}
+
+# Partitions already known to exist, so history loads don't reissue the DDL for every file
+known_partitions = set()
+
+# Oldest day each history table still keeps (see set_retention); older rows are skipped
+# so a backfill can't recreate partitions that were detached or dropped
+retention_cutoffs = {}
+
+# Suffix given to detached partitions, so their name is free if that day is ever loaded again
+ARCHIVED_SUFFIX = '_archived'
+
+
+def safe_date(value):
+    """Return the date if valid, else return None."""
+    return value.replace(' EOD', '') if value not in ['-', 'NA', None] else None
+
+
+def safe_string(value):
+    """Return the string if valid, else return None."""
+    return value if value not in ['-', 'NA', None] else None
+
+
+def safe_numeric(value):
+    """Return the numeric value if valid, else return None."""
+    return float(value) if value not in ['-', 'NA', None] else None
+
+
+def delivery_date(value):
+    """Parse a securityWiseDP date (DD-MON-YYYY, optionally suffixed with EOD)."""
+    value = safe_date(value)
+    return datetime.strptime(value, '%d-%b-%Y').date() if value else None
+
+
+def snapshot_time(value):
+    """Parse metadata.lastUpdateTime (e.g. 14-Feb-2025 16:00:00), or None if it's missing."""
+    value = safe_string(value)
+    return datetime.strptime(value, '%d-%b-%Y %H:%M:%S') if value else None
+
+
+def conflict_clause(table):
+    """Return the ON CONFLICT clause used when writing rows into table."""
+    keys = TABLE_KEYS.get(table, ["symbol"])
+    target = ", ".join(keys)
+    if table in INSERT_ONLY_TABLES:
+        return f"ON CONFLICT ({target}) DO NOTHING"
+    updates = ",\n    ".join(
+        f"{column} = EXCLUDED.{column}" for column in TABLE_COLUMNS[table] if column not in keys
+    )
+    return f"ON CONFLICT ({target}) DO UPDATE SET\n    {updates}"
+
+
+def insert_sql(table):
+    """Return the multi-row upsert for table, for use with execute_values()."""
+    return f"INSERT INTO {table} ({', '.join(TABLE_COLUMNS[table])})\nVALUES %s\n{conflict_clause(table)}"
+
+
+def fill_key_defaults(table, rows):
+    """Replace None in table's composite-key columns with its KEY_DEFAULTS value."""
+    columns = TABLE_COLUMNS[table]
+    defaults = {columns.index(key): KEY_DEFAULTS[key] for key in TABLE_KEYS.get(table, []) if key in KEY_DEFAULTS}
+    if not defaults:
+        return rows
+    return [
+        tuple(defaults[position] if value is None and position in defaults else value
+              for position, value in enumerate(row))
+        for row in rows
+    ]
+
+
+def dedupe_rows(table, rows):
+    """Keep the last row per conflict key; one upsert statement can't update the same row twice."""
+    if table in INSERT_ONLY_TABLES:
+        return rows
+    columns = TABLE_COLUMNS[table]
+    positions = [columns.index(key) for key in TABLE_KEYS.get(table, ["symbol"])]
+    latest = {}
+    for row in rows:
+        latest[tuple(row[position] for position in positions)] = row
+    return list(latest.values())
+
+
+def merge_sql(table):
+    """Return the set-based upsert that moves a staging table into table.
+
+    Overwriting tables keep the last staged row per key (Postgres refuses to
+    update the same row twice in one statement); insert-only tables keep the
+    first, matching the order the per-file loader would have applied them.
+    """
+    columns = ", ".join(TABLE_COLUMNS[table])
+    if table in INSERT_ONLY_TABLES:
+        select = f"SELECT {columns} FROM stage_{table} ORDER BY stage_ord"
+    else:
+        keys = ", ".join(TABLE_KEYS.get(table, ["symbol"]))
+        select = f"SELECT DISTINCT ON ({keys}) {columns} FROM stage_{table} ORDER BY {keys}, stage_ord DESC"
+    return f"INSERT INTO {table} ({columns})\n{select}\n{conflict_clause(table)}"
+
+
+def extract_rows(data, history=False):
+    """Map one equity-details document onto row tuples, keyed by table name.
+
+    With history=True the price and trade rows are also emitted for the
+    history tables, stamped with the snapshot's lastUpdateTime.
+    """
+    # Extract data from the JSON
+    equity_details = data['equityDetails']
+    equity_info = equity_details['info']
+    equity_metadata = equity_details['metadata']
+    equity_price_info = equity_details['priceInfo']
+    equity_industry_info = equity_details['industryInfo']
+
+    trade_info = data['tradeInfo']
+    trade_info_market_dept_order_book = trade_info['marketDeptOrderBook']
+    trade_info_security_wise_dp = trade_info['securityWiseDP']
+
+    corporate_info = data['corporateInfo']
+    corporate_actions = corporate_info['corporate_actions']['data']
+    shareholdings_patterns = corporate_info['shareholdings_patterns']['data']
+    financial_results = corporate_info['financial_results']['data']
+    board_meeting = corporate_info['borad_meeting']['data']
+
+    symbol = equity_info['symbol']
+    rows = {table: [] for table in TABLE_COLUMNS}
+
+    rows["equity_info"].append((
+        equity_info['symbol'],
+        equity_info['companyName'],
+        equity_info['industry'],
+        equity_info['isin'],
+        equity_info['isin']
+    ))
+
+    rows["equity_metadata"].append((
+        equity_metadata['series'], equity_metadata['symbol'], equity_metadata['isin'], equity_metadata['status'],
+        equity_metadata['listingDate'] if equity_metadata['listingDate'] != 'NA' else None,
+        equity_metadata['industry'],
+        equity_metadata['lastUpdateTime'] if equity_metadata['lastUpdateTime'] != 'NA' else None,
+        float(equity_metadata['pdSectorPe']) if equity_metadata['pdSectorPe'] != 'NA' else None,
+        float(equity_metadata['pdSymbolPe']) if equity_metadata['pdSymbolPe'] != 'NA' else None,
+        equity_metadata['pdSectorInd'] if equity_metadata['pdSectorInd'] != 'NA' else None
+    ))
+
+    rows["equity_price_info"].append((
+        equity_info['symbol'], equity_price_info['lastPrice'], equity_price_info['change'],
+        equity_price_info['pChange'], equity_price_info['previousClose'], equity_price_info['open'],
+        equity_price_info['close'], equity_price_info['vwap'], equity_price_info['stockIndClosePrice'],
+        equity_price_info['lowerCP'], equity_price_info['upperCP'], equity_price_info['pPriceBand'],
+        equity_price_info['basePrice'], equity_price_info['intraDayHighLow']['min'],
+        equity_price_info['intraDayHighLow']['max'], equity_price_info['intraDayHighLow']['value'],
+        equity_price_info['weekHighLow']['min'], equity_price_info['weekHighLow']['minDate'],
+        equity_price_info['weekHighLow']['max'], equity_price_info['weekHighLow']['maxDate'],
+        equity_price_info['weekHighLow']['value'], equity_price_info['iNavValue'], equity_price_info['checkINAV'],
+        equity_price_info['tickSize']
+    ))
+
+    rows["equity_industry_info"].append((
+        equity_info['symbol'], equity_industry_info['macro'], equity_industry_info['sector'],
+        equity_industry_info['industry'], equity_industry_info['basicIndustry']
+    ))
+
+    rows["trade_info"].append((
+        equity_info['symbol'], trade_info['noBlockDeals'],
+        [block_deal['name'] for block_deal in trade_info['bulkBlockDeals']],
+        trade_info_market_dept_order_book['totalBuyQuantity'],
+        trade_info_market_dept_order_book['totalSellQuantity'],
+        trade_info_market_dept_order_book['tradeInfo']['totalTradedVolume'],
+        trade_info_market_dept_order_book['tradeInfo']['totalTradedValue'],
+        trade_info_market_dept_order_book['tradeInfo']['totalMarketCap'],
+        trade_info_market_dept_order_book['tradeInfo']['ffmc'],
+        trade_info_market_dept_order_book['tradeInfo']['impactCost'],
+        trade_info_market_dept_order_book['tradeInfo']['cmDailyVolatility'],
+        trade_info_market_dept_order_book['tradeInfo']['cmAnnualVolatility'],
+        trade_info_market_dept_order_book['tradeInfo']['marketLot'],
+        trade_info_market_dept_order_book['tradeInfo']['activeSeries'],
+        trade_info_market_dept_order_book['valueAtRisk']['securityVar'],
+        trade_info_market_dept_order_book['valueAtRisk']['indexVar'],
+        trade_info_market_dept_order_book['valueAtRisk']['varMargin'],
+        trade_info_market_dept_order_book['valueAtRisk']['extremeLossMargin'],
+        trade_info_market_dept_order_book['valueAtRisk']['adhocMargin'],
+        trade_info_market_dept_order_book['valueAtRisk']['applicableMargin']
+    ))
+
+    rows["security_wise_dp"].append((
+        equity_info['symbol'],
+        safe_numeric(trade_info_security_wise_dp['quantityTraded']),
+        safe_numeric(trade_info_security_wise_dp['deliveryQuantity']),
+        safe_numeric(trade_info_security_wise_dp['deliveryToTradedQuantity']),
+        safe_string(trade_info_security_wise_dp['seriesRemarks']),
+        delivery_date(trade_info_security_wise_dp['secWiseDelPosDate'])
+    ))
+
+    for action in corporate_actions:
+        rows["corporate_actions"].append((action['symbol'], action['exdate'], action['purpose']))
+
+    for pattern_date, patterns in shareholdings_patterns.items():
+        promoter_and_promoter_group = None
+        public = None
+        shares_held_by_employee_trusts = None
+        total = None
+
+        for pattern in patterns:
+            for holder_type, percentage in pattern.items():
+                holder_type = holder_type.strip()
+                percentage = percentage.strip().replace('%', '')  # Remove '%' symbol
+
+                if holder_type == "Promoter & Promoter Group":
+                    promoter_and_promoter_group = percentage
+                elif holder_type == "Public":
+                    public = percentage
+                elif holder_type == "Shares held by Employee Trusts":
+                    shares_held_by_employee_trusts = percentage
+                elif holder_type == "Total":
+                    total = percentage
+
+        rows["shareholdings_patterns"].append(
+            (symbol, pattern_date, promoter_and_promoter_group, public, shares_held_by_employee_trusts, total)
+        )
+
+    for result in financial_results:
+        rows["financial_results"].append((
+            symbol, result['from_date'], result['to_date'], result['expenditure'], result['income'], result['audited'],
+            result['cumulative'], result['consolidated'], result['reDilEPS'], result['reProLossBefTax'],
+            result['proLossAftTax'], result['re_broadcast_timestamp'], result['xbrl_attachment'],
+            result['na_attachment']
+        ))
+
+    for meeting in board_meeting:
+        rows["board_meeting"].append((meeting['symbol'], meeting['purpose'], meeting['meetingdate']))
+
+    for table in TABLE_KEYS:
+        if table in rows:
+            rows[table] = fill_key_defaults(table, rows[table])
+
+    captured_at = snapshot_time(equity_metadata['lastUpdateTime']) if history else None
+    if captured_at:
+        for history_table, source_table in HISTORY_TABLES.items():
+            rows[history_table] = [(captured_at,) + row for row in rows[source_table]]
+
+    return rows
+
+
+# --- Snapshot parsing ---
+def set_path(document, path, value):
+    """Set a dotted path in a nested dict, creating intermediate dicts."""
+    *parents, key = path.split('.')
+    for parent in parents:
+        document = document.setdefault(parent, {})
+    document[key] = value
+
+
+def stream_fields(content, paths=LOADER_PATHS):
+    """Build a document holding only `paths` from raw JSON bytes, without materializing the rest.
+
+    ijson walks the input as events; subtrees under a wanted path are rebuilt
+    with an ObjectBuilder and everything else is discarded as it is read.
+    """
+    document = {}
+    builder = None
+    depth = 0
+    for prefix, event, value in ijson.parse(io.BytesIO(content), use_float=True):
+        if builder is None:
+            if prefix not in paths or event == 'map_key' or event.startswith('end_'):
+                continue
+            if event in ('start_map', 'start_array'):
+                builder = ijson.ObjectBuilder()
+                builder_path = prefix
+                depth = 0
+            else:
+                set_path(document, prefix, value)
+                continue
+
+        builder.event(event, value)
+        if event in ('start_map', 'start_array'):
+            depth += 1
+        elif event in ('end_map', 'end_array'):
+            depth -= 1
+            if depth == 0:
+                set_path(document, builder_path, builder.value)
+                builder = None
+    return document
+
+
+def load_snapshot(content):
+    """Decode snapshot bytes, streaming just the loader's fields out of large documents."""
+    if ijson is not None and len(content) > STREAM_THRESHOLD:
+        return stream_fields(content)
+    if orjson is not None:
+        return orjson.loads(content)
+    return json.loads(content)
+
+
+def parse_file(file_path, history=False):
+    """Load a JSON snapshot from disk and extract its table rows."""
+    with open(file_path, 'rb') as f:
+        data = load_snapshot(f.read())
+    return extract_rows(data, history)
+
+
+def list_json_files(folder):
+    """Return the paths of all JSON snapshots in folder."""
+    return [os.path.join(folder, filename) for filename in os.listdir(folder) if filename.endswith('.json')]
+
+
+# --- Incremental change detection ---
+def load_manifest(path=None):
+    """Return the ingest manifest, mapping file name to its last loaded state."""
+    path = path or MANIFEST_PATH
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'r') as f:
+        return json.load(f)
+
+
+def save_manifest(manifest, path=None):
+    path = path or MANIFEST_PATH
+    # Write to a temp file first so an interrupted run can't leave a truncated manifest
+    temp_path = path + '.tmp'
+    with open(temp_path, 'w') as f:
+        json.dump(manifest, f)
+    os.replace(temp_path, path)
+
+
+def parse_changed(file_path, previous=None, history=False):
+    """Parse a snapshot, skipping work that the manifest entry `previous` shows is already loaded.
+
+    Returns (entry, rows). entry is the manifest record for the file as it is
+    now. rows is None when the file is unchanged (same mtime and size, or same
+    content hash); otherwise it holds rows only for tables whose extracted
+    contents differ from the last successful load.
+    """
+    stat = os.stat(file_path)
+    if previous and previous['mtime'] == stat.st_mtime and previous['size'] == stat.st_size:
+        return previous, None
+
+    with open(file_path, 'rb') as f:
+        content = f.read()
+    content_hash = hashlib.sha1(content).hexdigest()
+    if previous and previous['sha1'] == content_hash:
+        return dict(previous, mtime=stat.st_mtime, size=stat.st_size), None
+
+    data = load_snapshot(content)
+    rows = extract_rows(data, history)
+    table_hashes = {table: hashlib.sha1(repr(table_rows).encode()).hexdigest() for table, table_rows in rows.items()}
+    previous_hashes = previous['tables'] if previous else {}
+    entry = {
+        'mtime': stat.st_mtime,
+        'size': stat.st_size,
+        'sha1': content_hash,
+        'last_update_time': data['equityDetails']['metadata'].get('lastUpdateTime'),
+        'tables': table_hashes,
+    }
+    changed = {
+        table: table_rows if table_hashes[table] != previous_hashes.get(table) else []
+        for table, table_rows in rows.items()
+    }
+    return entry, changed
+
+
+# --- COPY helpers ---
+def copy_escape(text):
+    """Escape a value for the COPY text format."""
+    return text.replace('\\', '\\\\').replace('\t', '\\t').replace('\n', '\\n').replace('\r', '\\r')
+
+
+def copy_value(value):
+    """Render a Python value as a COPY text-format field."""
+    if value is None:
+        return '\\N'
+    if isinstance(value, bool):
+        return 't' if value else 'f'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))  # COPY won't cast "5000.0" into a BIGINT column
+    if isinstance(value, (list, tuple)):
+        elements = []
+        for element in value:
+            if element is None:
+                elements.append('NULL')
+            else:
+                elements.append('"' + str(element).replace('\\', '\\\\').replace('"', '\\"') + '"')
+        return copy_escape('{' + ','.join(elements) + '}')
+    return copy_escape(str(value))
+
+
+def copy_rows(cur, table, rows):
+    """Stream rows into the staging table for table with COPY ... FROM STDIN."""
+    buffer = io.StringIO()
+    for row in rows:
+        buffer.write('\t'.join(copy_value(value) for value in row))
+        buffer.write('\n')
+    buffer.seek(0)
+    cur.copy_expert(f"COPY stage_{table} ({', '.join(TABLE_COLUMNS[table])}) FROM STDIN", buffer)
+
+
+# --- Loaders ---
+def create_tables(conn, history=False):
+    """Create tables if they don't exist."""
+    with conn.cursor() as cur:
+        statements = create_table_statements + migration_statements
+        if history:
+            statements = statements + history_table_statements
+        for statement in statements:
+            cur.execute(statement)
+        migrate_nullable_keys(cur)
     conn.commit()
 
-# Iterate through all JSON files in the folder
-for filename in os.listdir(folder_path):
-    if filename.endswith('.json'):
-        file_path = os.path.join(folder_path, filename)
-        
-        try:
-            # Load JSON data
-            with open(file_path, 'r') as f:
-                data = json.load(f)
-
-            # Extract data from the JSON
-            equity_details = data['equityDetails']
-            equity_info = equity_details['info']
-            equity_metadata = equity_details['metadata']
-            equity_price_info = equity_details['priceInfo']
-            equity_industry_info = equity_details['industryInfo']
-
-            trade_info = data['tradeInfo']
-            trade_info_market_dept_order_book = trade_info['marketDeptOrderBook']
-            trade_info_security_wise_dp = trade_info['securityWiseDP']
-
-            corporate_info = data['corporateInfo']
-            corporate_actions = corporate_info['corporate_actions']['data']
-            shareholdings_patterns = corporate_info['shareholdings_patterns']['data']
-            financial_results = corporate_info['financial_results']['data']
-            board_meeting = corporate_info['borad_meeting']['data']
-
-            symbol = equity_info['symbol']
-
-            # Insert data into tables using parameterized queries
-            # Example: Inserting into equity_details
-            cur.execute(
-                """
-                INSERT INTO equity_info (
-                    symbol, company_name, industry, isin, slb_isin
-                )
-                VALUES (%s, %s, %s, %s, %s)
-                ON CONFLICT (symbol) DO UPDATE SET
-                    company_name = EXCLUDED.company_name,
-                    industry = EXCLUDED.industry,
-                    isin = EXCLUDED.isin,
-                    slb_isin = EXCLUDED.isin
-                """,
-                (
-                    equity_info['symbol'], 
-                    equity_info['companyName'], 
-                    equity_info['industry'], 
-                    equity_info['isin'], 
-                    equity_info['isin']
-                )
-            )
-            conn.commit()
-
-            # Insert into equity_metadata
-            cur.execute(
-                """
-                INSERT INTO equity_metadata (
-                    series, symbol, isin, status, listing_date, industry, last_update_time, pd_sector_pe, pd_symbol_pe,
-                    pd_sector_ind
-                )
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                ON CONFLICT (symbol) DO NOTHING
-                """,
-                (
-                    equity_metadata['series'], equity_metadata['symbol'], equity_metadata['isin'], equity_metadata['status'],
-                    equity_metadata['listingDate'] if equity_metadata['listingDate'] != 'NA' else None,
-                    equity_metadata['industry'],
-                    equity_metadata['lastUpdateTime'] if equity_metadata['lastUpdateTime'] != 'NA' else None,
-                    float(equity_metadata['pdSectorPe']) if equity_metadata['pdSectorPe'] != 'NA' else None,
-                    float(equity_metadata['pdSymbolPe']) if equity_metadata['pdSymbolPe'] != 'NA' else None,
-                    equity_metadata['pdSectorInd'] if equity_metadata['pdSectorInd'] != 'NA' else None
-                )
-            )
-            conn.commit()
-
-            # Insert into equity_price_info
-            cur.execute(
-                """
-                INSERT INTO equity_price_info (
-                    symbol, last_price, change, p_change, previous_close, open, close, vwap, stock_ind_close_price, lower_cp, upper_cp,
-                    p_price_band, base_price, min, max, intraday_high_low_value, week_high_low_min, week_high_low_min_date,
-                    week_high_low_max, week_high_low_max_date, week_high_low_value, i_nav_value, check_i_nav, tick_size
-                )
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                ON CONFLICT (symbol) DO UPDATE SET
-                    last_price = EXCLUDED.last_price,
-                    change = EXCLUDED.change,
-                    p_change = EXCLUDED.p_change,
-                    previous_close = EXCLUDED.previous_close,
-                    open = EXCLUDED.open,
-                    close = EXCLUDED.close,
-                    vwap = EXCLUDED.vwap,
-                    stock_ind_close_price = EXCLUDED.stock_ind_close_price,
-                    lower_cp = EXCLUDED.lower_cp,
-                    upper_cp = EXCLUDED.upper_cp,
-                    p_price_band = EXCLUDED.p_price_band,
-                    base_price = EXCLUDED.base_price,
-                    min = EXCLUDED.min,
-                    max = EXCLUDED.max,
-                    intraday_high_low_value = EXCLUDED.intraday_high_low_value,
-                    week_high_low_min = EXCLUDED.week_high_low_min,
-                    week_high_low_min_date = EXCLUDED.week_high_low_min_date,
-                    week_high_low_max = EXCLUDED.week_high_low_max,
-                    week_high_low_max_date = EXCLUDED.week_high_low_max_date,
-                    week_high_low_value = EXCLUDED.week_high_low_value,
-                    i_nav_value = EXCLUDED.i_nav_value,
-                    check_i_nav = EXCLUDED.check_i_nav,
-                    tick_size = EXCLUDED.tick_size
-                """,
-                (
-                    equity_info['symbol'], equity_price_info['lastPrice'], equity_price_info['change'],
-                    equity_price_info['pChange'], equity_price_info['previousClose'], equity_price_info['open'],
-                    equity_price_info['close'], equity_price_info['vwap'], equity_price_info['stockIndClosePrice'],
-                    equity_price_info['lowerCP'], equity_price_info['upperCP'], equity_price_info['pPriceBand'],
-                    equity_price_info['basePrice'], equity_price_info['intraDayHighLow']['min'],
-                    equity_price_info['intraDayHighLow']['max'], equity_price_info['intraDayHighLow']['value'],
-                    equity_price_info['weekHighLow']['min'], equity_price_info['weekHighLow']['minDate'],
-                    equity_price_info['weekHighLow']['max'], equity_price_info['weekHighLow']['maxDate'],
-                    equity_price_info['weekHighLow']['value'], equity_price_info['iNavValue'], equity_price_info['checkINAV'],
-                    equity_price_info['tickSize']
-                )
-            )
-            conn.commit()
-
-            # Insert into equity_industry_info
-            cur.execute(
-                """
-                INSERT INTO equity_industry_info (
-                    symbol, macro, sector, industry, basic_industry
-                )
-                VALUES (%s, %s, %s, %s, %s)
-                ON CONFLICT (symbol) DO UPDATE SET
-                    macro = EXCLUDED.macro,
-                    sector = EXCLUDED.sector,
-                    industry = EXCLUDED.industry,
-                    basic_industry = EXCLUDED.basic_industry
-                """,
-                (
-                    equity_info['symbol'], equity_industry_info['macro'], equity_industry_info['sector'],
-                    equity_industry_info['industry'], equity_industry_info['basicIndustry']
-                )
-            )
-            conn.commit()
-
-            # Insert into trade_info
-            cur.execute(
-                """
-                INSERT INTO trade_info (
-                    symbol, no_block_deals, bulk_block_deals_name, total_buy_quantity, total_sell_quantity,
-                    trade_info_total_traded_volume, trade_info_total_traded_value, trade_info_total_market_cap, ffmc,
-                    impact_cost, cm_daily_volatility, cm_annual_volatility, market_lot, active_series, security_var, index_var,
-                    var_margin, extreme_loss_margin, adhoc_margin, applicable_margin
-                )
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                ON CONFLICT (symbol) DO UPDATE SET
-                    no_block_deals = EXCLUDED.no_block_deals,
-                    bulk_block_deals_name = EXCLUDED.bulk_block_deals_name,
-                    total_buy_quantity = EXCLUDED.total_buy_quantity,
-                    total_sell_quantity = EXCLUDED.total_sell_quantity,
-                    trade_info_total_traded_volume = EXCLUDED.trade_info_total_traded_volume,
-                    trade_info_total_traded_value = EXCLUDED.trade_info_total_traded_value,
-                    trade_info_total_market_cap = EXCLUDED.trade_info_total_market_cap,
-                    ffmc = EXCLUDED.ffmc,
-                    impact_cost = EXCLUDED.impact_cost,
-                    cm_daily_volatility = EXCLUDED.cm_daily_volatility,
-                    cm_annual_volatility = EXCLUDED.cm_annual_volatility,
-                    market_lot = EXCLUDED.market_lot,
-                    active_series = EXCLUDED.active_series,
-                    security_var = EXCLUDED.security_var,
-                    index_var = EXCLUDED.index_var,
-                    var_margin = EXCLUDED.var_margin,
-                    extreme_loss_margin = EXCLUDED.extreme_loss_margin,
-                    adhoc_margin = EXCLUDED.adhoc_margin,
-                    applicable_margin = EXCLUDED.applicable_margin
-                """,
-                (
-                    equity_info['symbol'], trade_info['noBlockDeals'],
-                    [block_deal['name'] for block_deal in trade_info['bulkBlockDeals']],
-                    trade_info_market_dept_order_book['totalBuyQuantity'],
-                    trade_info_market_dept_order_book['totalSellQuantity'],
-                    trade_info_market_dept_order_book['tradeInfo']['totalTradedVolume'],
-                    trade_info_market_dept_order_book['tradeInfo']['totalTradedValue'],
-                    trade_info_market_dept_order_book['tradeInfo']['totalMarketCap'],
-                    trade_info_market_dept_order_book['tradeInfo']['ffmc'],
-                    trade_info_market_dept_order_book['tradeInfo']['impactCost'],
-                    trade_info_market_dept_order_book['tradeInfo']['cmDailyVolatility'],
-                    trade_info_market_dept_order_book['tradeInfo']['cmAnnualVolatility'],
-                    trade_info_market_dept_order_book['tradeInfo']['marketLot'],
-                    trade_info_market_dept_order_book['tradeInfo']['activeSeries'],
-                    trade_info_market_dept_order_book['valueAtRisk']['securityVar'],
-                    trade_info_market_dept_order_book['valueAtRisk']['indexVar'],
-                    trade_info_market_dept_order_book['valueAtRisk']['varMargin'],
-                    trade_info_market_dept_order_book['valueAtRisk']['extremeLossMargin'],
-                    trade_info_market_dept_order_book['valueAtRisk']['adhocMargin'],
-                    trade_info_market_dept_order_book['valueAtRisk']['applicableMargin']
-                )
-            )
-            conn.commit()
-
-            # Insert into security_wise_dp
-            def safe_date(value):
-                """Return the date if valid, else return None."""
-                return value.replace(' EOD', '') if value not in ['-', 'NA', None] else None
-
-            def safe_string(value):
-                """Return the string if valid, else return None."""
-                return value if value not in ['-', 'NA', None] else None
-
-            def safe_numeric(value):
-                """Return the numeric value if valid, else return None."""
-                return float(value) if value not in ['-', 'NA', None] else None
-
-            cur.execute(
-                """
-                INSERT INTO security_wise_dp (
-                    symbol, quantity_traded, delivery_quantity, delivery_to_traded_quantity, series_remarks, sec_wise_del_pos_date
-                )
-                VALUES (%s, %s, %s, %s, %s, TO_DATE(%s, 'DD-MON-YYYY'))
-                ON CONFLICT (symbol) DO NOTHING
-                """,
-                (
-                    equity_info['symbol'],
-                    safe_numeric(trade_info_security_wise_dp['quantityTraded']),
-                    safe_numeric(trade_info_security_wise_dp['deliveryQuantity']),
-                    safe_numeric(trade_info_security_wise_dp['deliveryToTradedQuantity']),
-                    safe_string(trade_info_security_wise_dp['seriesRemarks']),
-                    safe_date(trade_info_security_wise_dp['secWiseDelPosDate'])
-                )
-            )
-            conn.commit()
-
-            # Insert into corporate_actions
-            for action in corporate_actions:
-                cur.execute(
-                    """
-                    INSERT INTO corporate_actions (
-                        symbol, exdate, purpose
-                    )
-                    VALUES (%s, %s, %s)
-                    ON CONFLICT (symbol) DO NOTHING
-                    """,
-                    (action['symbol'], action['exdate'], action['purpose'])
-                )
-            conn.commit()
-
-            # Insert into shareholdings_patterns
-            for date, patterns in shareholdings_patterns.items():
-                promoter_and_promoter_group = None
-                public = None
-                shares_held_by_employee_trusts = None
-                total = None
-                
-                for pattern in patterns:
-                    for holder_type, percentage in pattern.items():
-                        holder_type = holder_type.strip()
-                        percentage = percentage.strip().replace('%', '')  # Remove '%' symbol
-                        
-                        if holder_type == "Promoter & Promoter Group":
-                            promoter_and_promoter_group = percentage
-                        elif holder_type == "Public":
-                            public = percentage
-                        elif holder_type == "Shares held by Employee Trusts":
-                            shares_held_by_employee_trusts = percentage
-                        elif holder_type == "Total":
-                            total = percentage
-                
-                cur.execute(
-                    """
-                    INSERT INTO shareholdings_patterns (
-                        symbol, date, promoter_and_promoter_group, public, shares_held_by_employee_trusts, total
-                    )
-                    VALUES (%s, %s, %s, %s, %s, %s)
-                    ON CONFLICT (symbol) DO NOTHING
-                    """,
-                    (symbol, date, promoter_and_promoter_group, public, shares_held_by_employee_trusts, total)
-                )
-            conn.commit()
-
-            # Insert into financial_results
-            for result in financial_results:
-                cur.execute(
-                    """
-                    INSERT INTO financial_results (
-                        symbol, from_date, to_date, expenditure, income, audited, cumulative, consolidated, re_dil_eps,
-                        re_pro_loss_bef_tax, pro_loss_aft_tax, re_broadcast_timestamp, xbrl_attachment, na_attachment
-                    )
-                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                    ON CONFLICT (symbol) DO NOTHING
-                    """,
-                    (
-                        symbol, result['from_date'], result['to_date'], result['expenditure'], result['income'], result['audited'],
-                        result['cumulative'], result['consolidated'], result['reDilEPS'], result['reProLossBefTax'],
-                        result['proLossAftTax'], result['re_broadcast_timestamp'], result['xbrl_attachment'],
-                        result['na_attachment']
-                    )
-                )
-            conn.commit()
-
-            # Insert into board_meeting
-            for meeting in board_meeting:
-                cur.execute(
-                    """
-                    INSERT INTO board_meeting (
-                        symbol, purpose, meeting_date
-                    )
-                    VALUES (%s, %s, %s)
-                    ON CONFLICT (symbol) DO NOTHING
-                    """,
-                    (meeting['symbol'], meeting['purpose'], meeting['meetingdate'])
-                )
-            conn.commit()
 
+def migrate_nullable_keys(cur):
+    """Give key columns created nullable (before KEY_DEFAULTS) their default and NOT NULL.
+
+    Rows whose keys only differ by NULLs are duplicates of one another: the first
+    is kept for insert-only tables and the last for the others, as a load would have.
+    """
+    cur.execute(
+        "SELECT table_name, column_name FROM information_schema.columns "
+        "WHERE table_schema = current_schema() AND is_nullable = 'YES' AND column_name = ANY(%s) "
+        "AND table_name = ANY(%s)",
+        (list(KEY_DEFAULTS), [table for table in TABLE_KEYS if table not in HISTORY_TABLES])
+    )
+    nullable = {}
+    for table, column in cur.fetchall():
+        nullable.setdefault(table, []).append(column)
+    for table, columns in nullable.items():
+        keys = TABLE_KEYS[table]
+        normalized = " AND ".join(
+            f"COALESCE(a.{key}, {KEY_DEFAULTS[key]!r}) = COALESCE(b.{key}, {KEY_DEFAULTS[key]!r})"
+            if key in KEY_DEFAULTS else f"a.{key} = b.{key}"
+            for key in keys
+        )
+        keep = "a.ctid > b.ctid" if table in INSERT_ONLY_TABLES else "a.ctid < b.ctid"
+        cur.execute(f"DELETE FROM {table} a USING {table} b WHERE {keep} AND {normalized}")
+        for column in columns:
+            default = KEY_DEFAULTS[column]
+            cur.execute(f"UPDATE {table} SET {column} = %s WHERE {column} IS NULL", (default,))
+            cur.execute(f"ALTER TABLE {table} ALTER COLUMN {column} SET DEFAULT {default!r}, "
+                        f"ALTER COLUMN {column} SET NOT NULL")
+        print(f"Made {', '.join(columns)} NOT NULL in {table}.")
+
+
+# --- History partitions ---
+def partition_name(table, day):
+    return f"{table}_{day:%Y%m%d}"
+
+
+def load_retention(conn):
+    """Read the history_retention cutoffs into retention_cutoffs."""
+    with conn.cursor() as cur:
+        cur.execute("SELECT table_name, retained_from FROM history_retention")
+        retention_cutoffs.clear()
+        retention_cutoffs.update(cur.fetchall())
+    conn.commit()
+
+
+def set_retention(conn, table, before):
+    """Record that `table` no longer keeps days before `before` (never moves the cutoff back)."""
+    with conn.cursor() as cur:
+        cur.execute(
+            """
+            INSERT INTO history_retention (table_name, retained_from) VALUES (%s, %s)
+            ON CONFLICT (table_name) DO UPDATE SET
+              retained_from = GREATEST(history_retention.retained_from, EXCLUDED.retained_from)
+            RETURNING retained_from
+            """,
+            (table, before)
+        )
+        retention_cutoffs[table] = cur.fetchone()[0]
+    conn.commit()
+
+
+def retained_rows(table, rows):
+    """Drop history rows older than the table's retention cutoff."""
+    cutoff = retention_cutoffs.get(table)
+    if cutoff is None:
+        return rows
+    return [row for row in rows if row[0].date() >= cutoff]
+
+
+def ensure_partitions(cur, table, rows):
+    """Create the daily partitions of a history table needed to hold rows."""
+    for day in {row[0].date() for row in rows}:
+        name = partition_name(table, day)
+        if name in known_partitions:
+            continue
+        cur.execute(
+            f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF {table} "
+            f"FOR VALUES FROM ('{day}') TO ('{day + timedelta(days=1)}')"
+        )
+        known_partitions.add(name)
+
+
+def list_partitions(conn, table):
+    """Return (partition name, day) pairs for the daily partitions of a history table."""
+    with conn.cursor() as cur:
+        cur.execute(
+            """
+            SELECT child.relname
+            FROM pg_inherits
+            JOIN pg_class parent ON parent.oid = pg_inherits.inhparent
+            JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+            WHERE parent.relname = %s
+            ORDER BY child.relname
+            """,
+            (table,)
+        )
+        names = [name for (name,) in cur.fetchall()]
+    return [(name, datetime.strptime(name[-8:], '%Y%m%d').date()) for name in names]
+
+
+def detach_partitions(conn, table, before):
+    """Detach daily partitions older than `before`, leaving them as standalone tables to archive.
+
+    Detached tables are renamed with ARCHIVED_SUFFIX; otherwise CREATE TABLE IF NOT
+    EXISTS would find them on a later load of that day and no partition would exist.
+    """
+    detached = []
+    with conn.cursor() as cur:
+        for name, day in list_partitions(conn, table):
+            if day < before:
+                cur.execute(f"ALTER TABLE {table} DETACH PARTITION {name}")
+                cur.execute(f"ALTER TABLE {name} RENAME TO {name}{ARCHIVED_SUFFIX}")
+                detached.append(f"{name}{ARCHIVED_SUFFIX}")
+    conn.commit()
+    known_partitions.difference_update(name[:-len(ARCHIVED_SUFFIX)] for name in detached)
+    return detached
+
+
+def drop_partitions(conn, table, before):
+    """Drop daily partitions older than `before`; retention without a bulk DELETE."""
+    dropped = []
+    with conn.cursor() as cur:
+        for name, day in list_partitions(conn, table):
+            if day < before:
+                cur.execute(f"DROP TABLE {name}")
+                dropped.append(name)
+    conn.commit()
+    known_partitions.difference_update(dropped)
+    return dropped
+
+
+def changed_symbols(batch):
+    """Symbols with at least one row in a batch of extract_rows() results."""
+    symbols = set()
+    for rows in batch:
+        for table, table_rows in rows.items():
+            if table_rows:
+                position = TABLE_COLUMNS[table].index("symbol")
+                symbols.update(row[position] for row in table_rows)
+    return symbols
+
+
+def notify_changed(cur, symbols):
+    """Queue a NOTIFY on CHANGE_CHANNEL listing symbols; Postgres delivers it only if the transaction commits."""
+    payload = []
+    for symbol in sorted(symbols):
+        if payload and len(",".join(payload + [symbol])) > NOTIFY_PAYLOAD_BYTES:
+            cur.execute("SELECT pg_notify(%s, %s)", (CHANGE_CHANNEL, ",".join(payload)))
+            payload = []
+        payload.append(symbol)
+    if payload:
+        cur.execute("SELECT pg_notify(%s, %s)", (CHANGE_CHANNEL, ",".join(payload)))
+
+
+def insert_rows(cur, rows):
+    """Upsert the rows of one snapshot with one multi-row statement per table."""
+    for table in TABLE_COLUMNS:
+        table_rows = rows[table]
+        if table in HISTORY_TABLES:
+            table_rows = retained_rows(table, table_rows)
+        if not table_rows:
+            continue
+        if table in HISTORY_TABLES:
+            ensure_partitions(cur, table, table_rows)
+        execute_values(cur, insert_sql(table), dedupe_rows(table, table_rows), page_size=ROWS_PER_STATEMENT)
+    notify_changed(cur, changed_symbols([rows]))
+
+
+def write_files(conn, parsed, manifest):
+    """Write parsed (file_path, entry, rows) items one file per transaction, skipping files that fail."""
+    with conn.cursor() as cur:
+        for file_path, entry, rows in parsed:
+            try:
+                insert_rows(cur, rows)
+                conn.commit()
+                manifest[os.path.basename(file_path)] = entry
+            except Exception as e:
+                print(f"Error processing file {os.path.basename(file_path)}: {e}")
+                conn.rollback()  # Rollback the transaction in case of error
+                known_partitions.clear()  # Partitions created in the rolled-back transaction are gone
+                continue  # Move to the next file
+
+
+def merge_batch(conn, batch):
+    """COPY a batch of extracted rows into staging tables and merge them in one transaction."""
+    with conn.cursor() as cur:
+        for table in TABLE_COLUMNS:
+            table_rows = [row for rows in batch for row in rows[table]]
+            if table in HISTORY_TABLES:
+                table_rows = retained_rows(table, table_rows)
+            if not table_rows:
+                continue
+            if table in HISTORY_TABLES:
+                ensure_partitions(cur, table, table_rows)
+            cur.execute(f"CREATE TEMP TABLE stage_{table} (LIKE {table}, stage_ord BIGSERIAL) ON COMMIT DROP")
+            copy_rows(cur, table, table_rows)
+            cur.execute(merge_sql(table))
+        notify_changed(cur, changed_symbols(batch))
+    conn.commit()
+
+
+def flush_batch(conn, parsed, manifest):
+    """Merge a parsed batch, falling back to file-by-file writes on failure.
+
+    If the merge fails (usually a single malformed value), the batch is rolled
+    back and replayed file by file so the offending files are reported and the
+    rest of the batch still lands.
+    """
+    try:
+        merge_batch(conn, [rows for _, _, rows in parsed])
+        for file_path, entry, _ in parsed:
+            manifest[os.path.basename(file_path)] = entry
+        print(f"Merged {len(parsed)} files.")
+    except Exception as e:
+        print(f"Bulk merge failed ({e}); retrying {len(parsed)} files one by one.")
+        conn.rollback()
+        known_partitions.clear()
+        write_files(conn, parsed, manifest)
+    save_manifest(manifest)
+
+
+def parse_pending(file_paths, manifest, stats, history=False):
+    """Yield (file_path, entry, rows) for files with changes, recording unchanged ones in the manifest."""
+    for file_path in file_paths:
+        filename = os.path.basename(file_path)
+        try:
+            entry, rows = parse_changed(file_path, manifest.get(filename), history)
         except Exception as e:
             print(f"Error processing file {filename}: {e}")
-            conn.rollback()  # Rollback the transaction in case of error
-            continue  # Move to the next file
+            continue
+        if rows is None:
+            manifest[filename] = entry
+            stats['skipped'] += 1
+            continue
+        stats['changed'] += 1
+        yield file_path, entry, rows
+
+
+def load_files(conn, file_paths, manifest, stats, history=False):
+    """Load changed snapshots one file per transaction."""
+    try:
+        write_files(conn, parse_pending(file_paths, manifest, stats, history), manifest)
+    finally:
+        save_manifest(manifest)
+
+
+def bulk_load(conn, file_paths, manifest, stats, batch_size=BULK_BATCH_SIZE, history=False):
+    """Load changed snapshots in batches of batch_size files, one transaction per batch."""
+    batch = []
+    for item in parse_pending(file_paths, manifest, stats, history):
+        batch.append(item)
+        if len(batch) >= batch_size:
+            flush_batch(conn, batch, manifest)
+            batch = []
+    if batch:
+        flush_batch(conn, batch, manifest)
+    save_manifest(manifest)
+
+
+# --- Parallel ingest pipeline ---
+def parse_worker(task_queue, result_queue, manifest, history):
+    """Parse snapshots from task_queue into row tuples until a None sentinel arrives."""
+    while True:
+        file_path = task_queue.get()
+        if file_path is None:
+            result_queue.put(None)
+            break
+        try:
+            entry, rows = parse_changed(file_path, manifest.get(os.path.basename(file_path)), history)
+            result_queue.put((file_path, entry, rows, None))
+        except Exception as e:
+            result_queue.put((file_path, None, None, str(e)))
+
+
+def pipeline_load(conn, file_paths, manifest, stats, workers, batch_size=BULK_BATCH_SIZE,
+                  queue_size=PIPELINE_QUEUE_SIZE, history=False):
+    """Parse snapshots in worker processes while this process merges them into Postgres.
+
+    Workers push extracted rows onto a queue bounded by queue_size, so when the
+    database falls behind they block instead of piling parsed files up in memory.
+    """
+    task_queue = multiprocessing.Queue()
+    result_queue = multiprocessing.Queue(maxsize=queue_size)
+    for file_path in file_paths:
+        task_queue.put(file_path)
+    for _ in range(workers):
+        task_queue.put(None)
+
+    processes = [
+        multiprocessing.Process(target=parse_worker, args=(task_queue, result_queue, manifest, history),
+                                daemon=True)
+        for _ in range(workers)
+    ]
+    for process in processes:
+        process.start()
+
+    try:
+        finished = 0
+        batch = []
+        while finished < workers:
+            item = result_queue.get()
+            if item is None:
+                finished += 1
+                continue
+
+            file_path, entry, rows, error = item
+            if error is not None:
+                print(f"Error processing file {os.path.basename(file_path)}: {error}")
+                continue
+            if rows is None:
+                manifest[os.path.basename(file_path)] = entry
+                stats['skipped'] += 1
+                continue
+            stats['changed'] += 1
+            batch.append((file_path, entry, rows))
+            if len(batch) >= batch_size:
+                flush_batch(conn, batch, manifest)
+                batch = []
+
+        if batch:
+            flush_batch(conn, batch, manifest)
+        for process in processes:
+            process.join()
+    finally:
+        save_manifest(manifest)
+        # Don't leave workers blocked on a full queue if the writer failed
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+                process.join()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load selected_stocks/*.json snapshots into PostgreSQL.")
+    parser.add_argument("--bulk", action="store_true", help="COPY into staging tables and merge set-based")
+    parser.add_argument("--batch-size", type=int, default=BULK_BATCH_SIZE, help="files per bulk transaction")
+    parser.add_argument("--workers", type=int, default=1, help="parse files in this many processes (implies --bulk)")
+    parser.add_argument("--queue-size", type=int, default=PIPELINE_QUEUE_SIZE,
+                        help="parsed files buffered ahead of the database writer")
+    parser.add_argument("--full", action="store_true", help="ignore the ingest manifest and reload every file")
+    parser.add_argument("--history", action="store_true",
+                        help="also append each snapshot to the partitioned price/trade history tables")
+    parser.add_argument("--detach-before", type=date.fromisoformat, metavar="YYYY-MM-DD",
+                        help="detach history partitions older than this date (for archiving)")
+    parser.add_argument("--drop-before", type=date.fromisoformat, metavar="YYYY-MM-DD",
+                        help="drop history partitions older than this date")
+    args = parser.parse_args()
+
+    # Check if folder exists
+    if not os.path.exists(folder_path):
+        raise FileNotFoundError(f"Folder '{folder_path}' does not exist.")
+
+    manifest = {} if args.full else load_manifest()
+    stats = {'changed': 0, 'skipped': 0}
+    retire_before = max(filter(None, [args.detach_before, args.drop_before]), default=None)
+    with connection() as conn:
+        create_tables(conn, args.history or retire_before is not None)
+        if args.history:
+            load_retention(conn)
+        if retire_before:
+            # Recorded before loading, so this run already skips the days being retired
+            for history_table in HISTORY_TABLES:
+                set_retention(conn, history_table, retire_before)
+        file_paths = list_json_files(folder_path)
+        if args.workers > 1:
+            pipeline_load(conn, file_paths, manifest, stats, args.workers, args.batch_size, args.queue_size,
+                          args.history)
+        elif args.bulk:
+            bulk_load(conn, file_paths, manifest, stats, args.batch_size, args.history)
+        else:
+            load_files(conn, file_paths, manifest, stats, args.history)
+        print(f"Loaded {stats['changed']} changed files, skipped {stats['skipped']} unchanged.")
+
+        for history_table in HISTORY_TABLES:
+            if args.detach_before:
+                detached = detach_partitions(conn, history_table, args.detach_before)
+                print(f"Detached {len(detached)} partitions from {history_table}: {', '.join(detached)}")
+            if args.drop_before:
+                dropped = drop_partitions(conn, history_table, args.drop_before)
+                print(f"Dropped {len(dropped)} partitions from {history_table}.")
+
 
-# Close database connection
-cur.close()
-conn.close()
\ No newline at end of file
+if __name__ == "__main__":
+    main()
@@ -1,25 +1,26 @@
-import os
-import sys
-import json
 import requests
 import streamlit as st
 from dotenv import load_dotenv
-import google.generativeai as genai
-import psycopg2
+from db import connection
+from llm_backends import BACKENDS, DEFAULT_BACKEND, get_backend
+from research_payload import build_prompt
+from research_store import (
+    create_research_table, insert_research_report, create_report_cache_table, report_input_hash,
+    get_cached_report, store_cached_report
+)
 
 # --- Configuration ---
 load_dotenv()
-genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
-model = genai.GenerativeModel('gemini-2.0-flash')
 
 API_BASE_URL = "https://mgo2gncdj3.execute-api.ap-south-1.amazonaws.com"
 EQUITY_DETAILS_ENDPOINT = f"{API_BASE_URL}/equity-details"
 
-# Database configuration (PostgreSQL)
-DB_HOST = "localhost"         # Replace with your DB host
-DB_NAME = "stock_analytics"   # Replace with your DB name
-DB_USER = "root"              # Replace with your DB user
-DB_PASSWORD = "arka1256"      # Replace with your DB password
+# Database access goes through the shared pool in db.py (stock_analytics by default),
+# so a button press reuses a warm connection instead of opening a new one.
+# Table and cache helpers live in research_store.py, shared with batch_research.py.
+
+NO_REPORT = "No research report generated."
+REPORT_ERROR = "Error generating research report."
 
 # --- Fetch Equity Details using requests ---
 def fetch_equity_details(symbol):
@@ -35,51 +36,63 @@ def fetch_equity_details(symbol):
         return None
 
 # --- Use AI to Generate an Investment Research Report ---
-def generate_research_report(symbol, equity_json):
+def generate_research_report(symbol, equity_json, backend=None, on_text=None):
+    """Stream a report from `backend` (anything with stream(prompt) yielding text pieces;
+    defaults to get_backend()), calling on_text(report_so_far) as each piece arrives.
+    Tests can pass a fake backend."""
+    backend = backend or get_backend()
     try:
-        # Instruct the AI to extract key details and write a concise research report.
-        prompt = (
-            f"You are the best investment research analyst. "
-            f"Below is the JSON data for the stock '{symbol}'. "
-            "Extract the following key details: market capitalization, last price, sector PE, symbol PE, financial results, "
-            "market department order book total buy quantity, total sell quantity, and security-wise delivery position (if available). "
-            "Based on these data points, write a short, concise investment research report that includes a company overview, "
-            "financial highlights, risk factors, and a recommendation summary.\n\n"
-            f"{json.dumps(equity_json)}"
-        )
-        st.write(f"Generating research report for **{symbol}**...")
-        response = model.generate_content(prompt)
-        if response and response.text:
-            return response.text.strip()
-        else:
-            return "No research report generated."
+        # Instruct the AI to write a concise research report from the key details only.
+        prompt = build_prompt(symbol, equity_json)
+        st.write(f"Generating research report for **{symbol}** with {backend.name}...")
+        report = ""
+        for text in backend.stream(prompt):
+            report += text
+            if on_text:
+                on_text(report)
+        return report.strip() or NO_REPORT
     except Exception as e:
         st.error(f"Error generating report for {symbol}: {e}")
-        return "Error generating research report."
+        return REPORT_ERROR
 
-# --- Database: Create Research Report Table if Not Exists ---
-def create_research_table(cur):
-    create_table_sql = """
-    CREATE TABLE IF NOT EXISTS investment_research (
-        symbol VARCHAR(20) PRIMARY KEY,
-        research_report TEXT
-    );
-    """
-    cur.execute(create_table_sql)
+# Keep one backend client per choice alive across Streamlit reruns
+@st.cache_resource
+def load_backend(name):
+    return get_backend(name)
 
-# --- Insert Research Report into Database ---
-def insert_research_report(cur, symbol, report):
-    insert_sql = """
-    INSERT INTO investment_research (symbol, research_report)
-    VALUES (%s, %s)
-    ON CONFLICT (symbol) DO UPDATE SET
-      research_report = EXCLUDED.research_report;
-    """
-    cur.execute(insert_sql, (symbol, report))
+# --- Reuse a Cached Report When the Inputs Haven't Changed ---
+def cached_research_report(symbol, equity_json, backend=None, on_text=None):
+    """Return (report, cached). The model is only called when no fresh report exists for
+    this symbol, these inputs and PROMPT_VERSION, and at most once: if the cache can't be
+    read the report is generated, and if it can't be written the new report is still returned."""
+    input_hash = report_input_hash(equity_json)
+    try:
+        with connection() as conn, conn.cursor() as cur:
+            create_research_table(cur)
+            create_report_cache_table(cur)
+            report = get_cached_report(cur, symbol, input_hash)
+            conn.commit()
+    except Exception as e:
+        st.error(f"Error reading the report cache: {e}")
+        report = None
+    if report is not None:
+        return report, True
+
+    report = generate_research_report(symbol, equity_json, backend, on_text)
+    if report not in (NO_REPORT, REPORT_ERROR):
+        try:
+            with connection() as conn, conn.cursor() as cur:
+                store_cached_report(cur, symbol, input_hash, report)
+                conn.commit()
+        except Exception as e:
+            st.error(f"Error writing the report cache: {e}")
+    return report, False
 
 # --- Main Functionality ---
 def main():
     st.title("Stock Investment Research Report Generator")
+    backends = [name for name in BACKENDS if name != "fake"]
+    backend_name = st.sidebar.selectbox("Model backend", backends, index=backends.index(DEFAULT_BACKEND) if DEFAULT_BACKEND in backends else 0)
     stock_symbol = st.text_input("Enter a Stock Symbol (e.g., AAPL):").strip().upper()
     
     if st.button("Generate Report") and stock_symbol:
@@ -88,29 +101,27 @@ def main():
         if not equity_data:
             return
         
-        # Generate research report using AI
-        report = generate_research_report(stock_symbol, equity_data)
+        # Generate research report using AI, streaming it into the page as it is written,
+        # or reuse the cached one if the data hasn't changed
         st.subheader("Investment Research Report")
-        st.write(report)
+        placeholder = st.empty()
+        backend = load_backend(backend_name)
+        report, cached = cached_research_report(stock_symbol, equity_data, backend, placeholder.markdown)
+        if cached:
+            st.caption("Data unchanged since the last report; served from cache.")
+        placeholder.markdown(report)
+        if report in (NO_REPORT, REPORT_ERROR):
+            return
         
         # Insert the research report into the database
         try:
-            conn = psycopg2.connect(
-                host=DB_HOST, database=DB_NAME, user=DB_USER, password=DB_PASSWORD
-            )
-            cur = conn.cursor()
-            create_research_table(cur)
-            insert_research_report(cur, stock_symbol, report)
-            conn.commit()
+            with connection() as conn, conn.cursor() as cur:
+                create_research_table(cur)
+                insert_research_report(cur, stock_symbol, report)
+                conn.commit()
             st.success(f"Research report for **{stock_symbol}** inserted into database.")
         except Exception as e:
             st.error(f"Error inserting report into database: {e}")
-        finally:
-            try:
-                cur.close()
-                conn.close()
-            except Exception as e:
-                st.error(f"Error closing DB connection: {e}")
 
 if __name__ == "__main__":
     main()
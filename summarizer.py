@@ -0,0 +1,110 @@
+import asyncio
+import hashlib
+from llm_backends import CHARS_PER_TOKEN, estimate_tokens
+from memory_cache import LRUCache, SingleFlight
+
+# Constants
+CHUNK_TOKENS = 2000  # Input tokens per model call; leaves room for the prompt and reply in an 8k context
+MERGE_FAN_IN = 8  # Partial summaries combined per reduce call
+DEFAULT_PARALLELISM = 4  # Chunk summaries requested concurrently
+CHUNK_CACHE_SIZE = 4_000_000  # Characters of chunk summaries kept in memory
+
+SYSTEM_PROMPT = "You are a summarizer."
+SUMMARY_PROMPT = "Summarize this content: {text}"
+CHUNK_PROMPT = (
+    "Summarize this section of a longer document. Keep every figure, name and date that matters; "
+    "the section summaries will be combined afterwards.\n\n{text}"
+)
+MERGE_PROMPT = (
+    "Below are summaries of consecutive sections of one document. "
+    "Combine them into a single coherent summary of the whole document.\n\n{text}"
+)
+
+
+def split_chunks(text, max_tokens=CHUNK_TOKENS):
+    """Split text into chunks of at most max_tokens (estimated), breaking at line ends where possible."""
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    chunks, current, size = [], [], 0
+    for line in text.splitlines(keepends=True):
+        while len(line) > max_chars:  # A single overlong line is cut at a space, else hard
+            cut = line.rfind(" ", 0, max_chars) + 1 or max_chars
+            line, head = line[cut:], line[:cut]
+            if current:
+                chunks.append("".join(current))
+                current, size = [], 0
+            chunks.append(head)
+        if size + len(line) > max_chars and current:
+            chunks.append("".join(current))
+            current, size = [], 0
+        current.append(line)
+        size += len(line)
+    if current:
+        chunks.append("".join(current))
+    return [chunk for chunk in (c.strip() for c in chunks) if chunk]
+
+
+class ChunkedSummarizer:
+    """Map-reduce summarization of arbitrarily long text.
+
+    Text that fits in one chunk is summarized with a single call. Longer text
+    is split into chunks that are summarized concurrently (at most
+    `parallelism` calls at once), and the partial summaries are merged up
+    to `fan_in` at a time until one remains. Wall time therefore grows with
+    the depth of the merge tree, not the length of the document. Chunk and
+    merge summaries are cached by the hash of their input, so a page that
+    changed in one place only re-summarizes that chunk and the merges above it.
+    """
+
+    def __init__(self, backend, chunk_tokens=CHUNK_TOKENS, parallelism=DEFAULT_PARALLELISM,
+                 fan_in=MERGE_FAN_IN, cache=None):
+        self.backend = backend
+        self.chunk_tokens = chunk_tokens
+        self.fan_in = fan_in
+        self.cache = cache if cache is not None else LRUCache(CHUNK_CACHE_SIZE)
+        self._slots = asyncio.Semaphore(parallelism)
+        self._flights = SingleFlight()
+
+    async def _summarize(self, template, text):
+        key = hashlib.sha1(f"{self.backend!r}\0{template}\0{text}".encode()).hexdigest()
+        summary = self.cache.get(key)
+        if summary is not None:
+            return summary
+
+        async def load():
+            async with self._slots:
+                summary = await self.backend.acomplete(template.format(text=text), system=SYSTEM_PROMPT)
+            self.cache.set(key, summary)
+            return summary
+
+        return await self._flights.run(key, load)
+
+    async def summarize(self, text):
+        if estimate_tokens(text) <= self.chunk_tokens:
+            return await self._summarize(SUMMARY_PROMPT, text)
+
+        chunks = split_chunks(text, self.chunk_tokens)
+        partials = await asyncio.gather(*(self._summarize(CHUNK_PROMPT, chunk) for chunk in chunks))
+        while len(partials) > 1:
+            partials = await asyncio.gather(*(self._merge(group) for group in self.merge_groups(partials)))
+        return partials[0]
+
+    def merge_groups(self, summaries):
+        """Consecutive groups of up to fan_in summaries that fit in one chunk (at least two per group)."""
+        groups, current, tokens = [], [], 0
+        for summary in summaries:
+            size = estimate_tokens(summary)
+            if len(current) >= 2 and (len(current) == self.fan_in or tokens + size > self.chunk_tokens):
+                groups.append(current)
+                current, tokens = [], 0
+            current.append(summary)
+            tokens += size
+        groups.append(current)
+        return groups
+
+    async def _merge(self, group):
+        if len(group) == 1:
+            return group[0]
+        return await self._summarize(MERGE_PROMPT, "\n\n".join(group))
+
+    def summary(self):
+        return {"cache": self.cache.stats(), "coalesced": self._flights.coalesced}
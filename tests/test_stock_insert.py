@@ -0,0 +1,112 @@
+import os
+import sys
+import json
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+psycopg2 = pytest.importorskip("psycopg2")
+import db
+import stock_insert
+
+TEST_DB = "stock_insert_test"
+CHILD_TABLES = ["corporate_actions", "shareholdings_patterns", "financial_results", "board_meeting"]
+
+
+def snapshot(symbol):
+    """An equity-details document whose child rows leave composite-key fields empty."""
+    return {
+        "equityDetails": {
+            "info": {"symbol": symbol, "companyName": "Test Ltd", "industry": "IT", "isin": "INE000000001"},
+            "metadata": {
+                "series": "EQ", "symbol": symbol, "isin": "INE000000001", "status": "Listed",
+                "listingDate": "01-Jan-2000", "industry": "IT", "lastUpdateTime": "14-Feb-2025 16:00:00",
+                "pdSectorPe": "25.5", "pdSymbolPe": "18.2", "pdSectorInd": "NIFTY IT",
+            },
+            "priceInfo": {
+                "lastPrice": 100, "change": 1.5, "pChange": 1.2, "previousClose": 98.5, "open": 99, "close": 0,
+                "vwap": 99.5, "stockIndClosePrice": 0, "lowerCP": "80", "upperCP": "120", "pPriceBand": "20",
+                "basePrice": 98.5, "intraDayHighLow": {"min": 97, "max": 102, "value": 100},
+                "weekHighLow": {"min": 60, "minDate": "01-Mar-2024", "max": 105, "maxDate": "01-Jan-2025",
+                                "value": 100},
+                "iNavValue": None, "checkINAV": False, "tickSize": 0.05,
+            },
+            "industryInfo": {"macro": "Tech", "sector": "IT", "industry": "Software", "basicIndustry": "Software"},
+        },
+        "tradeInfo": {
+            "noBlockDeals": True, "bulkBlockDeals": [],
+            "marketDeptOrderBook": {
+                "totalBuyQuantity": 1000, "totalSellQuantity": 2000,
+                "tradeInfo": {
+                    "totalTradedVolume": 5000, "totalTradedValue": 500000, "totalMarketCap": 1e9, "ffmc": 5e8,
+                    "impactCost": 0.02, "cmDailyVolatility": "1.5", "cmAnnualVolatility": "28", "marketLot": "1",
+                    "activeSeries": "EQ",
+                },
+                "valueAtRisk": {"securityVar": 10, "indexVar": 0, "varMargin": 10, "extremeLossMargin": 3.5,
+                                "adhocMargin": 0, "applicableMargin": 13.5},
+            },
+            "securityWiseDP": {"quantityTraded": "5000", "deliveryQuantity": "3500",
+                               "deliveryToTradedQuantity": "70", "seriesRemarks": "-",
+                               "secWiseDelPosDate": "14-FEB-2025 EOD"},
+        },
+        "corporateInfo": {
+            "corporate_actions": {"data": [
+                {"symbol": symbol, "exdate": "01-Aug-2024", "purpose": "Dividend"},
+                {"symbol": symbol, "exdate": None, "purpose": None},
+            ]},
+            "shareholdings_patterns": {"data": {
+                "31-Dec-2024": [{"Promoter & Promoter Group": "55.00%"}, {"Public": "45.00%"}, {"Total": "100%"}],
+            }},
+            "financial_results": {"data": [{
+                "from_date": "01-Oct-2024", "to_date": None, "expenditure": "100", "income": "150",
+                "audited": "Un-Audited", "cumulative": "Non-cumulative", "consolidated": None, "reDilEPS": "2.5",
+                "reProLossBefTax": "60", "proLossAftTax": "45", "re_broadcast_timestamp": "14-Feb-2025 17:30",
+                "xbrl_attachment": None, "na_attachment": None,
+            }]},
+            "borad_meeting": {"data": [{"symbol": symbol, "purpose": "Results", "meetingdate": None}]},
+        },
+    }
+
+
+@pytest.fixture
+def conn():
+    try:
+        admin = db.connect()
+    except psycopg2.OperationalError as e:
+        pytest.skip(f"PostgreSQL not reachable: {e}")
+    with admin.cursor() as cur:
+        cur.execute(f"DROP DATABASE IF EXISTS {TEST_DB}")
+        cur.execute(f"CREATE DATABASE {TEST_DB}")
+    try:
+        with db.connection(TEST_DB) as test_conn:
+            yield test_conn
+    finally:
+        db.close_pools()
+        with admin.cursor() as cur:
+            cur.execute(f"DROP DATABASE IF EXISTS {TEST_DB}")
+        admin.close()
+
+
+def child_counts(conn):
+    with conn.cursor() as cur:
+        counts = {}
+        for table in CHILD_TABLES:
+            cur.execute(f"SELECT count(*) FROM {table}")
+            counts[table] = cur.fetchone()[0]
+    return counts
+
+
+@pytest.mark.parametrize("bulk", [False, True])
+def test_reloading_same_file_keeps_row_counts(conn, tmp_path, monkeypatch, bulk):
+    monkeypatch.setattr(stock_insert, "MANIFEST_PATH", str(tmp_path / ".ingest_manifest"))
+    file_path = tmp_path / "TESTSYM.json"
+    file_path.write_text(json.dumps(snapshot("TESTSYM")))
+    stock_insert.create_tables(conn)
+
+    load = stock_insert.bulk_load if bulk else stock_insert.load_files
+    load(conn, [str(file_path)], {}, {'changed': 0, 'skipped': 0})  # Empty manifests force a full reload
+    first = child_counts(conn)
+    load(conn, [str(file_path)], {}, {'changed': 0, 'skipped': 0})
+
+    assert first == {"corporate_actions": 2, "shareholdings_patterns": 1, "financial_results": 1, "board_meeting": 1}
+    assert child_counts(conn) == first
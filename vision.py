@@ -1,9 +1,47 @@
+from typing import List
 from fastapi import FastAPI, File, UploadFile, Form
-from fastapi.responses import JSONResponse
-import ollama
+from fastapi.responses import JSONResponse, StreamingResponse
+from concurrent.futures import ThreadPoolExecutor
+from llm_backends import get_backend, metrics_summary
+from memory_cache import LRUCache, SingleFlight
+import io
+import os
+import json
+import asyncio
+import hashlib
+
+try:
+    from PIL import Image  # Optional: oversized images are sent as-is without it
+except ImportError:
+    Image = None
 
 app = FastAPI()
 
+# Vision model backend ("name:model"); any backend that accepts images works
+VISION_BACKEND = os.environ.get("VISION_BACKEND", "ollama:llama3.2-vision")
+backend = get_backend(VISION_BACKEND)
+
+# --- Image Pipeline Configuration ---
+INFERENCE_CONCURRENCY = int(os.environ.get("VISION_CONCURRENCY", 2))  # Model calls in flight
+MAX_QUEUED = 32  # Requests waiting for a model slot before new ones are turned away with 503
+MAX_UPLOAD_BYTES = 20 * 1024 * 1024
+MAX_IMAGE_SIDE = 1120  # Pixels; llama3.2-vision's largest tile, larger images only cost time
+JPEG_QUALITY = 90
+IMAGE_WORKERS = 2  # Threads decoding and resizing images
+
+# --- Batch Configuration ---
+BATCH_MAX_IMAGES = 64
+BATCH_MAX_BYTES = 128 * 1024 * 1024  # Image bytes one batch may hold in memory while it is processed
+BATCH_WORKERS = INFERENCE_CONCURRENCY  # Images of one batch in flight; more would only wait for a model slot
+RESULT_CACHE_TTL = 3600  # Seconds a response is reused for the same image and instruction
+RESULT_CACHE_SIZE = 4_000_000  # Characters of responses kept in memory
+
+inference_slots = asyncio.Semaphore(INFERENCE_CONCURRENCY)
+image_executor = ThreadPoolExecutor(max_workers=IMAGE_WORKERS, thread_name_prefix="vision-image")
+pipeline_stats = {"queued": 0, "in_flight": 0, "rejected": 0, "resized": 0}
+results = LRUCache(RESULT_CACHE_SIZE, ttl=RESULT_CACHE_TTL)  # (image sha1, instruction) -> response
+result_flights = SingleFlight()
+
 # Enable CORS Middleware
 from fastapi.middleware.cors import CORSMiddleware
 
@@ -15,6 +53,140 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+
+class QueueFull(Exception):
+    """Raised when MAX_QUEUED requests are already waiting for the model."""
+
+
+def prepare_image(data):
+    """Downscale an image whose longer side exceeds MAX_IMAGE_SIDE and re-encode it; other images pass through."""
+    if Image is None:
+        return data
+    with Image.open(io.BytesIO(data)) as img:
+        if max(img.size) <= MAX_IMAGE_SIDE:
+            return data
+        img.thumbnail((MAX_IMAGE_SIDE, MAX_IMAGE_SIDE))
+        out = io.BytesIO()
+        if img.mode in ("RGBA", "LA", "P"):
+            img.save(out, format="PNG", optimize=True)  # Keep transparency and sharp chart lines
+        else:
+            img.convert("RGB").save(out, format="JPEG", quality=JPEG_QUALITY)
+    return out.getvalue()
+
+
+async def analyze(instruction, data):
+    """Run one instruction against in-memory image bytes, at most INFERENCE_CONCURRENCY at a time.
+
+    A request holds its queue slot from admission until it gets a model slot, so images
+    still being resized count toward MAX_QUEUED too.
+    """
+    if pipeline_stats["queued"] >= MAX_QUEUED:
+        pipeline_stats["rejected"] += 1
+        raise QueueFull(f"{MAX_QUEUED} requests already waiting for the vision model")
+    pipeline_stats["queued"] += 1
+    try:
+        loop = asyncio.get_running_loop()
+        prepared = await loop.run_in_executor(image_executor, prepare_image, data)
+        if prepared is not data:
+            pipeline_stats["resized"] += 1  # Counted here, on the event loop, not in the executor thread
+        data = prepared
+        await inference_slots.acquire()
+    finally:
+        pipeline_stats["queued"] -= 1
+    pipeline_stats["in_flight"] += 1
+    try:
+        return await backend.acomplete(instruction, images=[data])
+    finally:
+        pipeline_stats["in_flight"] -= 1
+        inference_slots.release()
+
+
+async def cached_analyze(instruction, data):
+    """analyze(), deduplicated by image content hash: returns (digest, response, source).
+
+    source is "cache" for a stored response, "coalesced" when the same image and
+    instruction were already being analyzed and that call's response is shared,
+    and "model" for a call of its own.
+    """
+    digest = hashlib.sha1(data).hexdigest()
+    key = (digest, instruction)
+    response = results.get(key)
+    if response is not None:
+        return digest, response, "cache"
+    source = "coalesced" if key in result_flights else "model"
+
+    async def load():
+        response = await analyze(instruction, data)
+        if response:
+            results.set(key, response)
+        return response
+
+    return digest, await result_flights.run(key, load), source
+
+
+async def batch_results(instruction, uploads):
+    """Analyze (filename, bytes) pairs with BATCH_WORKERS workers, yielding one NDJSON line per image as it finishes.
+
+    bytes is None for an upload left unread because it was over MAX_UPLOAD_BYTES.
+    """
+    pending = asyncio.Queue()
+    finished = asyncio.Queue()
+    for index, upload in enumerate(uploads):
+        pending.put_nowait((index, upload))
+
+    async def worker():
+        while not pending.empty():
+            index, (filename, data) = pending.get_nowait()
+            line = {"index": index, "filename": filename}
+            try:
+                if data is None or len(data) > MAX_UPLOAD_BYTES:
+                    raise ValueError(f"Image larger than {MAX_UPLOAD_BYTES} bytes")
+                line["sha1"], response, source = await cached_analyze(instruction, data)
+                line["cached"] = source == "cache"
+                line["deduplicated"] = source == "coalesced"  # Shared another image's model call
+                line["response"] = response or "No response received."
+            except Exception as e:
+                line["error"] = str(e)
+            await finished.put(line)
+
+    workers = [asyncio.create_task(worker()) for _ in range(min(BATCH_WORKERS, len(uploads)))]
+    counts = {"images": len(uploads), "cached": 0, "deduplicated": 0, "errors": 0}
+    try:
+        for _ in uploads:
+            line = await finished.get()
+            counts["errors"] += "error" in line
+            counts["cached"] += bool(line.get("cached"))
+            counts["deduplicated"] += bool(line.get("deduplicated"))
+            yield json.dumps(line) + "\n"
+        yield json.dumps({"done": True, **counts}) + "\n"
+    finally:
+        for task in workers:
+            task.cancel()  # Client went away; in-flight model calls still finish and fill the cache
+
+
+@app.post("/process-images/")
+async def process_images(
+    instruction: str = Form(...),  # Instruction applied to every image
+    images: List[UploadFile] = File(...)
+):
+    """
+    Batch form of /process-image/: streams one JSON object per line as each image finishes,
+    in completion order (each carries its upload index), followed by a summary line.
+    """
+    if len(images) > BATCH_MAX_IMAGES:
+        return JSONResponse(content={"error": f"At most {BATCH_MAX_IMAGES} images per batch"}, status_code=413)
+    # Uploads are already spooled, so their sizes are known before any is read into memory.
+    # Oversized images are reported in the stream without being read.
+    sizes = [image.size or 0 for image in images]
+    if sum(size for size in sizes if size <= MAX_UPLOAD_BYTES) > BATCH_MAX_BYTES:
+        return JSONResponse(content={"error": f"At most {BATCH_MAX_BYTES} bytes of images per batch"}, status_code=413)
+    # Read every upload before streaming; the files are closed once the handler returns
+    uploads = [
+        (image.filename, await image.read() if size <= MAX_UPLOAD_BYTES else None)
+        for image, size in zip(images, sizes)
+    ]
+    return StreamingResponse(batch_results(instruction, uploads), media_type="application/x-ndjson")
+
 @app.post("/process-image/")
 async def process_image(
     instruction: str = Form(...),  # User's instruction
@@ -24,30 +196,39 @@ async def process_image(
     API endpoint to process an image and an instruction.
     """
     try:
-        # Save the uploaded image to a temporary file
-        temp_image_path = f"/tmp/{image.filename}"
-        with open(temp_image_path, "wb") as f:
-            f.write(await image.read())
-        
+        # Read the upload into memory and hand the bytes straight to the model; this handler
+        # writes no copy of its own (Starlette itself spools uploads over 1 MB to a temp file)
+        data = await image.read()
+        if len(data) > MAX_UPLOAD_BYTES:
+            return JSONResponse(content={"error": f"Image larger than {MAX_UPLOAD_BYTES} bytes"}, status_code=413)
+
         # Send the image and instruction to the model
-        response = ollama.chat(
-            model='llama3.2-vision',
-            messages=[{
-                'role': 'user',
-                'content': instruction,
-                'images': [temp_image_path]
-            }]
-        )
-        
+        response = await analyze(instruction, data)
+
         # Extract the assistant's response
-        assistant_message = response.get('message', {}).get('content', "No response received.")
-        
+        assistant_message = response or "No response received."
+
         # Return the response as JSON
         return JSONResponse(content={
             "user_instruction": instruction,
             "response": assistant_message
         })
-    
+
+    except QueueFull as e:
+        return JSONResponse(content={"error": str(e)}, status_code=503)
     except Exception as e:
         # Handle errors and return the error message
         return JSONResponse(content={"error": str(e)}, status_code=500)
+
+@app.get("/llm-metrics")
+async def llm_metrics():
+    """Latency and token usage of the vision backend."""
+    return metrics_summary()
+
+@app.get("/pipeline-metrics")
+async def pipeline_metrics():
+    """Requests waiting for and holding a model slot, rejections and resized images."""
+    return {
+        **pipeline_stats, "concurrency": INFERENCE_CONCURRENCY, "max_queued": MAX_QUEUED,
+        "result_cache": results.stats(), "coalesced": result_flights.coalesced,
+    }